@@ -1,9 +1,24 @@
 import os
+import sys
+import time
+import argparse
+from utils.startup_profile import import_profiler
+
+# Install before the heavy imports below so they show up in the profile. Cluster
+# workers re-run the entry module as __mp_main__ with the same argv, so they profile too
+if __name__ in ("__main__", "__mp_main__") and '--profile-startup' in sys.argv:
+    import_profiler.install()
+
 from dotenv import load_dotenv
 import logging
 import discord
 from discord.ext import commands
 import asyncio
+from utils.command_sync import CommandSyncState, command_tree_hash
+from utils.metrics import metrics
+from utils.thread_store import ThreadMappingStore, UserThreadIndex
+from utils.scheduler import DailyScheduler
+from utils.cluster import ClusterSupervisor, set_process_count, shard_for_guild
 
 # Load environment variables from .env file
 load_dotenv()
@@ -12,56 +27,162 @@ load_dotenv()
 logging.basicConfig(level=logging.DEBUG)  # Temporarily increase logging level
 logger = logging.getLogger(__name__)
 
-# Bot configuration
-intents = discord.Intents.all()  # Using all intents for proper functionality
-
-class RamadanBot(commands.Bot):
-    def __init__(self):
+def gateway_options(profile=None):
+    """Intents and cache settings for GATEWAY_PROFILE: 'lean' (default) or 'full'"""
+    profile = (profile or os.getenv('GATEWAY_PROFILE', 'lean')).lower()
+    if profile == 'full':
+        return {'intents': discord.Intents.all()}
+    if profile != 'lean':
+        raise ValueError(f"Unknown GATEWAY_PROFILE: {profile}")
+
+    intents = discord.Intents.none()
+    intents.guilds = True  # channels, threads and roles
+    intents.members = True  # on_member_join assigns the guided members role
+    intents.guild_messages = True  # thread follow-ups and prefix commands
+    intents.dm_messages = True  # prefix commands in DMs
+    intents.message_content = True
+    return {
+        'intents': intents,
+        # Members arrive with their events; nothing reads them back from the cache
+        'member_cache_flags': discord.MemberCacheFlags.none(),
+        'chunk_guilds_at_startup': False,
+        # Only needs to cover edits to follow-ups that are still queued or being answered
+        'max_messages': int(os.getenv('MESSAGE_CACHE_SIZE', '250'))
+    }
+
+def _env_int(name, default=None):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+def parse_args(argv=None):
+    """Command line options shared by bot.py and main.py"""
+    parser = argparse.ArgumentParser(description="Rep by Rep Ramadan Bot")
+    parser.add_argument('--force-sync', action='store_true',
+                        help="sync application commands even if they haven't changed")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="log per-module import time and per-cog load time at startup")
+    parser.add_argument('--shard-count', type=int, default=_env_int('SHARD_COUNT'),
+                        help="total number of shards (default: Discord's recommendation)")
+    parser.add_argument('--processes', type=int, default=_env_int('CLUSTER_PROCESSES', 1),
+                        help="run the shards across this many processes; global limits are split between them")
+    args = parser.parse_args(argv)
+    if args.processes < 1:
+        parser.error("--processes must be at least 1")
+    if args.shard_count is not None and args.shard_count < args.processes:
+        parser.error("--shard-count must be at least --processes")
+    return args
+
+def run_bot(args, token):
+    """Run one bot for all shards, or a supervised cluster of them when args.processes > 1"""
+    if args.processes > 1:
+        shard_count = args.shard_count or args.processes
+        logger.info(f"Starting Discord bot cluster: {shard_count} shards in {args.processes} processes...")
+        options = {'force_sync': args.force_sync, 'profile_startup': args.profile_startup}
+        ClusterSupervisor(shard_count, args.processes, options=options).run()
+        return
+    logger.info("Starting Discord bot...")
+    # One process runs every shard, so it gets the whole of each global limit
+    set_process_count(1)
+    bot = RamadanBot(force_sync=args.force_sync, profile_startup=args.profile_startup,
+                     shard_count=args.shard_count)
+    bot.run(token, log_handler=None)  # Disable discord.py's logging handler to avoid duplicates
+
+class RamadanBot(commands.AutoShardedBot):
+    def __init__(self, force_sync=False, profile_startup=False, shard_ids=None, shard_count=None, cluster_id=None):
+        self.started_at = time.perf_counter()
+        self.force_sync = force_sync
+        self.profile_startup = profile_startup
+        self.cog_load_times = {}
+        self.ready_logged = False
+        # None outside cluster mode, where this process runs every shard
+        self.cluster_id = cluster_id
         super().__init__(
             command_prefix=['/', '!'],
-            intents=intents,
             help_command=None,
-            application_id=os.getenv('APPLICATION_ID')
+            application_id=os.getenv('APPLICATION_ID'),
+            shard_ids=shard_ids,
+            shard_count=shard_count,
+            **gateway_options()
         )
-        self.thread_mappings = {}
+        self.thread_mappings = ThreadMappingStore()
+        self.thread_index = UserThreadIndex()
+        self.scheduler = DailyScheduler()
         logger.info("Bot initialized with application ID: %s", os.getenv('APPLICATION_ID'))
 
     async def setup_hook(self):
         """Initialize bot and sync commands"""
         try:
+            self.scheduler.start()
+
             # Load cogs first
             logger.info("Loading cogs...")
-            await self.load_extension("cogs.commands")
-            await self.load_extension("cogs.events")
+            for extension in ("cogs.commands", "cogs.events"):
+                start = time.perf_counter()
+                await self.load_extension(extension)
+                self.cog_load_times[extension] = time.perf_counter() - start
+                logger.info(f"Loaded {extension} in {self.cog_load_times[extension]:.2f}s")
             logger.info("Cogs loaded successfully")
+            if self.profile_startup:
+                logger.info(import_profiler.report(self.cog_load_times))
 
-            # Sync commands to Discord...
-            logger.info("Syncing commands to Discord...")
-            try:
-                synced = await self.tree.sync()
-                logger.info(f"Command registration status: updated (synced {len(synced)} commands)")
-
-                # Log each synced command
-                for command in synced:
-                    logger.info(f"Synced command: {command.name}")
-
-            except discord.HTTPException as e:
-                if e.status == 429:  # Rate limit error
-                    logger.warning(f"Command registration status: rate-limited (retry after {e.retry_after} seconds)")
-                else:
-                    logger.error(f"Command registration status: failed (HTTP error {e.status})")
-                    raise
-            except Exception as e:
-                logger.error(f"Command registration status: failed ({str(e)})")
-                raise
+            # Commands are global, so one cluster syncing them is enough
+            if self.cluster_id in (None, 0):
+                await self.sync_commands()
 
         except Exception as e:
             logger.error(f"Failed to setup bot: {str(e)}")
             raise
 
+    def owns_guild(self, guild_id):
+        """Whether this process runs the shard that receives the guild's events"""
+        if self.shard_ids is None:
+            return True
+        return shard_for_guild(guild_id, self.shard_count) in self.shard_ids
+
+    async def sync_commands(self):
+        """Sync application commands, skipping the call when nothing changed since the last sync"""
+        dev_guild_id = os.getenv('DEV_GUILD_ID')
+        guild = discord.Object(id=int(dev_guild_id)) if dev_guild_id else None
+        if guild is not None:
+            # Guild commands update instantly, which is what you want while developing
+            self.tree.copy_global_to(guild=guild)
+        scope = dev_guild_id or 'global'
+
+        sync_state = CommandSyncState()
+        tree_hash = command_tree_hash(self.tree, guild=guild)
+        if sync_state.is_current(scope, tree_hash) and not self.force_sync:
+            logger.info(f"Command registration status: unchanged ({scope}), skipping sync")
+            return
+
+        # Sync commands to Discord...
+        logger.info(f"Syncing commands to Discord ({scope})...")
+        try:
+            synced = await self.tree.sync(guild=guild)
+            sync_state.record(scope, tree_hash)
+            logger.info(f"Command registration status: updated (synced {len(synced)} commands)")
+
+            # Log each synced command
+            for command in synced:
+                logger.info(f"Synced command: {command.name}")
+
+        except discord.HTTPException as e:
+            if e.status == 429:  # Rate limit error
+                logger.warning(f"Command registration status: rate-limited (retry after {e.retry_after} seconds)")
+            else:
+                logger.error(f"Command registration status: failed (HTTP error {e.status})")
+                raise
+        except Exception as e:
+            logger.error(f"Command registration status: failed ({str(e)})")
+            raise
+
     async def on_ready(self):
         """Called when bot is ready"""
-        logger.info(f'Logged in as {self.user.name}')
+        logger.info(f'Logged in as {self.user.name} (shards {self.shard_ids or "all"} of {self.shard_count})')
+        if not self.ready_logged:
+            self.ready_logged = True
+            ready_time = time.perf_counter() - self.started_at
+            metrics.observe('startup.ready_time', ready_time)
+            logger.info(f"Startup to ready: {ready_time:.2f}s")
 
         # Verify command registration
         commands = self.tree.get_commands()
@@ -87,10 +208,20 @@ class RamadanBot(commands.Bot):
         )
         logger.info(f'Invite link: {invite_link}')
 
+    async def close(self):
+        """Persist buffered state before shutting down"""
+        self.scheduler.stop()
+        self.thread_mappings.flush()
+        await super().close()
+
     async def on_error(self, event_method: str, *args, **kwargs):
         """Global error handler"""
         logger.error(f"Error in {event_method}: ", exc_info=True)
 
+    async def on_socket_event_type(self, event_type):
+        """Count every gateway dispatch for the event rate in the runtime stats"""
+        metrics.increment('gateway.events')
+
     async def on_connect(self):
         """Called when the client connects to Discord"""
         logger.info("Connected to Discord Gateway")
@@ -111,9 +242,7 @@ if __name__ == "__main__":
             raise ValueError("DISCORD_TOKEN not found in environment variables")
 
         # Create and run bot
-        bot = RamadanBot()
-        logger.info("Starting Discord bot...")
-        bot.run(token, log_handler=None)  # Disable discord.py's logging handler to avoid duplicates
+        run_bot(parse_args(), token)
     except Exception as e:
         logger.error(f"Bot crashed: {str(e)}")
         raise
\ No newline at end of file
@@ -1,31 +1,83 @@
 import discord
 from discord.ext import commands
 import logging
-from utils.assistant import AssistantManager
-from utils.message_utils import send_long_message
-from utils.pdf_generator import generate_meal_plan_pdf
+from utils.message_utils import send_long_message, StreamingMessage
+from utils.pdf_generator import render_meal_plan_pdf, prewarm_pdf_pool, shutdown_pdf_pool
 import asyncio
+import importlib
+import io
 import os
+import time
 from utils.usda_api import USDAFoodDataAPI
 from utils.open_food_facts_api import OpenFoodFactsAPI
+from utils.enrichment import NutritionEnricher
+from utils.meal_plan import render_meal_plan_text, render_nutrition_summary
+from utils.http_client import get_http_client
+from utils.admission import AdmissionController, AdmissionRejected, Priority
 
 logger = logging.getLogger(__name__)
 
 class Commands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.assistant = AssistantManager()
-        self.bot.thread_mappings = {}
-        self.usda_api = USDAFoodDataAPI()
-        self.off_api = OpenFoodFactsAPI()
+        # Heavy clients are built on first use (or by prewarm) so loading the cog stays fast
+        self._assistant = None
+        self._enricher = None
+        self._prewarm_task = None
+        self.admission = AdmissionController()
         logger.info("Commands cog initialized with USDA and Open Food Facts API integration")
 
+    @property
+    def assistant(self):
+        if self._assistant is None:
+            # Loads the OpenAI SDK, which is slow to import
+            from utils.assistant import AssistantManager
+            self._assistant = AssistantManager()
+        return self._assistant
+
+    @property
+    def enricher(self):
+        if self._enricher is None:
+            self._enricher = NutritionEnricher(USDAFoodDataAPI(), OpenFoodFactsAPI())
+        return self._enricher
+
+    async def prewarm(self):
+        """Load the OpenAI SDK, the nutrition clients and the PDF workers in the background"""
+        start = time.perf_counter()
+        try:
+            # Import off the event loop; constructing the clients afterwards is quick
+            await asyncio.to_thread(importlib.import_module, 'utils.assistant')
+            self.assistant
+            self.enricher
+            await prewarm_pdf_pool()
+            logger.info(f"Pre-warmed heavy dependencies in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            logger.warning(f"Pre-warm failed, dependencies will load on first use: {str(e)}")
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if self._prewarm_task is None and os.getenv('PREWARM', 'true').lower() in ('1', 'true', 'yes'):
+            self._prewarm_task = asyncio.create_task(self.prewarm())
+
+    async def cog_unload(self):
+        if self._prewarm_task is not None:
+            self._prewarm_task.cancel()
+        await get_http_client().close()
+        shutdown_pdf_pool()
+
+    def queue_notice(self, channel):
+        """Build an on_queued callback that tells the user their queue position"""
+        async def notify(position):
+            await channel.send(f"⏳ I'm busy right now — you're queued at position {position}. "
+                               "I'll answer as soon as a slot frees up.")
+        return notify
+
     async def _get_or_create_thread(self, ctx, name):
-        """Create a new thread or get existing one"""
-        # Find existing threads owned by the user
-        existing_threads = [t for t in ctx.channel.threads if t.owner_id == ctx.author.id]
-        if existing_threads:
-            return existing_threads[0]
+        """Return the author's thread for this command in this channel, reopening or creating it as needed"""
+        kind = ctx.command.name
+        thread = await self._indexed_thread(ctx, kind)
+        if thread is not None:
+            return thread
 
         # Create a new public thread that will show in the sidebar
         thread = await ctx.channel.create_thread(
@@ -33,9 +85,35 @@ class Commands(commands.Cog):
             type=discord.ChannelType.public_thread,
             auto_archive_duration=1440  # Archive after 24 hours of inactivity
         )
-        logger.info(f"Thread created and formatted for {ctx.command.name}: {name}")
+        self.bot.thread_index.set(ctx.channel.id, ctx.author.id, kind, thread.id)
+        logger.info(f"Thread created and formatted for {kind}: {name}")
         return thread
 
+    async def _indexed_thread(self, ctx, kind):
+        """Look up the author's thread in the index; None if there is none or it can't be used"""
+        thread_id = self.bot.thread_index.get(ctx.channel.id, ctx.author.id, kind)
+        if thread_id is None:
+            return None
+        try:
+            # Active threads are cached; archived ones need a single fetch
+            thread = ctx.guild.get_thread(thread_id) if ctx.guild else None
+            if thread is None:
+                thread = await self.bot.fetch_channel(thread_id)
+            if thread.archived:
+                if thread.locked:
+                    # Users can't post in a locked thread, so start a fresh one
+                    self.bot.thread_index.discard_thread(thread_id)
+                    return None
+                thread = await thread.edit(archived=False)
+                logger.info(f"Reopened archived thread {thread.name} for {kind}")
+            return thread
+        except discord.NotFound:
+            self.bot.thread_index.discard_thread(thread_id)
+            return None
+        except discord.HTTPException as e:
+            logger.warning(f"Could not reuse thread {thread_id}, creating a new one: {str(e)}")
+            return None
+
     @commands.hybrid_command(
         name='help',
         description='Show available commands and usage information'
@@ -57,17 +135,30 @@ class Commands(commands.Cog):
         thread = await self._get_or_create_thread(ctx, thread_name)
         logger.info(f"Thread created and formatted for rift_taps: {thread_name}")
 
-        # Send initial wait message
-        initial_message = "Let's explore RIFT & TAPS! 💪\nPlease wait a few seconds for processing."
+        # Send initial wait message (cached answers arrive straight away)
+        cached = self.assistant.cached_rift_taps()
+        initial_message = "Let's explore RIFT & TAPS! 💪"
+        if cached is None:
+            initial_message += "\nPlease wait a few seconds for processing."
         await thread.send(initial_message)
         logger.info(f"Initial thread message sent: {initial_message}")
 
-        # Get and store response for real-time chat
-        openai_thread_id, response = await self.assistant.explain_rift_taps()
+        # Stream the response into the thread and store it for real-time chat
+        stream = StreamingMessage(thread)
+        try:
+            if cached is not None:
+                # Cached answers don't touch the assistant, so they skip admission
+                openai_thread_id, response = cached
+                await stream.append(response)
+            else:
+                async with self.admission.slot(ctx.author.id, ctx.guild.id if ctx.guild else None,
+                                               Priority.STANDARD, on_queued=self.queue_notice(thread)):
+                    openai_thread_id, response = await self.assistant.explain_rift_taps(on_delta=stream.append)
+        except AdmissionRejected as e:
+            await thread.send(str(e))
+            return
         self.bot.thread_mappings[thread.id] = openai_thread_id
-
-        # Send the formatted response
-        await send_long_message(thread, response)
+        await stream.finish()
         await thread.send("\nFeel free to ask any follow-up questions about RIFT & TAPS! 👓")
 
         # Send main channel confirmation with thread mention
@@ -201,61 +292,30 @@ class Commands(commands.Cog):
             await thread.send("Fetching nutritional information from USDA and Open Food Facts databases...")
 
             # Generate meal plan using Assistant
-            openai_thread_id, meal_plan = await self.assistant.generate_meal_plan(user_data)
+            try:
+                async with self.admission.slot(ctx.author.id, ctx.guild.id if ctx.guild else None,
+                                               Priority.BULK, on_queued=self.queue_notice(thread)):
+                    openai_thread_id, plan = await self.assistant.generate_meal_plan(user_data)
+            except AdmissionRejected as e:
+                await thread.send(str(e))
+                return
             self.bot.thread_mappings[thread.id] = openai_thread_id
 
-            # Add nutritional data to meal items
-            meal_lines = meal_plan.split('\n')
-            enhanced_meal_plan = []
-
-            # Track total nutritional values
-            total_protein = 0
-            total_carbs = 0
-            total_fats = 0
-            total_calories = 0
-
-            for line in meal_lines:
-                if line.strip().startswith('- ') and ':' not in line:  # Food item line
-                    food_item = line.strip('- ').split('(')[0].strip()  # Extract food name
-
-                    # Get macros from USDA API
-                    macros = self.usda_api.get_food_macros(food_item)
-                    if macros:
-                        total_protein += macros['protein']
-                        total_carbs += macros['carbs']
-                        total_fats += macros['fats']
-                        total_calories += macros['calories']
-
-                        # Get micronutrients from Open Food Facts API
-                        micros = self.off_api.get_micronutrients(food_item)
-                        if micros:
-                            line = f"{line.strip()} {self.usda_api.format_macros(macros)} {self.off_api.format_micronutrients(micros)}"
-                        else:
-                            line = f"{line.strip()} {self.usda_api.format_macros(macros)}"
-                    
-                enhanced_meal_plan.append(line)
-
-            enriched_meal_plan = '\n'.join(enhanced_meal_plan)
+            # Add nutritional data to the parsed plan's food items
+            await self.enricher.enrich(plan)
+            enriched_meal_plan = render_meal_plan_text(plan)
 
             try:
                 # Generate PDF with enriched meal plan
-                pdf_path = generate_meal_plan_pdf(enriched_meal_plan, user_data['name'])
-                await thread.send(file=discord.File(pdf_path))
-                os.remove(pdf_path)  # Clean up
+                pdf_bytes = await render_meal_plan_pdf(plan, user_data['name'])
+                await thread.send(file=discord.File(io.BytesIO(pdf_bytes), filename=f"Meal Plan for {user_data['name']}.pdf"))
 
                 # Send meal plan text and encourage questions
                 await send_long_message(thread, enriched_meal_plan)
                 await thread.send("\nFeel free to ask questions about your meal plan! 🍽️")
 
                 # Send summary of total nutrition
-                summary = (
-                    "📊 **Daily Nutrition Summary**\n"
-                    f"Total Calories: {total_calories:.0f}\n"
-                    f"Total Protein: {total_protein:.1f}g\n"
-                    f"Total Carbs: {total_carbs:.1f}g\n"
-                    f"Total Fats: {total_fats:.1f}g"
-                )
-                await thread.send(summary)
+                await thread.send(render_nutrition_summary(plan))
 
             except Exception as pdf_error:
                 logger.error(f"Error generating PDF: {str(pdf_error)}")
@@ -284,8 +344,23 @@ class Commands(commands.Cog):
         await thread.send("Here's what I found based on Team Akib's guide...")
         await ctx.send(f"Created a thread for your question. Check {thread.mention}! 🤔")
 
-        # Get and store response for real-time chat
-        openai_thread_id, response = await self.assistant.ask_question(question)
+        # Stream the response into the thread and store it for real-time chat
+        stream = StreamingMessage(thread)
+        cached = self.assistant.cached_answer(question)
+        try:
+            if cached is not None:
+                # Near-duplicate of an answered question: no assistant run, so no admission
+                openai_thread_id, response = cached
+                await stream.append(response)
+            else:
+                async with self.admission.slot(ctx.author.id, ctx.guild.id if ctx.guild else None,
+                                               Priority.STANDARD, on_queued=self.queue_notice(thread)):
+                    openai_thread_id, response = await self.assistant.ask_question(
+                        question, on_delta=stream.append, check_cache=False
+                    )
+        except AdmissionRejected as e:
+            await thread.send(str(e))
+            return
         self.bot.thread_mappings[thread.id] = openai_thread_id
 
         # Check if question requires web access
@@ -293,10 +368,10 @@ class Commands(commands.Cog):
         needs_web = any(keyword in question.lower() for keyword in web_keywords)
 
         if needs_web:
-            response += ("\n\nNote: I don't have web access, but based on the Team Akib guide, "
-                        "this is my best answer. For current info, please check online! 🌐")
+            await stream.append("\n\nNote: I don't have web access, but based on the Team Akib guide, "
+                                "this is my best answer. For current info, please check online! 🌐")
 
-        await send_long_message(thread, response)
+        await stream.finish()
         await thread.send("\nFeel free to ask follow-up questions! I'm here to help! 💪")
 
 
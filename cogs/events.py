@@ -1,10 +1,14 @@
 import os
+import time
+import asyncio
 import discord
 from discord.ext import commands, tasks
-import pytz
-from datetime import datetime
 import logging
-from utils.message_utils import send_long_message
+from utils.message_utils import send_long_message, StreamingMessage
+from utils.admission import AdmissionRejected, Priority
+from utils.thread_queue import ThreadWorkQueue
+from utils.time_utils import parse_time_of_day
+from utils.metrics import metrics, process_rss_bytes
 
 logger = logging.getLogger(__name__)
 
@@ -27,11 +31,54 @@ class Events(commands.Cog):
         except ValueError as e:
             raise ValueError(f"Invalid Discord ID format: {str(e)}")
 
-        self.daily_checkin.start()
+        # Opt-in: a new message from the same author this soon after the one being
+        # answered replaces that turn. By default it waits for the next turn instead
+        self.supersede_seconds = float(os.getenv('FOLLOWUP_SUPERSEDE_SECONDS', '0'))
+        self.followups = ThreadWorkQueue(self._answer_followups)
+        self.check_in_hour, self.check_in_minute = parse_time_of_day(os.getenv('CHECK_IN_TIME', '20:00'))
+        self.check_in_timezone = os.getenv('CHECK_IN_TIMEZONE', 'America/New_York')
+        self.check_in_job = f"daily_checkin:{self.check_in_channel_id}"
+        self.check_in_registered = False
+
+        self.last_stats = (time.monotonic(), 0, 0)
+        self.report_runtime_stats.change_interval(seconds=float(os.getenv('RUNTIME_STATS_INTERVAL', '60')))
+
+        self.persist_thread_mappings.start()
+        self.report_runtime_stats.start()
         logger.info("Events cog initialized successfully")
 
+    async def cog_load(self):
+        # In cluster mode the owner is only known once guilds are cached; see on_ready
+        if self.bot.cluster_id is None:
+            self._register_check_in()
+
+    def _register_check_in(self):
+        if self.check_in_registered:
+            return
+        self.bot.scheduler.add_daily(
+            self.check_in_job,
+            self.check_in_hour,
+            self.check_in_minute,
+            self.check_in_timezone,
+            self.daily_checkin
+        )
+        self.check_in_registered = True
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Schedule the check-in only in the cluster whose shards own its channel's guild"""
+        if self.check_in_registered:
+            return
+        channel = self.bot.get_channel(self.check_in_channel_id)
+        if channel is not None and self.bot.owns_guild(channel.guild.id):
+            logger.info(f"Cluster {self.bot.cluster_id} owns the check-in channel, scheduling check-ins")
+            self._register_check_in()
+
     def cog_unload(self):
-        self.daily_checkin.cancel()
+        self.bot.scheduler.remove(self.check_in_job)
+        self.persist_thread_mappings.cancel()
+        self.report_runtime_stats.cancel()
+        self.bot.thread_mappings.flush()
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
@@ -58,58 +105,173 @@ class Events(commands.Cog):
 
     @commands.Cog.listener()
     async def on_message(self, message):
+        metrics.increment('events.messages')
+        # Fast path: almost all traffic is outside assistant threads
+        if not self.bot.thread_mappings.has(message.channel.id):
+            return
+
         # Ignore bot messages
         if message.author.bot:
             return
 
-        # Handle messages in threads
-        if isinstance(message.channel, discord.Thread):
-            if message.channel.id in self.bot.thread_mappings:
-                try:
-                    # Forward message to Assistant
-                    response = await self.bot.get_cog('Commands').assistant.continue_conversation(
-                        self.bot.thread_mappings[message.channel.id],
-                        message.content
-                    )
-                    await send_long_message(message.channel, response)
-                    logger.debug(f"Processed thread message in {message.channel.name}")
-                except Exception as e:
-                    logger.error(f"Error processing thread message: {str(e)}")
-                    await message.channel.send("Sorry, I encountered an error processing your message. Please try again.")
-
-    @tasks.loop(minutes=1)
-    async def daily_checkin(self):
-        now = datetime.now(pytz.timezone('America/New_York'))
-
-        # Check if it's 8 PM EST
-        if now.hour == 20 and now.minute == 0:
-            try:
-                channel = self.bot.get_channel(self.check_in_channel_id)
-                if not channel:
-                    logger.error(f"Could not find channel with ID {self.check_in_channel_id}")
-                    return
-
-                message = (
-                    f"<@&{self.guided_members_role_id}> Time for your daily check-in! 💪\n"
-                    "**RIFT & TAPS Progress**\n"
-                    "React: 💧 Hydration, 🍎 Timing, 🏋️ Workout\n"
-                    "Answer below..."
+        # Queue messages in mapped threads; bursts are merged into one assistant turn
+        running = self.followups.running(message.channel.id)
+        if running and self._supersedes(message, running):
+            # Answer the earlier message and its correction together instead
+            self.followups.requeue(message.channel.id, self.followups.cancel(message.channel.id))
+        self.followups.submit(message.channel.id, message)
+
+    def _supersedes(self, message, running):
+        """Whether a new message should restart the turn answering running"""
+        last = running[-1]
+        if last.author.id != message.author.id:
+            return False
+        # An explicit reply to a message being answered amends it
+        reference = message.reference
+        if reference is not None and any(m.id == reference.message_id for m in running):
+            return True
+        return (self.supersede_seconds > 0 and
+                (message.created_at - last.created_at).total_seconds() <= self.supersede_seconds)
+
+    def _replace_followup(self, thread_id, message_id, replacement=None):
+        """Swap an edited message into its queued or in-flight turn, or drop a deleted one"""
+        def swap(batch):
+            if replacement is None:
+                return [m for m in batch if m.id != message_id]
+            return [replacement if m.id == message_id else m for m in batch]
+
+        running = self.followups.running(thread_id)
+        if running and any(m.id == message_id for m in running):
+            self.followups.requeue(thread_id, swap(self.followups.cancel(thread_id)))
+            logger.info(f"Restarting reply in thread {thread_id} after message {message_id} changed")
+        else:
+            self.followups.update_pending(thread_id, swap)
+
+    @commands.Cog.listener()
+    async def on_message_edit(self, before, after):
+        if not self.bot.thread_mappings.has(after.channel.id):
+            return
+        if after.author.bot or before.content == after.content:
+            return
+        self._replace_followup(after.channel.id, after.id, after)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        if self.bot.thread_mappings.has(payload.channel_id):
+            self._replace_followup(payload.channel_id, payload.message_id)
+
+    async def _answer_followups(self, thread_id, messages):
+        """Run one assistant turn for a batch of follow-up messages in a thread"""
+        last_message = messages[-1]
+        channel = last_message.channel
+        content = '\n\n'.join(m.content for m in messages if m.content)
+        stream = StreamingMessage(channel)
+        try:
+            # Forward message to Assistant and stream the reply back
+            commands_cog = self.bot.get_cog('Commands')
+            openai_thread_id = self.bot.thread_mappings.get(thread_id)
+            if openai_thread_id is None:
+                return
+            guild_id = last_message.guild.id if last_message.guild else None
+            async with commands_cog.admission.slot(last_message.author.id, guild_id, Priority.INTERACTIVE,
+                                                   on_queued=commands_cog.queue_notice(channel)):
+                resolved_thread_id = await commands_cog.assistant.resolve_thread(openai_thread_id)
+                if resolved_thread_id != openai_thread_id:
+                    self.bot.thread_mappings[thread_id] = resolved_thread_id
+                await commands_cog.assistant.continue_conversation(
+                    resolved_thread_id,
+                    content,
+                    on_delta=stream.append
                 )
-                check_in_msg = await send_long_message(channel, message)
+            await stream.finish()
+            logger.debug(f"Processed {len(messages)} thread message(s) in {channel.name}")
+        except asyncio.CancelledError:
+            # Superseded: don't leave a half-written answer behind
+            await asyncio.shield(stream.discard())
+            raise
+        except AdmissionRejected as e:
+            await channel.send(str(e))
+        except Exception as e:
+            logger.error(f"Error processing thread message: {str(e)}")
+            await channel.send("Sorry, I encountered an error processing your message. Please try again.")
 
-                # Add reactions
-                reactions = ['💧', '🍎', '🏋️']
-                for reaction in reactions:
-                    await check_in_msg.add_reaction(reaction)
+    @commands.Cog.listener()
+    async def on_thread_update(self, before, after):
+        # Archived threads stop being answered, so drop their mapping
+        if after.archived and not before.archived:
+            self.followups.clear(after.id)
+            if self.bot.thread_mappings.pop(after.id) is not None:
+                logger.info(f"Removed mapping for archived thread {after.name}")
+        # Archived threads are reopened on the next command, locked ones can't be
+        if after.locked and not before.locked and self.bot.thread_index.discard_thread(after.id):
+            logger.info(f"Removed locked thread {after.name} from the user thread index")
 
-                logger.info("Daily check-in message posted successfully")
+    @commands.Cog.listener()
+    async def on_raw_thread_delete(self, payload):
+        self.followups.clear(payload.thread_id)
+        self.bot.thread_index.discard_thread(payload.thread_id)
+        if self.bot.thread_mappings.pop(payload.thread_id) is not None:
+            logger.info(f"Removed mapping for deleted thread {payload.thread_id}")
 
-            except Exception as e:
-                logger.error(f"Error posting daily check-in: {str(e)}")
+    @tasks.loop(seconds=10)
+    async def persist_thread_mappings(self):
+        """Flush batched thread mapping writes and prune idle mappings"""
+        try:
+            self.bot.thread_mappings.flush()
+            if self.persist_thread_mappings.current_loop % 360 == 0:
+                self.bot.thread_mappings.prune_idle()
+        except Exception as e:
+            logger.error(f"Error persisting thread mappings: {str(e)}")
 
-    @daily_checkin.before_loop
-    async def before_daily_checkin(self):
+    @tasks.loop(seconds=60)
+    async def report_runtime_stats(self):
+        """Record RSS and gateway/message event rates, to compare gateway profiles"""
+        try:
+            now = time.monotonic()
+            counters = metrics.snapshot()['counters']
+            events = counters.get('gateway.events', 0)
+            messages = counters.get('events.messages', 0)
+            last_time, last_events, last_messages = self.last_stats
+            self.last_stats = (now, events, messages)
+            elapsed = now - last_time
+            if elapsed <= 0:
+                return
+            rss = process_rss_bytes()
+            event_rate = (events - last_events) / elapsed
+            message_rate = (messages - last_messages) / elapsed
+            metrics.set_gauge('process.rss_bytes', rss)
+            metrics.set_gauge('gateway.events_per_second', event_rate)
+            metrics.set_gauge('events.messages_per_second', message_rate)
+            logger.info(f"Runtime stats: RSS {rss / 1024 / 1024:.1f} MiB, "
+                        f"{event_rate:.1f} gateway events/s, {message_rate:.1f} messages/s")
+        except Exception as e:
+            logger.error(f"Error reporting runtime stats: {str(e)}")
+
+    async def daily_checkin(self):
+        """Post the daily check-in; run by the scheduler at CHECK_IN_TIME"""
         await self.bot.wait_until_ready()
+        channel = self.bot.get_channel(self.check_in_channel_id)
+        if not channel:
+            # Raise so the scheduler retries instead of marking the day done
+            raise RuntimeError(f"Could not find channel with ID {self.check_in_channel_id}")
+
+        message = (
+            f"<@&{self.guided_members_role_id}> Time for your daily check-in! 💪\n"
+            "**RIFT & TAPS Progress**\n"
+            "React: 💧 Hydration, 🍎 Timing, 🏋️ Workout\n"
+            "Answer below..."
+        )
+        check_in_msg = (await send_long_message(channel, message))[-1]
+
+        logger.info("Daily check-in message posted successfully")
+
+        # Add reactions; the post itself succeeded, so failures here must not trigger a retry
+        try:
+            reactions = ['💧', '🍎', '🏋️']
+            for reaction in reactions:
+                await check_in_msg.add_reaction(reaction)
+        except Exception as e:
+            logger.error(f"Error adding check-in reactions: {str(e)}")
 
 async def setup(bot):
     await bot.add_cog(Events(bot))
\ No newline at end of file
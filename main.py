@@ -1,22 +1,29 @@
 import os
+import sys
 import logging
-from bot import RamadanBot
+from utils.startup_profile import import_profiler
+
+# Install before importing the bot so its imports show up in the profile. Cluster
+# workers re-run this file as __mp_main__ with the same argv, so they profile too
+if __name__ in ("__main__", "__mp_main__") and '--profile-startup' in sys.argv:
+    import_profiler.install()
+
+from bot import parse_args, run_bot
 
 # Setup logging
 logging.basicConfig(level=logging.DEBUG)  # Temporarily increase logging level
 logger = logging.getLogger(__name__)
 
-try:
-    # Get environment variables
-    token = os.getenv('DISCORD_TOKEN')
-    if not token:
-        raise ValueError("DISCORD_TOKEN not found in environment variables")
+if __name__ == "__main__":
+    # Guarded so PDF worker processes (spawned, which re-imports this file) don't start a bot
+    try:
+        # Get environment variables
+        token = os.getenv('DISCORD_TOKEN')
+        if not token:
+            raise ValueError("DISCORD_TOKEN not found in environment variables")
 
-    # Create and run bot
-    logger.info("Starting Discord bot...")
-    bot = RamadanBot()
-    # Run the bot without a log handler to prevent duplicate logs
-    bot.run(token, log_handler=None)
-except Exception as e:
-    logger.error(f"Bot crashed: {str(e)}")
-    raise
\ No newline at end of file
+        # Create and run bot (or a cluster of them with --processes)
+        run_bot(parse_args(), token)
+    except Exception as e:
+        logger.error(f"Bot crashed: {str(e)}")
+        raise
\ No newline at end of file
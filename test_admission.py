@@ -0,0 +1,99 @@
+import asyncio
+
+from utils.admission import AdmissionController, Priority, QueueFullError, RateLimitedError
+
+
+def test_abandoned_waiters_free_their_queue_place():
+    async def run():
+        admission = AdmissionController(max_concurrent=1, max_queue=3)
+        admission.user_burst = admission.guild_burst = 100
+        release = asyncio.Event()
+
+        async def hold():
+            async with admission.slot('holder', priority=Priority.BULK):
+                await release.wait()
+
+        async def wait(user_id):
+            async with admission.slot(user_id):
+                return user_id
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        # Three requests time out while waiting; their places must be given back
+        for i in range(3):
+            try:
+                async with asyncio.timeout(0.01):
+                    await wait(f"gone-{i}")
+            except TimeoutError:
+                pass
+        assert admission.waiting == 0
+
+        positions = []
+
+        async def on_queued(position):
+            positions.append(position)
+
+        async def waiter():
+            async with admission.slot('waiter', on_queued=on_queued):
+                return True
+
+        queued = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        assert positions == [1]
+        release.set()
+        assert await queued
+        await holder
+        assert admission.active == 0 and admission.waiting == 0
+
+    asyncio.run(run())
+
+
+def test_guild_rejection_keeps_user_token():
+    async def run():
+        admission = AdmissionController(max_concurrent=4, max_queue=4)
+        admission.user_burst = 1
+        admission.guild_burst = 1
+        async with admission.slot('first', guild_id=1):
+            pass
+        try:
+            async with admission.slot('second', guild_id=1):
+                pass
+            raise AssertionError("guild limit not applied")
+        except RateLimitedError as e:
+            assert e.scope == 'guild'
+        # The rejected request didn't use up the user's own allowance
+        async with admission.slot('second', guild_id=2):
+            pass
+
+    asyncio.run(run())
+
+
+def test_queue_full_counts_only_live_waiters():
+    async def run():
+        admission = AdmissionController(max_concurrent=1, max_queue=1)
+        admission.user_burst = 100
+        async with admission.slot('holder'):
+            waiter = asyncio.create_task(admission.slot('a').__aenter__())
+            await asyncio.sleep(0)
+            try:
+                async with admission.slot('b'):
+                    pass
+                raise AssertionError("queue limit not applied")
+            except QueueFullError:
+                pass
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            # The cancelled waiter no longer counts toward the limit
+            queued = asyncio.create_task(admission.slot('c').__aenter__())
+            await asyncio.sleep(0)
+            assert admission.waiting == 1
+        await queued
+        assert admission.active == 1
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_abandoned_waiters_free_their_queue_place()
+    test_guild_rejection_keeps_user_token()
+    test_queue_full_counts_only_live_waiters()
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from utils.assistant import AssistantManager
+from utils.question_cache import QuestionCache
+from utils.run_scheduler import RunScheduler
+
+CALL_DELAY = 0.05
+
+
+class FakeThreadsAPI:
+    """Minimal stand-in for client.beta.threads that sleeps like a network call"""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.runs = SimpleNamespace(create=self._create_run, retrieve=self._retrieve_run)
+        self.messages = SimpleNamespace(create=self._create_message, list=self._list_messages)
+
+    async def _call(self, result):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(CALL_DELAY)
+            return result
+        finally:
+            self.active -= 1
+
+    async def create(self, **kwargs):
+        return await self._call(SimpleNamespace(id='thread_test'))
+
+    async def _create_message(self, **kwargs):
+        return await self._call(None)
+
+    async def _create_run(self, **kwargs):
+        return await self._call(SimpleNamespace(id='run_test', status='queued'))
+
+    async def _retrieve_run(self, **kwargs):
+        return await self._call(SimpleNamespace(id='run_test', status='completed'))
+
+    async def _list_messages(self, **kwargs):
+        text = SimpleNamespace(value='answer')
+        message = SimpleNamespace(content=[SimpleNamespace(text=text)])
+        return await self._call(SimpleNamespace(data=[message]))
+
+
+def test_parallel_ask_question_overlaps():
+    parallel = 8
+
+    async def run():
+        manager = AssistantManager()
+        threads_api = FakeThreadsAPI()
+        manager.client = SimpleNamespace(beta=SimpleNamespace(threads=threads_api))
+        manager.run_scheduler = RunScheduler(manager.client, min_interval=0.01)
+        manager.question_cache = QuestionCache(path=os.path.join(tempfile.mkdtemp(), 'questions.sqlite3'))
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            manager.ask_question(f"question {i}", check_cache=False) for i in range(parallel)
+        ))
+        return time.perf_counter() - start, results, threads_api.max_active
+
+    elapsed, results, max_active = asyncio.run(run())
+
+    assert all(response == 'answer' for _, response in results)
+    # Each ask_question makes 5 sequential calls; run serially this would take
+    # parallel * 5 * CALL_DELAY, so overlapping calls must finish far sooner
+    serial_time = parallel * 5 * CALL_DELAY
+    assert elapsed < serial_time / 2
+    assert max_active == parallel
+
+
+def count_status_calls(users, run_duration=0.3):
+    """Run the scheduler against fake runs that finish after run_duration seconds"""
+
+    async def run():
+        started = {}
+
+        async def retrieve(thread_id, run_id, **kwargs):
+            started.setdefault(run_id, time.monotonic())
+            done = time.monotonic() - started[run_id] >= run_duration
+            return SimpleNamespace(id=run_id, status='completed' if done else 'in_progress', last_error=None)
+
+        client = SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(runs=SimpleNamespace(retrieve=retrieve))))
+        scheduler = RunScheduler(client, poll_budget=50, min_interval=0.01, max_interval=0.1)
+        await asyncio.gather(*(scheduler.wait_for('thread', f"run_{i}") for i in range(users)))
+        return scheduler.status_calls
+
+    return asyncio.run(run())
+
+
+def test_status_calls_grow_slower_than_users():
+    few_users, many_users = 5, 50
+    few_calls = count_status_calls(few_users)
+    many_calls = count_status_calls(many_users)
+
+    assert many_calls / few_calls < many_users / few_users
+
+
+if __name__ == "__main__":
+    test_parallel_ask_question_overlaps()
+    test_status_calls_grow_slower_than_users()
+    print("Parallel ask_question calls overlap and status polling scales sublinearly")
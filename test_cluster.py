@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+
+from utils import cluster
+from utils.cluster import ClusterSupervisor, build_worker_bot, process_share, shard_for_guild, shard_groups
+
+# Guild ids spread over every shard of an 8-shard bot
+GUILD_IDS = [(n << 22) + 1234 for n in range(40)]
+
+
+def fake_worker(cluster_id, shard_ids, shard_count, options):
+    """Stands in for a gateway connection: records its shards, then stays up or crashes once"""
+    path = os.path.join(options['dir'], f"cluster-{cluster_id}")
+    starts = 0
+    if os.path.exists(path):
+        with open(path) as f:
+            starts = len(f.read().splitlines())
+    with open(path, 'a') as f:
+        f.write(f"{shard_count}:{','.join(map(str, shard_ids))}:{options['processes']}\n")
+    if cluster_id == options.get('crash') and starts == 0:
+        sys.exit(1)
+    time.sleep(60)
+
+
+def gateway_worker(cluster_id, shard_ids, shard_count, options):
+    """Builds the real bot for this worker, without connecting, and records what it owns"""
+    os.environ['BOT_DATA_DIR'] = options.pop('dir')
+    bot = build_worker_bot(cluster_id, shard_ids, shard_count, options)
+    owned = [guild_id for guild_id in GUILD_IDS if bot.owns_guild(guild_id)]
+    path = os.path.join(os.environ['BOT_DATA_DIR'], f"cluster-{cluster_id}")
+    with open(path, 'w') as f:
+        f.write(f"{bot.shard_count}:{','.join(map(str, bot.shard_ids))}:{process_share(16)}:"
+                f"{','.join(map(str, owned))}\n")
+    time.sleep(60)
+
+
+def read_starts(directory, cluster_id):
+    path = os.path.join(directory, f"cluster-{cluster_id}")
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def wait_for(condition, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def test_shard_groups_cover_every_shard_once():
+    assert shard_groups(8, 3) == [[0, 1, 2], [3, 4, 5], [6, 7]]
+    assert shard_groups(2, 4) == [[0], [1]]
+    for shard_count, processes in ((1, 1), (10, 4), (16, 16)):
+        groups = shard_groups(shard_count, processes)
+        assert sorted(shard for group in groups for shard in group) == list(range(shard_count))
+
+
+def test_shard_for_guild():
+    # Discord's routing formula: (guild_id >> 22) % shard_count
+    guild_id = 41771983423143937
+    assert shard_for_guild(guild_id, 1) == 0
+    assert shard_for_guild(guild_id, 4) == (guild_id >> 22) % 4
+    assert shard_for_guild(5 << 22, 4) == 1
+
+
+def test_process_share_splits_global_limits():
+    assert process_share(16, 4) == 4
+    assert process_share(10.0, 4) == 2.5
+    assert process_share(2, 4) == 1
+    previous = os.environ.get('CLUSTER_PROCESSES')
+    try:
+        # Only the count passed in by run_bot or the supervisor counts, not a leftover env var
+        os.environ['CLUSTER_PROCESSES'] = '4'
+        cluster.set_process_count(1)
+        assert process_share(16) == 16
+        cluster.set_process_count(4)
+        assert process_share(16) == 4
+    finally:
+        cluster.set_process_count(1)
+        if previous is None:
+            os.environ.pop('CLUSTER_PROCESSES', None)
+        else:
+            os.environ['CLUSTER_PROCESSES'] = previous
+
+
+def test_supervisor_runs_and_restarts_workers():
+    with tempfile.TemporaryDirectory() as directory:
+        supervisor = ClusterSupervisor(
+            4, 2, target=fake_worker, options={'dir': directory, 'crash': 1},
+            poll_interval=0.1, min_backoff=0.1
+        )
+        runner = threading.Thread(target=supervisor.run)
+        runner.start()
+        try:
+            assert wait_for(lambda: read_starts(directory, 0) and len(read_starts(directory, 1)) >= 2)
+            assert read_starts(directory, 0) == ["4:0,1:2"]
+            assert read_starts(directory, 1)[:2] == ["4:2,3:2", "4:2,3:2"]
+            assert supervisor.restarts == [0, 1]
+            assert wait_for(lambda: supervisor.alive() == [0, 1])
+        finally:
+            supervisor.stop()
+            runner.join(30)
+        assert not runner.is_alive()
+        assert supervisor.alive() == []
+
+
+def test_workers_own_the_guilds_routed_to_their_shards():
+    with tempfile.TemporaryDirectory() as directory:
+        supervisor = ClusterSupervisor(8, 3, target=gateway_worker, options={'dir': directory},
+                                       poll_interval=0.1)
+        runner = threading.Thread(target=supervisor.run)
+        runner.start()
+        try:
+            assert wait_for(lambda: all(read_starts(directory, i) for i in range(3)))
+        finally:
+            supervisor.stop()
+            runner.join(30)
+
+        owned_anywhere = []
+        for cluster_id, group in enumerate(shard_groups(8, 3)):
+            shard_count, shard_ids, share, owned = read_starts(directory, cluster_id)[0].split(':')
+            assert int(shard_count) == 8
+            assert [int(shard) for shard in shard_ids.split(',')] == group
+            assert int(share) == process_share(16, 3)
+            for guild_id in map(int, owned.split(',')):
+                assert shard_for_guild(guild_id, 8) in group
+                owned_anywhere.append(guild_id)
+        # Every guild's events land in exactly one process
+        assert sorted(owned_anywhere) == sorted(GUILD_IDS)
+
+
+if __name__ == "__main__":
+    test_shard_groups_cover_every_shard_once()
+    test_shard_for_guild()
+    test_process_share_splits_global_limits()
+    test_supervisor_runs_and_restarts_workers()
+    test_workers_own_the_guilds_routed_to_their_shards()
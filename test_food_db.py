@@ -0,0 +1,74 @@
+import csv
+import os
+import tempfile
+
+from utils.food_db import LocalFoodDatabase, main
+
+FOODS = [
+    # fdc_id, data_type, description
+    (1, 'sr_legacy_food', 'Chicken, broilers or fryers, breast, meat only, cooked, roasted'),
+    (2, 'sr_legacy_food', 'Chicken, broilers or fryers, breast, skinless, boneless, meat only, raw'),
+    (3, 'foundation_food', 'Rice, white, long-grain, regular, cooked'),
+    (4, 'survey_fndds_food', 'Rice, brown, cooked'),
+    (5, 'branded_food', 'BRAND X CHICKEN BREAST STRIPS'),  # not a dataset we import
+    (6, 'sr_legacy_food', 'Chicken soup, with rice, canned')
+]
+
+# fdc_id, nutrient_id, amount: protein 1003, fat 1004, carbs 1005 / 1050, energy 1008 / 2047
+NUTRIENTS = [
+    (1, 1003, '31.0'), (1, 1004, '3.6'), (1, 1005, '0'), (1, 1008, '165'),
+    (2, 1003, '22.5'), (2, 1004, '2.6'), (2, 1005, '0'), (2, 1008, '120'),
+    (3, 1003, '2.7'), (3, 1004, '0.3'), (3, 1050, '28.0'), (3, 2047, '130'),
+    (4, 1003, '2.6'), (4, 1004, '0.9'), (4, 1005, '23.0'), (4, 1008, '112'), (4, 2047, '999'),
+    (5, 1003, '20.0'), (5, 1008, '150'),
+    (6, 1003, '1.5'), (6, 1005, '4.0'), (6, 1008, '')
+]
+
+
+def write_dataset(directory):
+    with open(os.path.join(directory, 'food.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['fdc_id', 'data_type', 'description', 'food_category_id', 'publication_date'])
+        for fdc_id, data_type, description in FOODS:
+            writer.writerow([fdc_id, data_type, description, '', '2019-04-01'])
+    with open(os.path.join(directory, 'food_nutrient.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'fdc_id', 'nutrient_id', 'amount'])
+        for row_id, (fdc_id, nutrient_id, amount) in enumerate(NUTRIENTS, 1):
+            writer.writerow([row_id, fdc_id, nutrient_id, amount])
+
+
+def test_import_counts_and_reimport_is_idempotent():
+    with tempfile.TemporaryDirectory() as directory:
+        write_dataset(directory)
+        database = LocalFoodDatabase(os.path.join(directory, 'foods.sqlite3'))
+        assert database.import_dataset(directory) == 5
+        assert database.count() == 5
+        assert database.import_dataset(directory) == 5
+        assert database.count() == 5
+        fts_rows = database._db.execute("SELECT COUNT(*) FROM foods_fts WHERE foods_fts MATCH 'chicken'").fetchone()[0]
+        assert fts_rows == 3
+
+
+def test_lookup_ranking_and_nutrient_priority():
+    with tempfile.TemporaryDirectory() as directory:
+        write_dataset(directory)
+        path = os.path.join(directory, 'foods.sqlite3')
+        assert main(['import', directory, '--db', path]) == 0
+        database = LocalFoodDatabase.open_existing(path)
+
+        # Every word has to match, and the closest (shortest) description wins
+        assert database.lookup('brown rice') == {'protein': 2.6, 'carbs': 23.0, 'fats': 0.9, 'calories': 112.0}
+        assert database.lookup('white rice')['calories'] == 130.0
+        assert database.lookup('chicken breast raw')['protein'] == 22.5
+        # BM25 favours the shorter description when both contain every word
+        assert database.lookup('chicken breast')['protein'] == 31.0
+        assert database.lookup('rice')['calories'] == 112.0
+        # Foods without an energy value are never returned
+        assert database.lookup('chicken soup') is None
+        assert database.lookup('quinoa') is None
+
+
+if __name__ == "__main__":
+    test_import_counts_and_reimport_is_idempotent()
+    test_lookup_ranking_and_nutrient_priority()
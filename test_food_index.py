@@ -0,0 +1,51 @@
+from utils.food_db import _fts_query
+from utils.food_index import FoodIndex
+from utils.open_food_facts_api import DEFAULT_MICRONUTRIENTS, DEFAULT_MICRONUTRIENTS_INDEX
+from utils.usda_api import DEFAULT_MACROS, DEFAULT_MACROS_INDEX
+
+# Everyday names for foods in the default tables, and the entry each should use
+DEFAULT_NAMES = {
+    'brown rice': 'rice',
+    'white rice': 'rice',
+    'boiled eggs': 'egg',
+    'scrambled eggs': 'egg',
+    'egg whites': 'egg',
+    'greek yogurt': 'yogurt',
+    'medjool dates': 'dates',
+    'skim milk': 'milk',
+    'rolled oats': 'oatmeal',
+    'whole wheat bread': 'bread',
+    'grilled chicken breast': 'chicken breast',
+    'chiken brest': 'chicken breast',
+    'bananas': 'banana',
+    'whey': 'protein powder'
+}
+
+
+def test_modified_names_hit_their_defaults():
+    for query, name in DEFAULT_NAMES.items():
+        assert DEFAULT_MACROS_INDEX.best(query) == DEFAULT_MACROS[name], query
+        if name in DEFAULT_MICRONUTRIENTS:
+            assert DEFAULT_MICRONUTRIENTS_INDEX.best(query) == DEFAULT_MICRONUTRIENTS[name], query
+
+
+def test_different_foods_do_not_match_a_shorter_name():
+    index = FoodIndex({'potato': 1, 'butter': 2, 'milk': 3, 'rice': 4})
+    for query in ('sweet potato', 'peanut butter', 'almond milk', 'chocolate milk'):
+        assert index.best(query) is None, query
+    assert DEFAULT_MACROS_INDEX.best('almond milk') is None
+    # Close enough for the defaults, not for reusing a cached lookup
+    assert index.best('brown rice') == 4
+    assert index.best('brown rice', threshold=0.9) is None
+
+
+def test_fts_query_keeps_the_users_words():
+    assert _fts_query('Rolled oats') == '"rolled" "oat"'
+    assert _fts_query('naan') == '"naan"'
+    assert _fts_query('whey') == '"whey"'
+
+
+if __name__ == "__main__":
+    test_modified_names_hit_their_defaults()
+    test_different_foods_do_not_match_a_shorter_name()
+    test_fts_query_keeps_the_users_words()
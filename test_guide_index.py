@@ -0,0 +1,86 @@
+import os
+import tempfile
+
+from utils.guide_index import GuideIndex, GuideSection
+
+# A small guide, one section per file
+GUIDE = """
+Hydration during Ramadan: drink water steadily between iftar and suhoor instead of all at once. Aim for two to three litres spread over the evening, add a pinch of salt or an electrolyte tablet after training, and limit coffee and tea because caffeine increases fluid loss. Dehydration shows up as headaches, dark urine and poor pumps, so check these every day of the fast. Fruit such as watermelon and cucumber at iftar also counts toward your fluid intake.
+
+Training time: the best time to lift while fasting is one to two hours after iftar, once the first meal has been digested. Training just before iftar works for short sessions, but keep the volume low and the intensity moderate, since you cannot drink or refuel until the sun sets and heavy sessions then raise the risk of dizziness. Keep sessions under an hour and move cardio to the evening as well.
+
+Protein at suhoor: eat a slow digesting protein such as casein, greek yogurt or eggs at suhoor to limit muscle breakdown during the fast. Around forty grams is a good target for most lifters, combined with complex carbohydrates like oats and some healthy fats to keep you full until the afternoon. Drink a large glass of water with it and avoid very salty foods at this meal.
+
+Protein at iftar: break the fast with dates and water, then eat a full meal with a lean protein such as chicken, fish or lentils. Spread the rest of the day's protein across iftar, a post training shake and suhoor so each feeding reaches roughly thirty to forty grams of protein for recovery. Keep fried foods and sweets small so the meal doesn't leave you sluggish for taraweeh.
+"""
+
+
+def build_index(directory):
+    for number, section in enumerate(GUIDE.strip().split('\n\n'), 1):
+        with open(os.path.join(directory, f"guide-{number}.txt"), 'w', encoding='utf-8') as f:
+            f.write(section)
+    return GuideIndex.from_files(os.path.join(directory, '*.txt'))
+
+
+def test_sections_are_indexed_from_guide_files():
+    with tempfile.TemporaryDirectory() as directory:
+        index = build_index(directory)
+        assert len(index.sections) == 4
+        assert [section.source for section in index.sections] == [f"guide-{n}.txt" for n in range(1, 5)]
+    # Without GUIDE_FILES there is nothing to answer from
+    previous = os.environ.pop('GUIDE_FILES', None)
+    try:
+        assert len(GuideIndex.from_files().sections) == 0
+    finally:
+        if previous is not None:
+            os.environ['GUIDE_FILES'] = previous
+
+
+def test_exact_question_returns_its_section():
+    with tempfile.TemporaryDirectory() as directory:
+        index = build_index(directory)
+        section = index.instant_answer("What is the best time to lift while fasting after iftar?")
+        assert section is not None and section.text.startswith("Training time")
+        section = index.instant_answer("Does caffeine in coffee and tea increase fluid loss and dehydration?")
+        assert section is not None and section.text.startswith("Hydration")
+        # A partial match isn't an answer, but still supplies a snippet for the prompt
+        question = "Should I take an electrolyte tablet after training to avoid dehydration headaches?"
+        assert index.instant_answer(question) is None
+        assert [text[:9] for text in index.snippets(question)] == ["Hydration"]
+
+
+def test_near_tie_returns_none():
+    with tempfile.TemporaryDirectory() as directory:
+        index = build_index(directory)
+        # Both protein sections match about equally well, so neither is an answer
+        results = index.search("how many grams of protein should I eat", limit=2)
+        assert results[1][0] > results[0][0] * 0.8
+        # Full coverage and a low score bar: only the clear-winner rule rejects it
+        assert results[0][1] == results[1][1] == 1.0
+        assert index.instant_answer("how many grams of protein should I eat", min_score=1) is None
+        assert index.instant_answer("best time to lift while fasting", min_score=1).text.startswith("Training")
+        # Too few terms to trust any match
+        assert index.instant_answer("hydration") is None
+
+
+def test_snippet_cutoff_is_applied():
+    sections = [
+        GuideSection('guide.txt', "Creatine monohydrate keeps working during Ramadan; take five grams with iftar."),
+        GuideSection('guide.txt', "Sleep in two blocks: after taraweeh and after suhoor, seven hours in total."),
+        GuideSection('guide.txt', "Walk for twenty minutes after iftar to help digestion.")
+    ]
+    index = GuideIndex(sections)
+    question = "should I take creatine monohydrate with iftar"
+    coverages = {section.text: coverage for _, coverage, section in index.search(question)}
+    assert coverages[sections[0].text] >= 0.6 > coverages[sections[2].text]
+    assert index.snippets(question) == [sections[0].text]
+    assert index.snippets(question, min_coverage=0.01) == [sections[0].text, sections[2].text]
+    # Long sections are cut at a word boundary
+    assert index.snippets(question, max_chars=30) == ["Creatine monohydrate keeps..."]
+
+
+if __name__ == "__main__":
+    test_sections_are_indexed_from_guide_files()
+    test_exact_question_returns_its_section()
+    test_near_tie_returns_none()
+    test_snippet_cutoff_is_applied()
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from utils import message_utils
+from utils.message_utils import pack_message, send_long_message, DISCORD_MESSAGE_LIMIT
+
+
+def make_answer(size=20000):
+    """A long assistant-style answer with headers, bullets and a code block"""
+    paragraphs = []
+    i = 0
+    while sum(len(p) + 2 for p in paragraphs) < size:
+        i += 1
+        paragraphs.append(f"**Section {i}**")
+        paragraphs.append("\n".join(f"- Tip {i}.{j}: eat dates and drink water at iftar " * 2 for j in range(4)))
+        if i % 5 == 0:
+            paragraphs.append("```\n" + "\n".join(f"meal_{j} = {j * 100} kcal" for j in range(30)) + "\n```")
+    return "\n\n".join(paragraphs)[:size]
+
+
+def test_pack_message_respects_limit_and_code_blocks():
+    content = make_answer()
+    chunks = pack_message(content)
+
+    assert all(len(chunk) <= DISCORD_MESSAGE_LIMIT for chunk in chunks)
+    # Packed close to the limit: no more chunks than needed plus a little slack
+    assert len(chunks) <= len(content) // DISCORD_MESSAGE_LIMIT + 3
+    # Every chunk renders its code blocks completely
+    assert all(chunk.count("```") % 2 == 0 for chunk in chunks[:-1])
+    # Nothing is lost apart from the whitespace at cut points
+    assert "\n".join(chunks).replace("```", "").split() == content.replace("```", "").split()
+
+
+def test_pack_message_reserves_room_for_closing_fence():
+    # A code block opening just under the limit used to push the chunk over it once closed
+    for limit in (DISCORD_MESSAGE_LIMIT, message_utils.EMBED_CHUNK_LIMIT):
+        for size in range(limit - 12, limit + 1):
+            content = "a" * size + "\n```\n" + "b" * 20 + "\n```"
+            chunks = pack_message(content, limit)
+            assert all(len(chunk) <= limit for chunk in chunks), (limit, size, [len(c) for c in chunks])
+            assert all(chunk.count("```") % 2 == 0 for chunk in chunks)
+
+
+def test_pack_message_long_fence_lines():
+    # Fence lines longer than half the limit used to loop forever
+    contents = [
+        '```json {"meals": [' + ', '.join(f'{{"name": "meal {i}", "kcal": {i * 10}}}' for i in range(200)) + ']}```',
+        '```' + 'x' * 1995,
+        '``` ' + 'word ' * 450 + '\nabc\n```',
+    ]
+    for limit in (DISCORD_MESSAGE_LIMIT, message_utils.EMBED_CHUNK_LIMIT):
+        for content in contents:
+            start = time.perf_counter()
+            chunks = pack_message(content, limit)
+            assert time.perf_counter() - start < 1
+            assert chunks and all(len(chunk) <= limit for chunk in chunks), [len(c) for c in chunks]
+            assert all(chunk.count("```") % 2 == 0 for chunk in chunks[:-1])
+
+
+def test_pack_message_benchmark():
+    content = make_answer()
+    runs = 50
+    start = time.perf_counter()
+    for _ in range(runs):
+        pack_message(content)
+    per_call = (time.perf_counter() - start) / runs
+    print(f"pack_message on {len(content)} chars: {per_call * 1000:.2f} ms")
+    assert per_call < 0.02
+
+    # Linear: ten times the content takes roughly ten times as long, not a hundred
+    big = content * 10
+    timings = []
+    for _ in range(3):
+        start = time.perf_counter()
+        pack_message(big)
+        timings.append(time.perf_counter() - start)
+    assert min(timings) < per_call * 30
+
+
+def test_send_long_message_returns_messages():
+    class FakeChannel:
+        def __init__(self):
+            self.id = 1234
+            self.sent = []
+
+        async def send(self, content=None, embeds=None):
+            message = SimpleNamespace(content=content, embeds=embeds)
+            self.sent.append(message)
+            return message
+
+    async def run():
+        message_utils._channel_buckets.clear()
+        channel = FakeChannel()
+        short = await send_long_message(channel, "Time for your daily check-in!")
+        long = await send_long_message(channel, make_answer())
+        return channel, short, long
+
+    channel, short, long = asyncio.run(run())
+    assert len(short) == 1 and short[0].content == "Time for your daily check-in!"
+    assert long and all(message.embeds for message in long)
+    assert len(channel.sent) == 1 + len(long)
+
+
+if __name__ == "__main__":
+    test_pack_message_respects_limit_and_code_blocks()
+    test_pack_message_reserves_room_for_closing_fence()
+    test_pack_message_long_fence_lines()
+    test_pack_message_benchmark()
+    test_send_long_message_returns_messages()
@@ -0,0 +1,50 @@
+import asyncio
+import os
+
+from utils.meal_plan import parse_meal_plan
+from utils.metrics import metrics
+from utils.pdf_generator import render_meal_plan_pdf, shutdown_pdf_pool
+
+PLAN = """[Suhoor]
+- Oatmeal (80g)
+- Eggs (2 large)
+Total: 500 calories, 30g protein, 55g carbs, 15g fats
+
+[Iftar]
+- Dates (3 pieces)
+- Chicken breast (200g)
+Total: 700 calories, 60g protein, 70g carbs, 12g fats"""
+
+
+def observation_count(name):
+    return metrics.snapshot()['observations'].get(name, {}).get('count', 0)
+
+
+def test_worker_timings_are_recorded_in_the_parent():
+    previous = os.environ.get('PDF_POOL_SIZE')
+    os.environ['PDF_POOL_SIZE'] = '1'
+    names = ('pdf.queue_wait', 'pdf.render_time', 'pdf.worker_import_time')
+    before = {name: observation_count(name) for name in names}
+
+    async def run():
+        try:
+            first = await render_meal_plan_pdf(parse_meal_plan(PLAN), 'tester')
+            second = await render_meal_plan_pdf(parse_meal_plan(PLAN), 'tester')
+            return first, second
+        finally:
+            shutdown_pdf_pool()
+            if previous is None:
+                os.environ.pop('PDF_POOL_SIZE', None)
+            else:
+                os.environ['PDF_POOL_SIZE'] = previous
+
+    first, second = asyncio.run(run())
+    assert first.startswith(b'%PDF') and second.startswith(b'%PDF')
+    assert observation_count('pdf.queue_wait') == before['pdf.queue_wait'] + 2
+    assert observation_count('pdf.render_time') == before['pdf.render_time'] + 2
+    # The single worker loads ReportLab once, for the first render only
+    assert observation_count('pdf.worker_import_time') == before['pdf.worker_import_time'] + 1
+
+
+if __name__ == "__main__":
+    test_worker_timings_are_recorded_in_the_parent()
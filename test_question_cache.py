@@ -0,0 +1,47 @@
+import os
+import tempfile
+
+from utils.question_cache import QuestionCache
+
+# Questions that look alike but ask something different must not share an answer
+NEAR_MISSES = [
+    ("When should I take creatine?", "How should I take creatine?"),
+    ("what to eat at suhoor", "what not to eat at suhoor"),
+    ("Why should I train before iftar?", "When should I train before iftar?"),
+    ("Can I drink protein shakes at suhoor?", "Can I not drink protein shakes at suhoor?"),
+    ("How much protein should I eat?", "How much water should I drink?"),
+]
+
+# Rewordings of the same question should still be answered from the cache
+PARAPHRASES = [
+    ("What should I eat for suhoor?", "what to eat at suhoor"),
+    ("How much protein should I eat during Ramadan?", "how much protein should i eat in ramadan"),
+    ("What shouldn't I eat at suhoor?", "what not to eat at suhoor"),
+    ("How many grams of protein per day?", "how many grams of protein a day"),
+]
+
+
+def make_cache(directory):
+    return QuestionCache(path=os.path.join(directory, 'questions.sqlite3'))
+
+
+def test_near_miss_questions_are_not_served_each_others_answers():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = make_cache(directory)
+        for cached, asked in NEAR_MISSES:
+            cache.add(cached, f"answer to {cached}")
+            hit = cache.lookup(asked)
+            assert hit is None or hit[1] != f"answer to {cached}", (cached, asked)
+
+
+def test_paraphrased_questions_hit():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = make_cache(directory)
+        for cached, asked in PARAPHRASES:
+            entry_id = cache.add(cached, f"answer to {cached}")
+            assert cache.lookup(asked) == (entry_id, f"answer to {cached}"), (cached, asked)
+
+
+if __name__ == "__main__":
+    test_near_miss_questions_are_not_served_each_others_answers()
+    test_paraphrased_questions_hit()
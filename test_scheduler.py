@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import pytz
+
+from utils.scheduler import DailyScheduler
+from utils.time_utils import daily_occurrence, next_daily_occurrence, previous_daily_occurrence
+
+NEW_YORK = pytz.timezone('America/New_York')
+
+
+def test_daily_occurrence_across_dst():
+    # 20:00 stays 20:00 local on both sides of a transition, so the UTC time shifts
+    before = daily_occurrence(20, 0, 'America/New_York', date(2026, 3, 7))
+    after = daily_occurrence(20, 0, 'America/New_York', date(2026, 3, 8))
+    assert before.astimezone(pytz.utc).hour == 1
+    assert after.astimezone(pytz.utc).hour == 0
+    assert (after - before) == timedelta(hours=23)
+
+
+def test_daily_occurrence_in_skipped_and_repeated_hours():
+    # 02:30 doesn't exist on spring-forward day: it moves an hour later
+    skipped = daily_occurrence(2, 30, 'America/New_York', date(2026, 3, 8))
+    assert (skipped.hour, skipped.minute) == (3, 30)
+    assert skipped.utcoffset() == timedelta(hours=-4)
+    # 01:30 happens twice on fall-back day: the first (daylight time) one is used
+    repeated = daily_occurrence(1, 30, 'America/New_York', date(2026, 11, 1))
+    assert repeated.utcoffset() == timedelta(hours=-4)
+
+
+def test_next_and_previous_occurrence():
+    now = NEW_YORK.localize(datetime(2026, 3, 7, 21, 0))
+    upcoming = next_daily_occurrence(20, 0, 'America/New_York', now)
+    assert upcoming.date() == date(2026, 3, 8) and upcoming.hour == 20
+    assert previous_daily_occurrence(20, 0, 'America/New_York', now).date() == date(2026, 3, 7)
+    # Exactly at the time: that occurrence is "previous", the next one is tomorrow
+    at = NEW_YORK.localize(datetime(2026, 3, 7, 20, 0))
+    assert previous_daily_occurrence(20, 0, 'America/New_York', at) == at
+    assert next_daily_occurrence(20, 0, 'America/New_York', at).date() == date(2026, 3, 8)
+
+
+def just_missed(minutes=2):
+    """hour, minute, timezone of a daily time a couple of minutes ago"""
+    moment = datetime.now(pytz.utc) - timedelta(minutes=minutes)
+    return moment.hour, moment.minute, 'UTC'
+
+
+async def run_scheduler(path, hour, minute, tz, runs, lease_seconds=300, duration=0.3):
+    scheduler = DailyScheduler(path, lease_seconds=lease_seconds)
+
+    async def job():
+        runs.append(time.time())
+
+    scheduler.start()
+    scheduler.add_daily('job', hour, minute, tz, job)
+    await asyncio.sleep(duration)
+    scheduler.stop()
+    return scheduler
+
+
+def test_claim_is_exclusive_until_lease_expires():
+    with tempfile.TemporaryDirectory() as directory:
+        scheduler = DailyScheduler(os.path.join(directory, 'runs.sqlite3'), lease_seconds=60)
+        occurrence = daily_occurrence(20, 0, 'UTC', date(2026, 3, 1))
+        assert scheduler._claim('job', occurrence)
+        assert not scheduler._claim('job', occurrence)
+        # The claimer died mid-run: once its lease is over the run can be claimed again
+        scheduler._db.execute('UPDATE scheduled_runs SET claimed_at = claimed_at - 61')
+        assert scheduler._claim('job', occurrence)
+        # A completed run is never claimed again
+        scheduler._db.execute('UPDATE scheduled_runs SET completed_at = ?, claimed_at = 0', (time.time(),))
+        assert not scheduler._claim('job', occurrence)
+
+
+def test_missed_run_is_caught_up_once():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'runs.sqlite3')
+        hour, minute, tz = just_missed()
+        first, second = [], []
+        asyncio.run(run_scheduler(path, hour, minute, tz, first))
+        asyncio.run(run_scheduler(path, hour, minute, tz, second))
+        assert len(first) == 1
+        assert second == []
+
+
+def test_run_interrupted_mid_callback_is_retried_after_lease():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'runs.sqlite3')
+        hour, minute, tz = just_missed()
+        run_date = previous_daily_occurrence(hour, minute, tz).date().isoformat()
+        # A previous process claimed the run and crashed before completing it
+        db = sqlite3.connect(path)
+        DailyScheduler(path)
+        db.execute('INSERT INTO scheduled_runs (job, run_date, claimed_at) VALUES (?, ?, ?)',
+                   ('job', run_date, time.time() - 1))
+        db.commit()
+
+        runs = []
+        asyncio.run(run_scheduler(path, hour, minute, tz, runs, lease_seconds=0.5, duration=1.0))
+        assert len(runs) == 1
+        completed = db.execute('SELECT completed_at FROM scheduled_runs WHERE job = ?', ('job',)).fetchone()[0]
+        assert completed is not None
+        db.close()
+
+
+if __name__ == "__main__":
+    test_daily_occurrence_across_dst()
+    test_daily_occurrence_in_skipped_and_repeated_hours()
+    test_next_and_previous_occurrence()
+    test_claim_is_exclusive_until_lease_expires()
+    test_missed_run_is_caught_up_once()
+    test_run_interrupted_mid_callback_is_retried_after_lease()
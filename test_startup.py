@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+
+# Cold start budget for importing the bot and both cogs, in seconds
+IMPORT_BUDGET = float(os.getenv('STARTUP_IMPORT_BUDGET', '2.0'))
+
+# Only needed once a command runs; loading them at import time is a regression
+LAZY_MODULES = ('openai', 'reportlab')
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import bot, cogs.commands, cogs.events
+elapsed = time.perf_counter() - start
+print(json.dumps({'elapsed': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def measure_cold_import():
+    """Import the bot in a fresh interpreter and report time and heavy modules loaded"""
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_heavy_dependencies_are_lazy():
+    assert measure_cold_import()['loaded'] == []
+
+
+def test_cold_import_within_budget():
+    # Best of three so a busy machine doesn't fail the check
+    elapsed = min(measure_cold_import()['elapsed'] for _ in range(3))
+    print(f"Cold import of bot and cogs: {elapsed:.2f}s (budget {IMPORT_BUDGET:.1f}s)")
+    assert elapsed < IMPORT_BUDGET
+
+
+if __name__ == "__main__":
+    test_heavy_dependencies_are_lazy()
+    test_cold_import_within_budget()
@@ -0,0 +1,32 @@
+import os
+import tempfile
+
+from utils.thread_store import ThreadMappingStore
+
+
+def test_has_follows_lru_and_sqlite():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'state.sqlite3')
+        store = ThreadMappingStore(path, max_memory_entries=2)
+        other = ThreadMappingStore(path)  # another cluster process sharing the file
+
+        store[1] = 'thread_1'
+        assert store.has(1)
+        store.flush()
+        assert other.has(1)
+
+        # Evicted from the LRU but still mapped on disk
+        for thread_id in range(2, 6):
+            store[thread_id] = f"thread_{thread_id}"
+        store.flush()
+        assert 1 not in store._memory and store.has(1)
+
+        store.pop(1)
+        assert not store.has(1)
+        store.flush()
+        assert not other.has(1)
+        assert not store.has(99)
+
+
+if __name__ == "__main__":
+    test_has_follows_lru_and_sqlite()
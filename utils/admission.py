@@ -0,0 +1,158 @@
+import os
+import heapq
+import asyncio
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from utils.metrics import metrics
+from utils.cluster import process_share
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+class Priority(IntEnum):
+    """Lower values are admitted first"""
+    INTERACTIVE = 0  # follow-ups in an existing thread
+    STANDARD = 1     # /ask, /rift_taps
+    BULK = 2         # /mealplan
+
+class AdmissionRejected(Exception):
+    """Base class for work that was not admitted; str() is safe to show users"""
+
+class RateLimitedError(AdmissionRejected):
+    def __init__(self, scope, retry_after):
+        self.scope = scope
+        self.retry_after = retry_after
+        super().__init__(f"You're sending requests too quickly. Please try again in {retry_after:.0f} seconds.")
+
+class QueueFullError(AdmissionRejected):
+    def __init__(self):
+        super().__init__("I'm handling a lot of requests right now. Please try again in a few minutes.")
+
+class AdmissionController:
+    """
+    Gatekeeper for assistant work: per-user and per-guild token buckets, a
+    global concurrency cap and a priority queue for work that has to wait.
+    """
+
+    def __init__(self, max_concurrent=None, max_queue=None):
+        # Limits for the whole bot; in cluster mode each process gets its share
+        self.max_concurrent = int(max_concurrent or process_share(int(os.getenv('ASSISTANT_MAX_CONCURRENT', '16'))))
+        self.max_queue = int(max_queue or process_share(int(os.getenv('ASSISTANT_MAX_QUEUE', '200'))))
+        self.user_rate = float(os.getenv('ASSISTANT_USER_RATE_PER_MINUTE', '6')) / 60
+        self.user_burst = float(os.getenv('ASSISTANT_USER_BURST', '3'))
+        self.guild_rate = float(os.getenv('ASSISTANT_GUILD_RATE_PER_MINUTE', '120')) / 60
+        self.guild_burst = float(os.getenv('ASSISTANT_GUILD_BURST', '30'))
+        self.active = 0
+        self.waiting = 0     # live entries in _queue; cancelled ones are skipped when popped
+        self._queue = []
+        self._counter = itertools.count()
+        self._user_buckets = {}
+        self._guild_buckets = {}
+
+    def _bucket(self, buckets, key, rate, burst):
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) > 10000:
+                # Drop full (idle) buckets so the maps don't grow forever
+                for idle_key in [k for k, b in buckets.items() if b.time_until_available(b.capacity) == 0]:
+                    del buckets[idle_key]
+            bucket = TokenBucket(rate, burst)
+            buckets[key] = bucket
+        return bucket
+
+    def _check_rate(self, user_id, guild_id):
+        """Take a token from the user's and the guild's bucket, or from neither"""
+        user_bucket = self._bucket(self._user_buckets, user_id, self.user_rate, self.user_burst)
+        retry_after = user_bucket.time_until_available()
+        if retry_after:
+            metrics.increment('admission.rate_limited.user')
+            raise RateLimitedError('user', retry_after)
+        guild_bucket = None
+        if guild_id is not None:
+            guild_bucket = self._bucket(self._guild_buckets, guild_id, self.guild_rate, self.guild_burst)
+            retry_after = guild_bucket.time_until_available()
+            if retry_after:
+                metrics.increment('admission.rate_limited.guild')
+                raise RateLimitedError('guild', retry_after)
+        user_bucket.try_acquire()
+        if guild_bucket is not None:
+            guild_bucket.try_acquire()
+
+    def queue_position(self, future):
+        """1-based position of a queued entry in admission order"""
+        live = (entry for entry in sorted(self._queue) if not entry[2].cancelled())
+        for position, (_, _, queued) in enumerate(live, 1):
+            if queued is future:
+                return position
+        return 0
+
+    def _abandon(self, future):
+        """Stop counting a waiter that was cancelled before it got a slot"""
+        self.waiting -= 1
+        # Cancelled entries are normally dropped when popped; compact if they pile up
+        if len(self._queue) > 2 * self.waiting + 16:
+            self._queue = [entry for entry in self._queue if not entry[2].cancelled()]
+            heapq.heapify(self._queue)
+        metrics.set_gauge('admission.queue_depth', self.waiting)
+
+    def _release(self):
+        self.active -= 1
+        while self._queue and self.active < self.max_concurrent:
+            _, _, future = heapq.heappop(self._queue)
+            if future.cancelled():
+                continue
+            self.waiting -= 1
+            self.active += 1
+            future.set_result(None)
+        metrics.set_gauge('admission.active', self.active)
+        metrics.set_gauge('admission.queue_depth', self.waiting)
+
+    @asynccontextmanager
+    async def slot(self, user_id, guild_id=None, priority=Priority.STANDARD, on_queued=None):
+        """
+        Hold one assistant slot for the duration of the block. Raises an
+        AdmissionRejected subclass when rate limited or the queue is full;
+        on_queued(position) is awaited if the caller has to wait.
+        """
+        self._check_rate(user_id, guild_id)
+        start = time.perf_counter()
+
+        if self.active < self.max_concurrent and not self.waiting:
+            self.active += 1
+        else:
+            if self.waiting >= self.max_queue:
+                metrics.increment('admission.rejected.queue_full')
+                raise QueueFullError()
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._queue, (int(priority), next(self._counter), future))
+            self.waiting += 1
+            metrics.set_gauge('admission.queue_depth', self.waiting)
+            position = self.queue_position(future)
+            logger.info(f"Queued assistant work for user {user_id} at position {position} ({priority.name})")
+            try:
+                if on_queued is not None:
+                    try:
+                        await on_queued(position)
+                    except Exception as e:
+                        logger.warning(f"Failed to send queue notice: {str(e)}")
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # We were granted the slot just as we were cancelled
+                    self._release()
+                else:
+                    future.cancel()
+                    self._abandon(future)
+                raise
+
+        wait = time.perf_counter() - start
+        metrics.observe('admission.wait_time', wait)
+        metrics.observe(f"admission.wait_time.{priority.name.lower()}", wait)
+        metrics.set_gauge('admission.active', self.active)
+        try:
+            yield
+        finally:
+            self._release()
@@ -1,20 +1,101 @@
 import os
 import asyncio
-from openai import OpenAI
 import logging
 import time
 import re
+import openai
 from dotenv import load_dotenv
+from utils.guide_index import GuideIndex
+from utils.meal_plan import parse_meal_plan, meal_plan_from_json, render_meal_plan_text
+from utils.metrics import metrics
+from utils.question_cache import QuestionCache
+from utils.response_cache import ResponseCache
+from utils.run_scheduler import RunScheduler, RunFailedError
 
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+TEXT_FORMAT_INSTRUCTIONS = """Format the output as follows:
+[Meal 1]
+- Food item 1 (portion)
+- Food item 2 (portion)
+Total: X calories, Xg protein, Xg carbs, Xg fats
+
+[Meal 2]
+..."""
+
+# Shape of the structured meal plan; validated by utils.meal_plan.meal_plan_from_json
+MEAL_PLAN_JSON_SCHEMA = """{
+  "targets": {"calories": number, "protein": number, "carbs": number, "fats": number},
+  "meals": [
+    {
+      "name": string,
+      "time": string,
+      "items": [
+        {"food": string, "grams": number, "portion": string,
+         "protein": number, "carbs": number, "fats": number, "calories": number}
+      ],
+      "notes": [string]
+    }
+  ],
+  "notes": [string]
+}"""
+
+JSON_FORMAT_INSTRUCTIONS = f"""Respond with a single JSON object and nothing else, matching this schema:
+{MEAL_PLAN_JSON_SCHEMA}
+Use a plain food name in "food" (no quantities), the portion weight in grams in "grams",
+and your macro estimate for that portion in "protein", "carbs", "fats" (grams) and "calories".
+Put preparation instructions and alternatives in "notes"."""
+
+RIFT_TAPS_PROMPT = """Please explain the RIFT & TAPS methodology for bodybuilding during Ramadan, including:
+1. What RIFT & TAPS stands for
+2. The core principles
+3. How to implement it
+4. Benefits and considerations
+5. Common mistakes to avoid
+
+Format the response in a clear, structured way with emojis for better readability."""
+
+# Thread ids with this prefix stand for a cached answer whose OpenAI thread
+# hasn't been created yet; resolve_thread() creates it on the first follow-up
+CACHED_THREAD_PREFIX = 'cached:'
+QUESTION_THREAD_PREFIX = 'question:'
+
+# Run states in which OpenAI still considers a run active on its thread
+ACTIVE_RUN_STATUSES = ('queued', 'in_progress', 'requires_action', 'cancelling')
+
+# One pooled HTTP transport shared by every AssistantManager so keep-alive
+# connections to api.openai.com are reused across commands
+_shared_http_client = None
+
+def _get_shared_http_client():
+    """Return the process-wide pooled HTTP client, creating it on first use"""
+    global _shared_http_client
+    if _shared_http_client is None or _shared_http_client.is_closed:
+        _shared_http_client = openai.DefaultAsyncHttpxClient()
+        logger.info("Created shared OpenAI HTTP client")
+    return _shared_http_client
+
 class AssistantManager:
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        # Per-call timeouts: connect fails fast, reads allow for slow runs
+        self.request_timeout = openai.Timeout(
+            float(os.getenv('OPENAI_REQUEST_TIMEOUT', '30')),
+            connect=float(os.getenv('OPENAI_CONNECT_TIMEOUT', '5'))
+        )
+        self.client = openai.AsyncOpenAI(
+            api_key=os.getenv('OPENAI_API_KEY'),
+            http_client=_get_shared_http_client(),
+            timeout=self.request_timeout
+        )
         self.assistant_id = os.getenv('ASSISTANT_ID')
-        logger.info("AssistantManager initialized with OpenAI client")
+        self.run_scheduler = RunScheduler(self.client, self.request_timeout)
+        self.cancel_settle_seconds = float(os.getenv('RUN_CANCEL_SETTLE_SECONDS', '10'))
+        self.response_cache = ResponseCache()
+        self.question_cache = QuestionCache()
+        self.guide_index = GuideIndex.from_files()
+        logger.info("AssistantManager initialized with async OpenAI client")
 
     def _sanitize_text(self, text):
         """Sanitize text by removing markdown and special characters"""
@@ -22,55 +103,192 @@ class AssistantManager:
 
     async def _create_thread(self):
         """Create a new thread for conversation"""
-        thread = self.client.beta.threads.create()
+        thread = await self.client.beta.threads.create(timeout=self.request_timeout)
         logger.info(f"Created new thread: {thread.id}")
         return thread.id
 
-    async def _get_assistant_response(self, thread_id, message):
-        """Get response from assistant"""
+    async def resolve_thread(self, thread_id):
+        """Return a real OpenAI thread id, creating the thread behind a cached answer on first use"""
+        if thread_id.startswith(CACHED_THREAD_PREFIX):
+            entry = self.response_cache.get(thread_id[len(CACHED_THREAD_PREFIX):], allow_expired=True)
+        elif thread_id.startswith(QUESTION_THREAD_PREFIX):
+            entry = self.question_cache.get(int(thread_id[len(QUESTION_THREAD_PREFIX):]))
+        else:
+            return thread_id
+        new_thread_id = await self._seed_thread(*(entry or (None, None)))
+        logger.info(f"Created thread {new_thread_id} for cached answer {thread_id}")
+        return new_thread_id
+
+    async def _seed_thread(self, prompt=None, response=None):
+        """Create a thread that already holds one prompt and its answer, if given"""
+        messages = []
+        if prompt is not None:
+            messages = [{'role': 'user', 'content': prompt}, {'role': 'assistant', 'content': response}]
+        thread = await self.client.beta.threads.create(messages=messages, timeout=self.request_timeout)
+        return thread.id
+
+    async def _abort_run(self, thread_id, run_id=None, message_id=None):
+        """
+        Clean up after a superseded, timed out or stuck request: cancel its run
+        upstream so it stops using tokens, wait for the run to wind down, then
+        remove the user message (when given) so the thread is ready for the next
+        """
+        metrics.increment('runs.cancelled')
+        try:
+            if run_id is None and message_id is not None:
+                # The run may have been created before its id reached us
+                runs = await self.client.beta.threads.runs.list(
+                    thread_id=thread_id, limit=1, timeout=self.request_timeout
+                )
+                if runs.data and runs.data[0].status in ACTIVE_RUN_STATUSES:
+                    run_id = runs.data[0].id
+            if run_id is not None:
+                run = await self.client.beta.threads.runs.cancel(
+                    run_id, thread_id=thread_id, timeout=self.request_timeout
+                )
+                logger.info(f"Cancelled superseded run {run_id} in thread {thread_id}")
+                # Messages can't be changed while the run is still active
+                deadline = time.monotonic() + self.cancel_settle_seconds
+                while run.status in ACTIVE_RUN_STATUSES and time.monotonic() < deadline:
+                    await asyncio.sleep(0.5)
+                    run = await self.client.beta.threads.runs.retrieve(
+                        run_id, thread_id=thread_id, timeout=self.request_timeout
+                    )
+        except Exception as e:
+            logger.warning(f"Failed to cancel run in thread {thread_id}: {str(e)}")
+        if message_id is not None:
+            try:
+                await self.client.beta.threads.messages.delete(
+                    message_id, thread_id=thread_id, timeout=self.request_timeout
+                )
+            except Exception as e:
+                logger.warning(f"Failed to remove superseded message {message_id}: {str(e)}")
+
+    async def _stream_assistant_response(self, thread_id, message, on_delta):
+        """Stream a run, passing each text delta to on_delta, and return the full text"""
+        user_message = None
+        stream = None
+        try:
+            user_message = await self.client.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=message,
+                timeout=self.request_timeout
+            )
+            logger.info(f"Added user message to thread {thread_id}")
+
+            start = time.perf_counter()
+            first_token_at = None
+            parts = []
+            # Same overall deadline as polled runs (RUN_TIMEOUT)
+            async with asyncio.timeout(self.run_scheduler.run_timeout):
+                async with self.client.beta.threads.runs.stream(
+                    thread_id=thread_id,
+                    assistant_id=self.assistant_id,
+                    timeout=self.request_timeout
+                ) as stream:
+                    async for delta in stream.text_deltas:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                            metrics.observe('assistant.time_to_first_token', first_token_at - start)
+                            logger.info(f"Time to first token for thread {thread_id}: {first_token_at - start:.2f}s")
+                        parts.append(delta)
+                        await on_delta(delta)
+                    run = stream.current_run
+
+            if run is not None and run.status != 'completed':
+                logger.error(f"Assistant run ended with status {run.status}: {run.last_error}")
+                if run.status in ACTIVE_RUN_STATUSES:
+                    # e.g. requires_action: no tools are wired up, and an active run blocks the thread
+                    await self._abort_run(thread_id, run.id)
+                raise RunFailedError(run)
+
+            metrics.observe('assistant.stream_duration', time.perf_counter() - start)
+            logger.info(f"Streamed assistant response for thread {thread_id}")
+            return ''.join(parts)
+
+        except asyncio.CancelledError:
+            run = stream.current_run if stream is not None else None
+            await asyncio.shield(self._abort_run(
+                thread_id,
+                run.id if run is not None else None,
+                user_message.id if user_message is not None else None
+            ))
+            raise
+        except TimeoutError:
+            logger.error(f"Streamed run in thread {thread_id} timed out after {self.run_scheduler.run_timeout:.0f}s")
+            metrics.increment('assistant.stream_timeouts')
+            run = stream.current_run if stream is not None else None
+            await asyncio.shield(self._abort_run(
+                thread_id,
+                run.id if run is not None else None,
+                user_message.id if user_message is not None and run is None else None
+            ))
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming assistant response: {str(e)}")
+            raise
+
+    async def _get_assistant_response(self, thread_id, message, on_delta=None, response_format=None):
+        """Get response from assistant, streaming deltas to on_delta when given"""
+        if on_delta is not None:
+            return await self._stream_assistant_response(thread_id, message, on_delta)
+
+        user_message = None
+        run = None
         try:
             # Add user message to thread
-            self.client.beta.threads.messages.create(
+            user_message = await self.client.beta.threads.messages.create(
                 thread_id=thread_id,
                 role="user",
-                content=message
+                content=message,
+                timeout=self.request_timeout
             )
             logger.info(f"Added user message to thread {thread_id}")
 
             # Run the assistant
-            run = self.client.beta.threads.runs.create(
+            run_options = {'response_format': response_format} if response_format else {}
+            run = await self.client.beta.threads.runs.create(
                 thread_id=thread_id,
-                assistant_id=self.assistant_id
+                assistant_id=self.assistant_id,
+                timeout=self.request_timeout,
+                **run_options
             )
             logger.info(f"Started assistant run: {run.id}")
 
-            # Wait for completion
-            while True:
-                run = self.client.beta.threads.runs.retrieve(
-                    thread_id=thread_id,
-                    run_id=run.id
-                )
-                if run.status == 'completed':
-                    break
-                elif run.status == 'failed':
-                    logger.error(f"Assistant run failed: {run.last_error}")
-                    raise Exception("Assistant run failed")
-                await asyncio.sleep(1)
+            # Wait for completion via the shared run scheduler
+            run = await self.run_scheduler.wait_for(thread_id, run.id)
 
             # Get assistant's response
-            messages = self.client.beta.threads.messages.list(
-                thread_id=thread_id
+            messages = await self.client.beta.threads.messages.list(
+                thread_id=thread_id,
+                timeout=self.request_timeout
             )
             response = messages.data[0].content[0].text.value
             logger.info(f"Got assistant response for thread {thread_id}")
             return response
 
+        except asyncio.CancelledError:
+            # Cancelling wait_for's future also takes the run out of the poller
+            await asyncio.shield(self._abort_run(
+                thread_id,
+                run.id if run is not None else None,
+                user_message.id if user_message is not None else None
+            ))
+            raise
         except Exception as e:
             logger.error(f"Error getting assistant response: {str(e)}")
             raise
 
-    async def generate_meal_plan(self, user_data):
-        """Generate a personalized meal plan based on user data"""
+    async def generate_meal_plan(self, user_data, structured=None):
+        """
+        Generate a personalized meal plan based on user data and return it as a
+        parsed MealPlan. With structured output (MEAL_PLAN_JSON_OUTPUT, on by
+        default) the assistant answers in validated JSON; anything else falls
+        back to the text format parser.
+        """
+        if structured is None:
+            structured = os.getenv('MEAL_PLAN_JSON_OUTPUT', 'true').lower() in ('1', 'true', 'yes')
         try:
             # Create new thread
             thread_id = await self._create_thread()
@@ -109,7 +327,8 @@ class AssistantManager:
             carbs = (calories - (protein * 4 + fats * 9)) / 4  # Remaining calories from carbs
 
             # Prepare prompt for meal plan generation
-            prompt = f"""Generate a detailed meal plan for a {user_data['age']}-year-old {user_data['gender']} with the following specifications:
+            def build_prompt(format_instructions):
+                return f"""Generate a detailed meal plan for a {user_data['age']}-year-old {user_data['gender']} with the following specifications:
 
 Current Stats:
 - Weight: {user_data['weight']} lbs
@@ -143,41 +362,110 @@ Please provide a detailed meal plan that:
 6. Accounts for dietary restrictions and preferences
 7. Provides alternatives for common ingredients if needed
 
-Format the output as follows:
-[Meal 1]
-- Food item 1 (portion)
-- Food item 2 (portion)
-Total: X calories, Xg protein, Xg carbs, Xg fats
-
-[Meal 2]
-...
+{format_instructions}
 
 Please ensure all portions are precise and the total daily calories match the target within 50 calories."""
 
             # Get meal plan from assistant
-            meal_plan = await self._get_assistant_response(thread_id, prompt)
+            if not structured:
+                meal_plan = await self._get_assistant_response(
+                    thread_id, build_prompt(TEXT_FORMAT_INSTRUCTIONS)
+                )
+                logger.info(f"Generated meal plan for user {user_data['name']}")
+                return thread_id, parse_meal_plan(meal_plan)
+
+            try:
+                response = await self._get_assistant_response(
+                    thread_id,
+                    build_prompt(JSON_FORMAT_INSTRUCTIONS),
+                    response_format={'type': 'json_object'}
+                )
+            except openai.BadRequestError as e:
+                # The model or the assistant's tools don't support JSON mode: ask again for text
+                # in a fresh thread, so the rejected JSON-format request isn't in the conversation
+                logger.warning(f"JSON output rejected ({str(e)}), retrying with text format")
+                metrics.increment('meal_plan.json_mode_rejected')
+                thread_id = await self._create_thread()
+                meal_plan = await self._get_assistant_response(
+                    thread_id, build_prompt(TEXT_FORMAT_INSTRUCTIONS)
+                )
+                logger.info(f"Generated meal plan for user {user_data['name']}")
+                return thread_id, parse_meal_plan(meal_plan)
+            try:
+                plan = meal_plan_from_json(response)
+                metrics.increment('meal_plan.structured_parsed')
+                # Follow-ups continue in the returned thread; give them the plan as text,
+                # not the JSON exchange, so replies don't carry on in JSON
+                try:
+                    thread_id = await self._seed_thread(
+                        build_prompt(TEXT_FORMAT_INSTRUCTIONS), render_meal_plan_text(plan)
+                    )
+                except Exception as e:
+                    logger.warning(f"Keeping JSON meal plan thread, text copy failed: {str(e)}")
+            except ValueError as e:
+                logger.warning(f"Structured meal plan rejected ({str(e)}), falling back to text format")
+                metrics.increment('meal_plan.structured_fallback')
+                plan = parse_meal_plan(response)
+                if not any(True for _ in plan.items()):
+                    response = await self._get_assistant_response(
+                        thread_id, f"Please rewrite that meal plan as plain text.\n\n{TEXT_FORMAT_INSTRUCTIONS}"
+                    )
+                    plan = parse_meal_plan(response)
             logger.info(f"Generated meal plan for user {user_data['name']}")
 
-            return thread_id, meal_plan
+            return thread_id, plan
 
         except Exception as e:
             logger.error(f"Error generating meal plan: {str(e)}")
             raise
 
-    async def explain_rift_taps(self):
-        """Explain the RIFT & TAPS methodology"""
-        try:
+    def cached_response(self, prompt):
+        """Return (thread id, answer) for a cached static prompt, or None"""
+        key = self.response_cache.make_key(self.assistant_id, prompt)
+        entry = self.response_cache.get(key)
+        if entry is None:
+            return None
+        return f"{CACHED_THREAD_PREFIX}{key}", entry[1]
+
+    async def _get_static_response(self, prompt, on_delta=None):
+        """
+        Answer a prompt whose answer doesn't depend on the user, from the
+        response cache when possible. Cached answers come back with a
+        placeholder thread id (see resolve_thread).
+        """
+        cached = self.cached_response(prompt)
+        if cached is not None:
+            if on_delta is not None:
+                await on_delta(cached[1])
+            return cached
+
+        key = self.response_cache.make_key(self.assistant_id, prompt)
+        leader = False
+
+        async def run_prompt():
+            nonlocal leader
+            leader = True
             thread_id = await self._create_thread()
-            prompt = """Please explain the RIFT & TAPS methodology for bodybuilding during Ramadan, including:
-1. What RIFT & TAPS stands for
-2. The core principles
-3. How to implement it
-4. Benefits and considerations
-5. Common mistakes to avoid
+            response = await self._get_assistant_response(thread_id, prompt, on_delta)
+            self.response_cache.set(key, prompt, response)
+            return thread_id, response
 
-Format the response in a clear, structured way with emojis for better readability."""
-            
-            response = await self._get_assistant_response(thread_id, prompt)
+        thread_id, response = await self.response_cache.flight.do(key, run_prompt)
+        if leader:
+            return thread_id, response
+        # Joined another caller's run: the thread is theirs, so hand out a placeholder
+        if on_delta is not None:
+            await on_delta(response)
+        return f"{CACHED_THREAD_PREFIX}{key}", response
+
+    def cached_rift_taps(self):
+        """Return (thread id, answer) for a cached RIFT & TAPS explanation, or None"""
+        return self.cached_response(RIFT_TAPS_PROMPT)
+
+    async def explain_rift_taps(self, on_delta=None):
+        """Explain the RIFT & TAPS methodology"""
+        try:
+            thread_id, response = await self._get_static_response(RIFT_TAPS_PROMPT, on_delta)
             logger.info("Generated RIFT & TAPS explanation")
             return thread_id, response
 
@@ -185,17 +473,51 @@ Format the response in a clear, structured way with emojis for better readabilit
             logger.error(f"Error explaining RIFT & TAPS: {str(e)}")
             raise
 
-    async def ask_question(self, question):
+    def cached_answer(self, question):
+        """
+        Return (thread id, answer) for a question that needs no assistant run:
+        a near-duplicate of one answered before, or one a guide section answers
+        directly. Returns None otherwise.
+        """
+        hit = self.question_cache.lookup(question)
+        if hit is not None:
+            entry_id, answer = hit
+            return f"{QUESTION_THREAD_PREFIX}{entry_id}", answer
+
+        section = self.guide_index.instant_answer(question)
+        if section is None:
+            return None
+        metrics.increment('guide.instant_answers')
+        logger.info(f"Answering '{question}' from guide section in {section.source}")
+        answer = f"📖 From the RIFT & TAPS guide material:\n\n{section.text}"
+        # Store it so follow-ups and repeats work like any cached answer
+        entry_id = self.question_cache.add(question, answer)
+        return f"{QUESTION_THREAD_PREFIX}{entry_id}", answer
+
+    async def ask_question(self, question, on_delta=None, check_cache=True):
         """Answer a specific question about bodybuilding during Ramadan"""
         try:
+            cached = self.cached_answer(question) if check_cache else None
+            if cached is not None:
+                if on_delta is not None:
+                    await on_delta(cached[1])
+                return cached
+
             thread_id = await self._create_thread()
             prompt = f"""Please answer this question about bodybuilding during Ramadan: {question}
 
 Provide a detailed, accurate response based on the RIFT & TAPS methodology and best practices.
 Include specific examples and practical tips where relevant.
 Format the response in a clear, easy-to-read way with appropriate emojis."""
-            
-            response = await self._get_assistant_response(thread_id, prompt)
+
+            # Hand the model the relevant guide excerpts up front
+            excerpts = self.guide_index.snippets(question)
+            if excerpts:
+                metrics.increment('guide.snippet_prompts')
+                prompt = "Relevant excerpts from the guide:\n\n" + "\n---\n".join(excerpts) + "\n\n" + prompt
+
+            response = await self._get_assistant_response(thread_id, prompt, on_delta)
+            self.question_cache.add(question, response)
             logger.info(f"Answered question: {question}")
             return thread_id, response
 
@@ -203,11 +525,12 @@ Format the response in a clear, easy-to-read way with appropriate emojis."""
             logger.error(f"Error answering question: {str(e)}")
             raise
 
-    async def continue_conversation(self, thread_id, message):
+    async def continue_conversation(self, thread_id, message, on_delta=None):
         """Continue conversation with consistent formatting"""
         logger.info(f"Continuing conversation in thread: {thread_id}")
         response = await self._get_assistant_response(
             thread_id,
-            message
+            message,
+            on_delta
         )
         return response
\ No newline at end of file
@@ -0,0 +1,145 @@
+import os
+import time
+import signal
+import logging
+import threading
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+def shard_for_guild(guild_id, shard_count):
+    """The shard Discord routes a guild's events to"""
+    return (guild_id >> 22) % shard_count
+
+def shard_groups(shard_count, processes):
+    """Split shard ids 0..shard_count-1 into contiguous groups, one per process"""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    groups = []
+    start = 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+# Number of processes the bot's shards run in; set by run_bot / the cluster workers
+_process_count = 1
+
+def set_process_count(processes):
+    """Record how many processes share the global limits; call before building the bot"""
+    global _process_count
+    _process_count = max(1, int(processes))
+
+def process_share(total, processes=None):
+    """
+    This process's share of a limit meant for the whole bot (e.g.
+    ASSISTANT_MAX_CONCURRENT): total split evenly over the bot's processes
+    """
+    processes = max(1, processes or _process_count)
+    if isinstance(total, int):
+        return max(1, total // processes)
+    return total / processes
+
+def build_worker_bot(cluster_id, shard_ids, shard_count, options):
+    """Set up this worker process and build its RamadanBot without connecting"""
+    options = dict(options)
+    set_process_count(options.pop('processes', 1))
+    from bot import RamadanBot
+
+    return RamadanBot(shard_ids=shard_ids, shard_count=shard_count, cluster_id=cluster_id, **options)
+
+def run_bot_worker(cluster_id, shard_ids, shard_count, options):
+    """Process entry point: run one RamadanBot for a group of shards"""
+    logging.basicConfig(level=logging.INFO, format=f"[cluster {cluster_id}] %(levelname)s:%(name)s:%(message)s")
+    bot = build_worker_bot(cluster_id, shard_ids, shard_count, options)
+    bot.run(os.getenv('DISCORD_TOKEN'), log_handler=None)
+
+class ClusterSupervisor:
+    """
+    Runs shard groups in separate processes and restarts any that exit, with
+    exponential backoff. The worker target is a top-level function called as
+    target(cluster_id, shard_ids, shard_count, options), with the number of
+    processes added to options; tests pass their own in place of
+    run_bot_worker so no gateway connection is needed.
+    """
+
+    def __init__(self, shard_count, processes, target=run_bot_worker, options=None,
+                 poll_interval=1.0, min_backoff=1.0, max_backoff=60.0):
+        self.shard_count = shard_count
+        self.groups = shard_groups(shard_count, processes)
+        self.target = target
+        self.options = options or {}
+        self.poll_interval = poll_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.restarts = [0] * len(self.groups)
+        self._context = multiprocessing.get_context('spawn')
+        self._processes = [None] * len(self.groups)
+        self._restart_at = [0.0] * len(self.groups)
+        self._stopping = threading.Event()
+
+    def _start(self, cluster_id):
+        options = dict(self.options, processes=len(self.groups))
+        process = self._context.Process(
+            target=self.target,
+            args=(cluster_id, self.groups[cluster_id], self.shard_count, options),
+            name=f"cluster-{cluster_id}"
+        )
+        # Not a daemon: workers need their own child processes for PDF rendering
+        process.start()
+        self._processes[cluster_id] = process
+        logger.info(f"Started cluster {cluster_id} (pid {process.pid}) with shards {self.groups[cluster_id]}")
+
+    def _check(self, cluster_id):
+        """Restart a worker that has exited, once its backoff has passed"""
+        process = self._processes[cluster_id]
+        if process is not None and process.is_alive():
+            return
+        now = time.monotonic()
+        if process is not None:
+            logger.warning(f"Cluster {cluster_id} exited with code {process.exitcode}")
+            process.join()
+            self._processes[cluster_id] = None
+            backoff = min(self.max_backoff, self.min_backoff * 2 ** self.restarts[cluster_id])
+            self._restart_at[cluster_id] = now + backoff
+            self.restarts[cluster_id] += 1
+            logger.info(f"Restarting cluster {cluster_id} in {backoff:.0f}s")
+        if now >= self._restart_at[cluster_id]:
+            self._start(cluster_id)
+
+    def run(self):
+        """Start every shard group and supervise them until stop() or SIGTERM/SIGINT"""
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: self.stop())
+            signal.signal(signal.SIGINT, lambda *_: self.stop())
+        logger.info(f"Starting {len(self.groups)} cluster(s) for {self.shard_count} shard(s)")
+        try:
+            for cluster_id in range(len(self.groups)):
+                self._start(cluster_id)
+            while not self._stopping.wait(self.poll_interval):
+                for cluster_id in range(len(self.groups)):
+                    self._check(cluster_id)
+        finally:
+            self._shutdown()
+
+    def stop(self):
+        self._stopping.set()
+
+    def alive(self):
+        """Cluster ids whose process is currently running"""
+        return [cluster_id for cluster_id, process in enumerate(self._processes)
+                if process is not None and process.is_alive()]
+
+    def _shutdown(self, timeout=10.0):
+        for process in self._processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            if process is not None:
+                process.join(max(0.0, deadline - time.monotonic()))
+                if process.is_alive():
+                    process.kill()
+                    process.join()
+        logger.info("All clusters stopped")
@@ -0,0 +1,39 @@
+import os
+import json
+import hashlib
+import logging
+from utils.storage import data_path
+
+logger = logging.getLogger(__name__)
+
+def command_tree_hash(tree, guild=None):
+    """Stable hash of the app-command payloads Discord would receive for a sync"""
+    payloads = [command.to_dict(tree) for command in tree.get_commands(guild=guild)]
+    payloads.sort(key=lambda payload: (payload.get('type', 1), payload['name']))
+    encoded = json.dumps(payloads, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+class CommandSyncState:
+    """Last synced command-tree hash per scope ('global' or a guild id), kept in a JSON file"""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('COMMAND_SYNC_STATE_PATH') or data_path('command_sync.json')
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.hashes = json.load(f)
+        except FileNotFoundError:
+            self.hashes = {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable command sync state: {str(e)}")
+            self.hashes = {}
+
+    def is_current(self, scope, tree_hash):
+        return self.hashes.get(str(scope)) == tree_hash
+
+    def record(self, scope, tree_hash):
+        """Remember a successful sync; written atomically so a crash can't corrupt the file"""
+        self.hashes[str(scope)] = tree_hash
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.hashes, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,65 @@
+import os
+import asyncio
+import logging
+import time
+from utils.meal_plan import Nutrients
+from utils.metrics import metrics
+from utils.nutrition_cache import normalize_food_name
+from utils.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+class NutritionEnricher:
+    """
+    Async enrichment stage for meal plans. Unique food names are looked up
+    concurrently under a bounded semaphore, and identical foods share one
+    in-flight lookup even across concurrent plans.
+    """
+
+    def __init__(self, usda_api, off_api, concurrency=None):
+        self.usda_api = usda_api
+        self.off_api = off_api
+        self._semaphore = asyncio.Semaphore(int(concurrency or os.getenv('ENRICHMENT_CONCURRENCY', '8')))
+        self._singleflight = SingleFlight()
+
+    async def _lookup(self, food_name):
+        """Fetch macros and micronutrients for one food"""
+        async with self._semaphore:
+            macros, micros = await asyncio.gather(
+                self.usda_api.get_food_macros(food_name),
+                self.off_api.get_micronutrients(food_name)
+            )
+        return macros, micros
+
+    async def lookup(self, food_name):
+        """Return (macros, micros) for a food, sharing concurrent identical lookups"""
+        key = normalize_food_name(food_name)
+        return await self._singleflight.do(key, lambda: self._lookup(food_name))
+
+    async def enrich(self, meal_plan):
+        """Fill in nutrition for every item of a parsed MealPlan and total it once"""
+        start = time.perf_counter()
+        items = list(meal_plan.items())
+        foods = {}
+        for item in items:
+            foods.setdefault(normalize_food_name(item.name), item.name)
+
+        results = await asyncio.gather(*(self.lookup(name) for name in foods.values()), return_exceptions=True)
+        nutrition = {}
+        for key, result in zip(foods, results):
+            if isinstance(result, Exception):
+                logger.error(f"Nutrition lookup failed for {foods[key]}: {str(result)}")
+                continue
+            nutrition[key] = result
+
+        for item in items:
+            macros, micros = nutrition.get(normalize_food_name(item.name), (None, None))
+            if macros:
+                item.macros = Nutrients.from_dict(macros)
+                item.micros = micros or None
+        meal_plan.compute_totals()
+
+        elapsed = time.perf_counter() - start
+        metrics.observe('enrichment.duration', elapsed)
+        logger.info(f"Enriched {len(foods)} unique foods in {elapsed:.2f}s")
+        return meal_plan
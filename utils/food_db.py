@@ -0,0 +1,170 @@
+import os
+import csv
+import sys
+import time
+import logging
+import argparse
+from typing import Dict, Optional
+from utils.food_index import normalize_tokens
+from utils.storage import connect, data_path
+
+logger = logging.getLogger(__name__)
+
+# FoodData Central datasets we import, by their data_type value in food.csv
+DATA_TYPES = {
+    'sr_legacy_food': 'SR Legacy',
+    'foundation_food': 'Foundation',
+    'survey_fndds_food': 'Survey (FNDDS)'
+}
+
+# FoodData Central nutrient ids for the macros we use. Foundation foods often
+# only report energy via the Atwater factors, so those are accepted as well.
+NUTRIENT_IDS = {
+    1003: 'protein',
+    1004: 'fats',
+    1005: 'carbs',
+    1050: 'carbs',
+    1008: 'calories',
+    2047: 'calories',
+    2048: 'calories'
+}
+# Lower number wins when a food reports the same macro under several ids
+NUTRIENT_PRIORITY = {1003: 0, 1004: 0, 1005: 0, 1050: 1, 1008: 0, 2047: 1, 2048: 2}
+
+def default_food_db_path():
+    return os.getenv('FOOD_DB_PATH') or data_path('fooddata.sqlite3')
+
+def _fts_query(food_name):
+    """
+    Build an FTS5 query that requires every word of the food name. Synonyms
+    are left out: they map onto the default tables' names, not USDA's
+    """
+    return ' '.join(f'"{token}"' for token in normalize_tokens(food_name, synonyms=False))
+
+class LocalFoodDatabase:
+    """
+    Offline FoodData Central store: one row of macros per food plus an FTS5
+    index over descriptions, built from the bulk CSV downloads.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_food_db_path()
+        self._db = connect(self.path)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS foods (
+                fdc_id INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                data_type TEXT NOT NULL,
+                protein REAL,
+                carbs REAL,
+                fats REAL,
+                calories REAL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS foods_fts USING fts5(
+                description, content='foods', content_rowid='fdc_id', tokenize='porter unicode61'
+            );
+        ''')
+
+    @classmethod
+    def open_existing(cls, path=None):
+        """Open the local database if it has been imported, otherwise return None"""
+        path = path or default_food_db_path()
+        if not os.path.exists(path):
+            return None
+        database = cls(path)
+        if database.count() == 0:
+            return None
+        logger.info(f"Using local food database at {path} ({database.count()} foods)")
+        return database
+
+    def count(self):
+        return self._db.execute('SELECT COUNT(*) FROM foods').fetchone()[0]
+
+    def lookup(self, food_name: str) -> Optional[Dict]:
+        """Return macros (per 100g) for the best-matching food, or None"""
+        query = _fts_query(food_name)
+        if not query:
+            return None
+        row = self._db.execute(
+            'SELECT f.protein, f.carbs, f.fats, f.calories, f.description FROM foods_fts '
+            'JOIN foods f ON f.fdc_id = foods_fts.rowid '
+            'WHERE foods_fts MATCH ? AND f.calories IS NOT NULL '
+            'ORDER BY bm25(foods_fts), length(f.description) LIMIT 1',
+            (query,)
+        ).fetchone()
+        if row is None:
+            return None
+        logger.debug(f"Local food match for {food_name}: {row[4]}")
+        return {
+            'protein': round(row[0] or 0.0, 1),
+            'carbs': round(row[1] or 0.0, 1),
+            'fats': round(row[2] or 0.0, 1),
+            'calories': round(row[3] or 0.0, 1)
+        }
+
+    def import_dataset(self, directory):
+        """Import food.csv and food_nutrient.csv from one unpacked FoodData Central download"""
+        start = time.perf_counter()
+        food_rows = []
+        with open(os.path.join(directory, 'food.csv'), newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row['data_type'] in DATA_TYPES:
+                    food_rows.append((int(row['fdc_id']), row['description'], DATA_TYPES[row['data_type']]))
+        fdc_ids = {row[0] for row in food_rows}
+
+        macros = {}
+        with open(os.path.join(directory, 'food_nutrient.csv'), newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                nutrient_id = int(row['nutrient_id'])
+                if nutrient_id not in NUTRIENT_IDS:
+                    continue
+                fdc_id = int(row['fdc_id'])
+                if fdc_id not in fdc_ids or not row['amount']:
+                    continue
+                values = macros.setdefault(fdc_id, {})
+                name = NUTRIENT_IDS[nutrient_id]
+                priority = NUTRIENT_PRIORITY[nutrient_id]
+                if name not in values or priority < values[name][1]:
+                    values[name] = (float(row['amount']), priority)
+
+        def macro(fdc_id, name):
+            value = macros.get(fdc_id, {}).get(name)
+            return value[0] if value else None
+
+        self._db.execute('BEGIN')
+        self._db.executemany(
+            'INSERT OR REPLACE INTO foods (fdc_id, description, data_type, protein, carbs, fats, calories) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (
+                (fdc_id, description, data_type,
+                 macro(fdc_id, 'protein'), macro(fdc_id, 'carbs'), macro(fdc_id, 'fats'), macro(fdc_id, 'calories'))
+                for fdc_id, description, data_type in food_rows
+            )
+        )
+        self._db.execute("INSERT INTO foods_fts(foods_fts) VALUES ('rebuild')")
+        self._db.execute('COMMIT')
+        logger.info(f"Imported {len(food_rows)} foods from {directory} in {time.perf_counter() - start:.1f}s")
+        return len(food_rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the offline FoodData Central database')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help='Import unpacked FoodData Central CSV downloads')
+    import_parser.add_argument('directories', nargs='+', help='SR Legacy, Foundation and/or FNDDS CSV folders')
+    import_parser.add_argument('--db', help='Database path (defaults to FOOD_DB_PATH or data/fooddata.sqlite3)')
+    lookup_parser = subparsers.add_parser('lookup', help='Look up a food in the local database')
+    lookup_parser.add_argument('food_name')
+    lookup_parser.add_argument('--db', help='Database path (defaults to FOOD_DB_PATH or data/fooddata.sqlite3)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    database = LocalFoodDatabase(args.db)
+    if args.command == 'import':
+        total = sum(database.import_dataset(directory) for directory in args.directories)
+        print(f"Imported {total} foods into {database.path}")
+    else:
+        print(database.lookup(args.food_name))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
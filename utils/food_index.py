@@ -0,0 +1,181 @@
+import re
+import logging
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Alternative names mapped onto the names used in our tables
+SYNONYMS = {
+    'eggs': 'egg',
+    'yoghurt': 'yogurt',
+    'curd': 'yogurt',
+    'laban': 'yogurt',
+    'oats': 'oatmeal',
+    'oat': 'oatmeal',
+    'porridge': 'oatmeal',
+    'whey': 'protein powder',
+    'basmati': 'rice',
+    'roti': 'bread',
+    'chapati': 'bread',
+    'naan': 'bread',
+    'pita': 'bread',
+    'khubz': 'bread',
+    'tamr': 'dates',
+    'date': 'dates'
+}
+
+# Words that never identify a food on their own
+STOPWORDS = {'a', 'an', 'and', 'of', 'the', 'with', 'or', 'in', 'on', 'to', 'for', 'g', 'oz', 'cup', 'cups'}
+
+# Words that describe how a food is prepared or which kind it is rather than
+# what it is: "brown rice" is still rice, while "almond milk" is not milk
+MODIFIERS = {
+    'brown', 'white', 'whole', 'wheat', 'grain', 'multigrain', 'boiled', 'scrambled', 'fried', 'poached',
+    'grilled', 'baked', 'roasted', 'steamed', 'cooked', 'raw', 'fresh', 'dried', 'plain', 'greek',
+    'medjool', 'skim', 'skimmed', 'low', 'fat', 'nonfat', 'lowfat', 'rolled', 'steel', 'cut', 'instant',
+    'lean', 'large', 'small', 'medium', 'organic', 'unsweetened', 'hard', 'soft'
+}
+MODIFIER_WEIGHT = 0.25
+
+_WORD = re.compile(r'[a-z]+')
+
+def singularize(word):
+    """Cheap English singular form, good enough for food names"""
+    if len(word) <= 3 or word.endswith(('ss', 'us')):
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('oes', 'ches', 'shes')):
+        return word[:-2]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+def normalize_tokens(name, synonyms=True):
+    """Lowercase, drop stopwords, apply synonyms and singularize a food name"""
+    tokens = []
+    for word in _WORD.findall(name.lower()):
+        if word in STOPWORDS:
+            continue
+        if not synonyms:
+            tokens.append(singularize(word))
+            continue
+        word = SYNONYMS.get(word, word)
+        for part in word.split():
+            part = singularize(part)
+            tokens.append(SYNONYMS.get(part, part))
+    return tokens
+
+def _weight(token):
+    return MODIFIER_WEIGHT if token in MODIFIERS else 1.0
+
+def _ngrams(token, n):
+    padded = f' {token} '
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+def _token_similarity(a, b, a_bigrams, b_bigrams):
+    """1.0 for an exact token, bigram Dice for near-misses sharing a first letter"""
+    if a == b:
+        return 1.0
+    if a[0] != b[0]:
+        return 0.0
+    return 2 * len(a_bigrams & b_bigrams) / (len(a_bigrams) + len(b_bigrams))
+
+class FoodIndex:
+    """
+    Prebuilt food-name index. Entries are stored as normalized token tuples
+    with an inverted index by token and a trigram index over the vocabulary
+    for typo-tolerant candidate lookup. Matches are scored by the F1 of how
+    much of the entry's name appears in the query and how much of the query
+    the entry explains, so "sweet potato" doesn't match a bare "potato".
+    Modifier words count for little on either side, so "brown rice" still
+    matches "rice"; ties prefer more specific entries.
+    """
+
+    def __init__(self, entries=None, fuzzy_threshold=0.7):
+        self.fuzzy_threshold = fuzzy_threshold
+        self._entries = []
+        self._by_name = {}
+        self._token_entries = defaultdict(set)
+        self._trigram_tokens = defaultdict(set)
+        self._bigrams = {}
+        for name, payload in (entries or {}).items():
+            self.add(name, payload)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, name, payload=None):
+        """Add or replace an entry"""
+        tokens = tuple(normalize_tokens(name))
+        if not tokens:
+            return
+        entry_id = self._by_name.get(tokens)
+        if entry_id is not None:
+            self._entries[entry_id] = (name, tokens, payload)
+            return
+        entry_id = len(self._entries)
+        self._entries.append((name, tokens, payload))
+        self._by_name[tokens] = entry_id
+        for token in tokens:
+            self._token_entries[token].add(entry_id)
+            if token not in self._bigrams:
+                self._bigrams[token] = _ngrams(token, 2)
+                for trigram in _ngrams(token, 3):
+                    self._trigram_tokens[trigram].add(token)
+
+    def _candidate_tokens(self, query_token):
+        """Vocabulary tokens that could match query_token, with their similarity"""
+        if query_token in self._token_entries:
+            return {query_token: 1.0}
+        query_bigrams = _ngrams(query_token, 2)
+        candidates = set()
+        for trigram in _ngrams(query_token, 3):
+            candidates.update(self._trigram_tokens.get(trigram, ()))
+        similar = {}
+        for token in candidates:
+            score = _token_similarity(query_token, token, query_bigrams, self._bigrams[token])
+            if score >= self.fuzzy_threshold:
+                similar[token] = score
+        return similar
+
+    def match(self, query, threshold=0.75, limit=5):
+        """Return up to limit (name, score, payload) tuples ranked best first"""
+        best_token_scores = {}
+        query_candidates = []
+        for query_token in normalize_tokens(query):
+            candidates = self._candidate_tokens(query_token)
+            query_candidates.append((_weight(query_token), candidates))
+            for token, score in candidates.items():
+                if score > best_token_scores.get(token, 0.0):
+                    best_token_scores[token] = score
+
+        entry_ids = set()
+        for token in best_token_scores:
+            entry_ids.update(self._token_entries[token])
+
+        ranked = []
+        for entry_id in entry_ids:
+            name, tokens, payload = self._entries[entry_id]
+            entry_coverage = (sum(_weight(token) * best_token_scores.get(token, 0.0) for token in tokens)
+                              / sum(_weight(token) for token in tokens))
+            query_coverage = sum(
+                weight * max(candidates.get(token, 0.0) for token in tokens)
+                for weight, candidates in query_candidates
+            ) / sum(weight for weight, _ in query_candidates)
+            if not entry_coverage or not query_coverage:
+                continue
+            score = 2 * entry_coverage * query_coverage / (entry_coverage + query_coverage)
+            if score >= threshold:
+                ranked.append((score, len(tokens), -entry_id, name, payload))
+        ranked.sort(reverse=True)
+        return [(name, score, payload) for score, _, _, name, payload in ranked[:limit]]
+
+    def best(self, query, threshold=0.75):
+        """Return the payload of the best match, or None"""
+        matches = self.match(query, threshold=threshold, limit=1)
+        if not matches:
+            return None
+        name, score, payload = matches[0]
+        logger.debug(f"Matched {query!r} to {name!r} (score {score:.2f})")
+        return payload
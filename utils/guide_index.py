@@ -0,0 +1,137 @@
+import os
+import glob
+import math
+import hashlib
+import logging
+from collections import Counter, defaultdict
+from utils.question_cache import question_tokens
+
+logger = logging.getLogger(__name__)
+
+class GuideSection:
+    __slots__ = ('source', 'text', 'length', 'term_counts')
+
+    def __init__(self, source, text):
+        self.source = source
+        self.text = text
+        self.term_counts = Counter(question_tokens(text))
+        self.length = sum(self.term_counts.values())
+
+def split_sections(text, max_chars=800):
+    """Split guide text into blank-line separated sections of up to max_chars"""
+    sections = []
+    current = ""
+    for block in text.split('\n\n'):
+        block = block.strip()
+        if not block:
+            continue
+        if current and len(current) + len(block) + 2 > max_chars:
+            sections.append(current)
+            current = ""
+        current = f"{current}\n\n{block}" if current else block
+    if current:
+        sections.append(current)
+    return sections
+
+class GuideIndex:
+    """
+    BM25 index over the curated guide files named by GUIDE_FILES, built once
+    at startup. search() ranks sections for a question; strong matches can be
+    answered directly and good partial ones supply compact snippets for the
+    assistant prompt. Without GUIDE_FILES the index is empty and does neither.
+    """
+
+    def __init__(self, sections=None, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.sections = []
+        self._postings = defaultdict(list)
+        self._idf = {}
+        self._average_length = 0.0
+        seen = set()
+        for section in sections or []:
+            digest = hashlib.sha1(section.text.encode('utf-8')).digest()
+            if digest in seen or not section.length:
+                continue
+            seen.add(digest)
+            self.sections.append(section)
+        self._build()
+
+    def _build(self):
+        document_frequency = Counter()
+        for position, section in enumerate(self.sections):
+            for term, count in section.term_counts.items():
+                self._postings[term].append((position, count))
+                document_frequency[term] += 1
+        total = len(self.sections)
+        self._idf = {
+            term: math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+        self._average_length = sum(s.length for s in self.sections) / total if total else 0.0
+
+    @classmethod
+    def from_files(cls, pattern=None):
+        """Build the index from the guide text files matching pattern (default: GUIDE_FILES)"""
+        pattern = pattern or os.getenv('GUIDE_FILES')
+        if not pattern:
+            logger.info("GUIDE_FILES not set, guide answers and snippets are disabled")
+            return cls()
+        sections = []
+        for path in sorted(glob.glob(pattern)):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    text = f.read()
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning(f"Skipping guide file {path}: {str(e)}")
+                continue
+            sections.extend(GuideSection(os.path.basename(path), chunk) for chunk in split_sections(text))
+        index = cls(sections)
+        logger.info(f"Guide index built with {len(index.sections)} sections from {pattern}")
+        return index
+
+    def search(self, query, limit=3):
+        """Return [(score, coverage, section)] best first; coverage is the idf share of query terms matched"""
+        terms = set(question_tokens(query))
+        query_weight = sum(self._idf.get(term, 0.0) for term in terms)
+        if not query_weight:
+            return []
+        scores = defaultdict(float)
+        matched = defaultdict(float)
+        for term in terms:
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for position, count in self._postings[term]:
+                length = self.sections[position].length
+                norm = self.k1 * (1 - self.b + self.b * length / self._average_length)
+                scores[position] += idf * count * (self.k1 + 1) / (count + norm)
+                matched[position] += idf
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(score, matched[position] / query_weight, self.sections[position]) for position, score in ranked]
+
+    def instant_answer(self, query, min_coverage=None, min_score=None, min_terms=3):
+        """Return a guide section that answers the query on its own, or None"""
+        min_coverage = float(min_coverage or os.getenv('GUIDE_INSTANT_COVERAGE', '0.9'))
+        min_score = float(min_score or os.getenv('GUIDE_INSTANT_SCORE', '6'))
+        if len(set(question_tokens(query))) < min_terms:
+            return None
+        results = self.search(query, limit=2)
+        if not results:
+            return None
+        score, coverage, section = results[0]
+        # Require a clear winner so near-ties don't return an arbitrary section
+        if coverage < min_coverage or score < min_score or (len(results) > 1 and results[1][0] > score * 0.8):
+            return None
+        return section
+
+    def snippets(self, query, limit=3, max_chars=500, min_coverage=None):
+        """Compact excerpts of the best matching sections for the prompt"""
+        min_coverage = float(min_coverage or os.getenv('GUIDE_SNIPPET_COVERAGE', '0.6'))
+        excerpts = []
+        for _, coverage, section in self.search(query, limit=limit):
+            if coverage < min_coverage:
+                continue
+            text = section.text if len(section.text) <= max_chars else section.text[:max_chars].rsplit(' ', 1)[0] + '...'
+            excerpts.append(text)
+        return excerpts
@@ -0,0 +1,179 @@
+import os
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import aiohttp
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class HTTPClientError(Exception):
+    """Raised when an upstream request fails after all retries"""
+
+class CircuitOpenError(HTTPClientError):
+    """Raised without touching the network while an upstream's circuit is open"""
+
+class CircuitBreaker:
+    """
+    Per-upstream circuit breaker. After failure_threshold consecutive failures
+    the circuit opens and calls fail fast for reset_timeout seconds, then a
+    single trial request decides whether it closes again.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def allow(self):
+        """Return True if a request may be attempted now"""
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at >= self.reset_timeout and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info(f"Circuit for {self.name} closed")
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release_trial(self):
+        """Free the half-open trial slot without judging the upstream (e.g. the caller was cancelled)"""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+                metrics.increment(f"http.{self.name}.circuit_opened")
+            self.opened_at = time.monotonic()
+
+def _encode_params(params):
+    """Expand list values into repeated query keys, like requests does"""
+    encoded = []
+    for key, value in (params or {}).items():
+        values = value if isinstance(value, (list, tuple)) else [value]
+        encoded.extend((key, str(v)) for v in values)
+    return encoded
+
+class HTTPClient:
+    """Shared async HTTP client with keep-alive pooling, timeouts, retries and circuit breakers"""
+
+    def __init__(self):
+        self.connect_timeout = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3'))
+        self.read_timeout = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+        self.max_connections = int(os.getenv('HTTP_MAX_CONNECTIONS', '100'))
+        self.max_connections_per_host = int(os.getenv('HTTP_MAX_CONNECTIONS_PER_HOST', '10'))
+        self.max_retries = int(os.getenv('HTTP_MAX_RETRIES', '2'))
+        self.backoff_base = 0.25
+        self.backoff_cap = 4.0
+        self._session = None
+        self._breakers = {}
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                ttl_dns_cache=300,
+                keepalive_timeout=60
+            )
+            timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            logger.info("Created shared HTTP session")
+        return self._session
+
+    def breaker_for(self, upstream):
+        """Return the circuit breaker for an upstream host"""
+        breaker = self._breakers.get(upstream)
+        if breaker is None:
+            breaker = CircuitBreaker(upstream)
+            self._breakers[upstream] = breaker
+        return breaker
+
+    def _backoff(self, attempt):
+        """Full-jitter exponential backoff delay for a retry attempt"""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    async def get_json(self, url: str, params: Optional[Dict] = None) -> Dict:
+        """GET a URL and decode its JSON body, retrying transient failures"""
+        upstream = urlsplit(url).hostname
+        breaker = self.breaker_for(upstream)
+        if not breaker.allow():
+            metrics.increment(f"http.{upstream}.short_circuited")
+            raise CircuitOpenError(f"Circuit open for {upstream}")
+
+        # Every path must settle the breaker, or a failed half-open trial keeps it open forever
+        settled = False
+        try:
+            session = self._get_session()
+            last_error = None
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    await asyncio.sleep(self._backoff(attempt))
+                start = time.perf_counter()
+                try:
+                    async with session.get(url, params=_encode_params(params)) as response:
+                        if response.status in RETRY_STATUSES:
+                            last_error = HTTPClientError(f"{upstream} returned HTTP {response.status}")
+                            logger.warning(f"Retryable HTTP {response.status} from {upstream} (attempt {attempt + 1})")
+                            continue
+                        response.raise_for_status()
+                        data = await response.json(content_type=None)
+                    metrics.observe(f"http.{upstream}.latency", time.perf_counter() - start)
+                    breaker.record_success()
+                    settled = True
+                    return data
+                except aiohttp.ClientResponseError as e:
+                    # Non-retryable status (e.g. 400/404): the upstream is healthy
+                    breaker.record_success()
+                    settled = True
+                    raise HTTPClientError(f"{upstream} returned HTTP {e.status}") from e
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    last_error = e
+                    logger.warning(f"Request to {upstream} failed (attempt {attempt + 1}): {str(e) or type(e).__name__}")
+
+            breaker.record_failure()
+            settled = True
+            metrics.increment(f"http.{upstream}.failures")
+            raise HTTPClientError(f"Request to {upstream} failed after {self.max_retries + 1} attempts: {last_error}")
+        except Exception as e:
+            if settled:
+                raise
+            # Anything unexpected, such as a body that isn't JSON, counts against the upstream
+            breaker.record_failure()
+            settled = True
+            metrics.increment(f"http.{upstream}.failures")
+            raise HTTPClientError(f"Unexpected response from {upstream}: {str(e) or type(e).__name__}") from e
+        finally:
+            if not settled:
+                breaker.release_trial()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("Closed shared HTTP session")
+
+# Shared client so every API class reuses the same connection pool
+_shared_client = None
+
+def get_http_client():
+    """Return the process-wide HTTP client"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = HTTPClient()
+    return _shared_client
@@ -0,0 +1,306 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+MEAL_KEYWORDS = ("Meal", "Breakfast", "Lunch", "Dinner", "Snack", "Pre-workout", "Post-workout",
+                 "Suhoor", "Iftar", "Post-Taraweeh")
+
+MICRONUTRIENT_LABELS = (
+    ('iron', 'Iron', 'mg'),
+    ('calcium', 'Calcium', 'mg'),
+    ('vitamin_a', 'Vit.A', 'IU'),
+    ('vitamin_c', 'Vit.C', 'mg'),
+    ('vitamin_b12', 'B12', 'mcg'),
+    ('folates', 'Folate', 'mcg'),
+    ('potassium', 'K', 'mg')
+)
+
+class Nutrients:
+    """Macronutrient amounts for an item, meal or whole plan"""
+    __slots__ = ('protein', 'carbs', 'fats', 'calories')
+
+    def __init__(self, protein=0.0, carbs=0.0, fats=0.0, calories=0.0):
+        self.protein = protein
+        self.carbs = carbs
+        self.fats = fats
+        self.calories = calories
+
+    @classmethod
+    def from_dict(cls, macros):
+        return cls(macros['protein'], macros['carbs'], macros['fats'], macros['calories'])
+
+    def add(self, other):
+        self.protein += other.protein
+        self.carbs += other.carbs
+        self.fats += other.fats
+        self.calories += other.calories
+
+    def is_empty(self):
+        return not (self.protein or self.carbs or self.fats or self.calories)
+
+    def format(self):
+        return (f"(Protein: {self.protein}g, Carbs: {self.carbs}g, "
+                f"Fats: {self.fats}g, Calories: {int(self.calories)})")
+
+def format_micronutrients(micronutrients):
+    """Format a micronutrient dict into a readable string"""
+    if not micronutrients:
+        return "(Micronutrient data unavailable)"
+    parts = [f"{label}: {micronutrients[key]}{unit}" for key, label, unit in MICRONUTRIENT_LABELS]
+    return f"({', '.join(parts)})"
+
+class MealItem:
+    """One food line of a meal, with nutrition filled in by enrichment"""
+    __slots__ = ('text', 'name', 'portion', 'macros', 'micros', 'grams', 'claimed')
+
+    def __init__(self, text, name, portion=None, macros=None, micros=None, grams=None, claimed=None):
+        self.text = text
+        self.name = name
+        self.portion = portion
+        self.macros = macros
+        self.micros = micros
+        # Structured output only: portion weight and the assistant's own macro estimate
+        self.grams = grams
+        self.claimed = claimed
+
+    @classmethod
+    def from_line(cls, line):
+        text = line.strip()
+        content = text[2:].replace('**', '').strip()
+        name, _, rest = content.partition('(')
+        portion = rest.split(')', 1)[0].strip() if rest else None
+        return cls(text, name.strip(), portion)
+
+    def render(self):
+        """Render the item as an enriched '- food (portion) (macros) (micros)' line"""
+        if self.macros is None:
+            return self.text
+        if self.micros:
+            return f"{self.text} {self.macros.format()} {format_micronutrients(self.micros)}"
+        return f"{self.text} {self.macros.format()}"
+
+class Section:
+    """A block of the plan: a meal, the daily targets, the micronutrient summary or free text"""
+    __slots__ = ('kind', 'title', 'entries', 'totals')
+
+    def __init__(self, kind, title):
+        self.kind = kind
+        self.title = title
+        # Food items (MealItem) and other lines (str) in their original order
+        self.entries = []
+        self.totals = Nutrients()
+
+    @property
+    def items(self):
+        return [entry for entry in self.entries if isinstance(entry, MealItem)]
+
+    @property
+    def lines(self):
+        return [entry for entry in self.entries if isinstance(entry, str)]
+
+    def key_values(self):
+        """Parse 'Key: value' lines into (key, value) pairs"""
+        pairs = []
+        for line in self.lines:
+            line = line.replace('**', '')
+            if ':' in line:
+                key, value = line.split(':', 1)
+                pairs.append((key.strip().lstrip('-• ').strip(), value.strip()))
+        return pairs
+
+class MealPlan:
+    """A parsed meal plan shared by enrichment and every renderer"""
+    __slots__ = ('sections', 'totals', 'targets')
+
+    def __init__(self, sections=None, targets=None):
+        self.sections = sections or []
+        self.totals = Nutrients()
+        self.targets = targets or Nutrients()
+
+    @property
+    def meals(self):
+        return [section for section in self.sections if section.kind == 'meal']
+
+    def items(self):
+        """Every food item in plan order"""
+        for section in self.sections:
+            for entry in section.entries:
+                if isinstance(entry, MealItem):
+                    yield entry
+
+    def compute_totals(self):
+        """Total item macros per meal and for the day, once, after enrichment"""
+        self.totals = Nutrients()
+        for section in self.sections:
+            section.totals = Nutrients()
+            for item in section.items:
+                if item.macros is not None:
+                    section.totals.add(item.macros)
+            self.totals.add(section.totals)
+        return self.totals
+
+def is_food_line(line):
+    """True for meal plan lines that list a food item"""
+    return line.strip().startswith('- ') and ':' not in line
+
+def _section_kind(title):
+    if "Total Daily Macronutrients" in title:
+        return 'targets'
+    if "Total Micronutrients" in title:
+        return 'micronutrients'
+    if any(keyword in title for keyword in MEAL_KEYWORDS):
+        return 'meal'
+    return 'other'
+
+def _leading_number(value):
+    try:
+        return float(value.split()[0].replace(',', ''))
+    except (ValueError, IndexError):
+        return 0.0
+
+def _parse_targets(section):
+    targets = Nutrients()
+    for key, value in section.key_values():
+        key = key.lower()
+        if 'calories' in key:
+            targets.calories = _leading_number(value)
+        elif 'protein' in key:
+            targets.protein = _leading_number(value)
+        elif 'carbs' in key:
+            targets.carbs = _leading_number(value)
+        elif 'fats' in key:
+            targets.fats = _leading_number(value)
+    return targets
+
+def parse_meal_plan(text):
+    """Tokenize assistant meal plan text into a MealPlan in a single pass"""
+    plan = MealPlan()
+    section = None
+    for raw_line in text.split('\n'):
+        line = raw_line.strip()
+        if not line:
+            section = None
+            continue
+        food_line = is_food_line(line)
+        if section is None and food_line:
+            # Food lines after a blank line continue an untitled meal block
+            section = Section('meal', None)
+            plan.sections.append(section)
+        elif section is None or (line.startswith('[') and not food_line):
+            section = Section(_section_kind(line.replace('**', '')), line)
+            plan.sections.append(section)
+            continue
+        if food_line and section.kind in ('meal', 'other'):
+            section.entries.append(MealItem.from_line(line))
+        else:
+            section.entries.append(line)
+
+    for section in plan.sections:
+        if section.kind == 'targets':
+            plan.targets = _parse_targets(section)
+    logger.debug(f"Parsed meal plan: {len(plan.sections)} sections, {sum(1 for _ in plan.items())} food items")
+    return plan
+
+def _strip_code_fence(text):
+    text = text.strip()
+    if text.startswith('```'):
+        text = text.split('\n', 1)[1] if '\n' in text else ''
+        text = text.rsplit('```', 1)[0]
+    return text.strip()
+
+def _number(value, field):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError(f"{field} must be a non-negative number")
+    return float(value)
+
+def _text(value, field):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"{field} must be a non-empty string")
+    return value.strip()
+
+def _macros(data, field):
+    if not isinstance(data, dict):
+        raise ValueError(f"{field} must be an object")
+    return Nutrients(*(_number(data.get(key), f"{field}.{key}") for key in ('protein', 'carbs', 'fats', 'calories')))
+
+def meal_plan_from_json(text):
+    """
+    Validate a JSON meal plan (see MEAL_PLAN_JSON_SCHEMA in utils.assistant)
+    and build a MealPlan from it. Raises ValueError if it doesn't match.
+    """
+    try:
+        data = json.loads(_strip_code_fence(text))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON: {str(e)}")
+    if not isinstance(data, dict):
+        raise ValueError("Meal plan must be a JSON object")
+    meals = data.get('meals')
+    if not isinstance(meals, list) or not meals:
+        raise ValueError("meals must be a non-empty list")
+
+    plan = MealPlan(targets=_macros(data.get('targets'), 'targets'))
+    targets = Section('targets', "**Total Daily Macronutrients**")
+    targets.entries = [
+        f"- Calories: {plan.targets.calories:.0f} kcal",
+        f"- Protein: {plan.targets.protein:.0f} g",
+        f"- Carbs: {plan.targets.carbs:.0f} g",
+        f"- Fats: {plan.targets.fats:.0f} g"
+    ]
+    plan.sections.append(targets)
+
+    for index, meal in enumerate(meals, 1):
+        if not isinstance(meal, dict):
+            raise ValueError(f"meals[{index - 1}] must be an object")
+        title = _text(meal.get('name'), f"meals[{index - 1}].name")
+        if meal.get('time'):
+            title = f"{title} ({_text(meal['time'], f'meals[{index - 1}].time')})"
+        section = Section('meal', f"[Meal {index} - {title}]")
+        items = meal.get('items')
+        if not isinstance(items, list) or not items:
+            raise ValueError(f"meals[{index - 1}].items must be a non-empty list")
+        claimed_total = Nutrients()
+        for position, item in enumerate(items):
+            field = f"meals[{index - 1}].items[{position}]"
+            if not isinstance(item, dict):
+                raise ValueError(f"{field} must be an object")
+            food = _text(item.get('food'), f"{field}.food")
+            grams = _number(item.get('grams'), f"{field}.grams")
+            portion = item.get('portion') or f"{grams:.0f}g"
+            claimed = _macros(item, field)
+            claimed_total.add(claimed)
+            section.entries.append(MealItem(f"- {food} ({portion})", food, portion, grams=grams, claimed=claimed))
+        section.entries.append(
+            f"Total: {claimed_total.calories:.0f} calories, {claimed_total.protein:.0f}g protein, "
+            f"{claimed_total.carbs:.0f}g carbs, {claimed_total.fats:.0f}g fats"
+        )
+        for note in meal.get('notes') or []:
+            section.entries.append(_text(note, f"meals[{index - 1}].notes"))
+        plan.sections.append(section)
+
+    notes = data.get('notes') or []
+    if notes:
+        section = Section('other', "**Notes**")
+        section.entries = [_text(note, 'notes') for note in notes]
+        plan.sections.append(section)
+    return plan
+
+def render_meal_plan_text(plan):
+    """Render an enriched plan as Discord message text"""
+    blocks = []
+    for section in plan.sections:
+        lines = [section.title] if section.title else []
+        for entry in section.entries:
+            lines.append(entry.render() if isinstance(entry, MealItem) else entry)
+        blocks.append('\n'.join(lines))
+    return '\n\n'.join(blocks)
+
+def render_nutrition_summary(plan):
+    """Render the daily totals summary message"""
+    return (
+        "📊 **Daily Nutrition Summary**\n"
+        f"Total Calories: {plan.totals.calories:.0f}\n"
+        f"Total Protein: {plan.totals.protein:.1f}g\n"
+        f"Total Carbs: {plan.totals.carbs:.1f}g\n"
+        f"Total Fats: {plan.totals.fats:.1f}g"
+    )
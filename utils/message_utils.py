@@ -1,64 +1,223 @@
+import re
+import asyncio
 import logging
-import math
+import time
+import discord
+from utils.rate_limit import TokenBucket
 
 logger = logging.getLogger(__name__)
 
-async def send_long_message(channel, content):
+DISCORD_MESSAGE_LIMIT = 2000
+
+class StreamingMessage:
     """
-    Send a message that might exceed Discord's 2000 character limit.
-    Splits into multiple messages if needed, preserving minimal formatting.
+    Progressively edit a Discord message in place as streamed text arrives.
+    Edits are throttled to edit_interval seconds; once the text outgrows the
+    2000 character limit the current message is finalized and a new one started.
     """
-    try:
-        if len(content) <= 2000:
-            await channel.send(content)
+
+    def __init__(self, channel, edit_interval=1.0, limit=DISCORD_MESSAGE_LIMIT):
+        self.channel = channel
+        self.edit_interval = edit_interval
+        self.limit = limit
+        self.messages = []
+        self._current = None
+        self._text = ""
+        self._sent_text = ""
+        self._last_flush = 0.0
+        self._lock = asyncio.Lock()
+
+    def _split_point(self):
+        """Find where to cut the buffered text so the head fits in one message"""
+        window = self._text[:self.limit]
+        for separator in ('\n\n', '\n', ' '):
+            index = window.rfind(separator)
+            if index > self.limit // 2:
+                return index
+        return self.limit
+
+    async def _flush(self):
+        """Send or edit the current message so it shows the buffered text"""
+        self._last_flush = time.monotonic()
+        if not self._text.strip() or self._text == self._sent_text:
             return
+        if self._current is None:
+            self._current = await _send(self.channel, content=self._text)
+            self.messages.append(self._current)
+        else:
+            await self._current.edit(content=self._text)
+        self._sent_text = self._text
+
+    async def append(self, delta):
+        """Add streamed text, editing the visible message at a throttled rate"""
+        async with self._lock:
+            self._text += delta
+            while len(self._text) > self.limit:
+                cut = self._split_point()
+                overflow = self._text[cut:].lstrip()
+                self._text = self._text[:cut].rstrip()
+                await self._flush()
+                self._current = None
+                self._text = overflow
+                self._sent_text = ""
+            if time.monotonic() - self._last_flush >= self.edit_interval:
+                await self._flush()
 
-        # Split by double newlines to preserve paragraph structure
-        paragraphs = content.split('\n\n')
-        current_message = ""
+    async def finish(self):
+        """Flush any remaining text and return the sent message objects"""
+        async with self._lock:
+            await self._flush()
+            logger.info(f"Finished streamed reply across {len(self.messages)} message(s)")
+            return self.messages
+
+    async def discard(self):
+        """Delete whatever was already posted, e.g. when the reply was superseded"""
+        for message in self.messages:
+            try:
+                await message.delete()
+            except Exception as e:
+                logger.warning(f"Failed to delete partial reply: {str(e)}")
+        self.messages = []
+        self._current = None
+        self._text = ""
+        self._sent_text = ""
+
+def _wrap(line, width):
+    """Split one over-long line into pieces of at most width, preferring spaces"""
+    pieces = []
+    while len(line) > width:
+        cut = line.rfind(' ', width // 2, width)
+        if cut <= 0:
+            cut = width
+        pieces.append(line[:cut])
+        line = line[cut:].lstrip(' ')
+    pieces.append(line)
+    return pieces
+
+# A reopened code block starts with ``` and a short language tag, so every
+# wrapped piece leaves room for that line plus the closing fence
+MAX_FENCE_LANGUAGE = 20
+FENCE_RESERVE = len('```') + MAX_FENCE_LANGUAGE + len('\n') + len('\n```') + 8
+
+def _fence_marker(line):
+    """The ``` and language tag that reopen the code block line opens"""
+    language = line.rsplit('```', 1)[1].strip()
+    # Anything but a lone short tag after the fence is code, not a language
+    if len(language) > MAX_FENCE_LANGUAGE or not re.fullmatch(r'[\w+#.-]*', language):
+        language = ''
+    return '```' + language
+
+def pack_message(content, limit=DISCORD_MESSAGE_LIMIT):
+    """
+    Split content into chunks of at most limit characters in one pass over its
+    lines. Chunks end at a blank line when one is in the back half of the chunk,
+    otherwise at a line break; a code block cut in two is closed and reopened
+    so both halves render as code.
+    """
+    chunks = []
+    lines = []
+    size = -1            # len('\n'.join(lines)); -1 so the first line adds no separator
+    fence = None         # ``` and language of the code block we're inside
+    break_index = 0      # lines[:break_index] ends at a blank line outside code
+    break_size = 0
+    width = max(16, limit - FENCE_RESERVE)
 
-        for paragraph in paragraphs:
-            # Clean up paragraph formatting
-            formatted_paragraph = paragraph.strip()
+    def emit(count, close_fence):
+        text = '\n'.join(lines[:count]).strip('\n')
+        if close_fence:
+            text += '\n```'
+        if text.strip():
+            chunks.append(text)
 
-            # Check if adding this paragraph would exceed limit
-            if len(current_message) + len(formatted_paragraph) + 2 > 1900:
-                if current_message:
-                    await channel.send(current_message)
-                    logger.info(f"Sent message part (length: {len(current_message)})")
-                    current_message = formatted_paragraph
+    for raw_line in content.split('\n'):
+        for line in _wrap(raw_line, width):
+            # An odd number of fences opens or closes a block; ```x``` on one line does neither
+            toggles = line.count('```') % 2 == 1
+            # Leave room for the closing fence if a block is open once this line is added
+            closing = 4 if (fence is not None) != toggles else 0
+            # A chunk holding only the reopened fence can't shrink any further
+            while lines and lines != [fence] and size + 1 + len(line) + closing > limit:
+                if break_index and break_size > limit // 2:
+                    # Cut at the last paragraph break and carry the rest over
+                    emit(break_index, False)
+                    lines = lines[break_index:]
                 else:
-                    # Single paragraph too long, need to split carefully
-                    chunks = math.ceil(len(formatted_paragraph) / 1900)
-                    logger.info(f"Splitting long paragraph into {chunks} parts")
-
-                    for i in range(chunks):
-                        chunk = formatted_paragraph[i*1900:(i+1)*1900]
-                        if i < chunks - 1 and not chunk.endswith('\n'):
-                            chunk += " [continued...]"
-                        await channel.send(chunk)
-                        logger.info(f"Sent chunk {i+1}/{chunks}")
-            else:
-                if current_message:
-                    is_bullet = formatted_paragraph.strip().startswith(('- ', '• '))
-                    prev_was_bullet = current_message.strip().endswith(('- ', '• ')) or \
-                                    any(line.strip().startswith(('- ', '• ')) for line in current_message.split('\n')[-2:])
-                    if formatted_paragraph.startswith('**') and formatted_paragraph.endswith('**'):
-                        # Add a blank line before headers
-                        current_message += '\n\n'
-                    elif is_bullet and prev_was_bullet:
-                        # Only a single line break between consecutive bullets
-                        current_message += '\n'
-                    else:
-                        # Normal paragraph spacing
-                        current_message += '\n\n'
-                current_message += formatted_paragraph
-
-        if current_message:
-            await channel.send(current_message)
-            logger.info(f"Sent final message part (length: {len(current_message)})")
+                    emit(len(lines), fence is not None)
+                    lines = [fence] if fence else []
+                size = len('\n'.join(lines)) if lines else -1
+                break_index = 0
+            lines.append(line)
+            size += 1 + len(line)
+            if toggles:
+                fence = None if fence else _fence_marker(line)
+            elif not line.strip() and fence is None:
+                break_index = len(lines)
+                break_size = size
+    emit(len(lines), False)
+    return chunks
+
+# Discord allows 5 messages per 5 seconds per channel
+CHANNEL_SEND_RATE = 1.0
+CHANNEL_SEND_BURST = 5
+
+# Embeds hold up to 4096 characters each but 6000 per message, so two 3000
+# character embeds per message carries three times what plain text does
+EMBED_CHUNK_LIMIT = 3000
+EMBEDS_PER_MESSAGE = 2
+
+_channel_buckets = {}
+
+async def pace_channel(channel):
+    """Wait for a send slot in the channel's rate-limit bucket"""
+    key = getattr(channel, 'id', None) or id(channel)
+    bucket = _channel_buckets.get(key)
+    if bucket is None:
+        if len(_channel_buckets) > 10000:
+            _channel_buckets.clear()
+        bucket = TokenBucket(CHANNEL_SEND_RATE, CHANNEL_SEND_BURST)
+        _channel_buckets[key] = bucket
+    while not bucket.try_acquire():
+        await asyncio.sleep(bucket.time_until_available())
+
+async def _send(channel, **kwargs):
+    await pace_channel(channel)
+    return await channel.send(**kwargs)
+
+async def send_long_message(channel, content, prefer_embeds=True):
+    """
+    Send content of any length and return the sent messages. Content over the
+    2000 character limit is packed into as few messages as possible (embeds
+    when the channel allows them) and sent at the channel's rate limit.
+    """
+    sent = []
+    try:
+        if len(content) <= DISCORD_MESSAGE_LIMIT:
+            sent.append(await _send(channel, content=content))
+            return sent
+
+        if prefer_embeds:
+            chunks = pack_message(content, EMBED_CHUNK_LIMIT)
+            try:
+                for i in range(0, len(chunks), EMBEDS_PER_MESSAGE):
+                    embeds = [discord.Embed(description=chunk) for chunk in chunks[i:i + EMBEDS_PER_MESSAGE]]
+                    sent.append(await _send(channel, embeds=embeds))
+                logger.info(f"Sent {len(content)} characters as {len(chunks)} embeds in {len(sent)} message(s)")
+                return sent
+            except discord.Forbidden:
+                if sent:
+                    raise
+                logger.warning("Embeds not permitted here, falling back to plain messages")
+
+        chunks = pack_message(content)
+        for chunk in chunks:
+            sent.append(await _send(channel, content=chunk))
+        logger.info(f"Sent {len(content)} characters in {len(sent)} message(s)")
+        return sent
 
     except Exception as e:
         logger.error(f"Error sending message: {str(e)}")
+        if sent:
+            return sent
         # Fallback: try to send without formatting
-        await channel.send(content[:1900] + "\n[Message truncated due to length]")
\ No newline at end of file
+        sent.append(await channel.send(content[:1900] + "\n[Message truncated due to length]"))
+        return sent
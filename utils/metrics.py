@@ -0,0 +1,62 @@
+import os
+import sys
+import logging
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+class Metrics:
+    """In-process registry of counters, gauges and timing observations"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        self.observations = defaultdict(lambda: {'count': 0, 'total': 0.0, 'min': None, 'max': None})
+
+    def increment(self, name, value=1):
+        """Increase a counter by value"""
+        with self._lock:
+            self.counters[name] += value
+
+    def set_gauge(self, name, value):
+        """Record the current value of a gauge"""
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value):
+        """Record a single observation (e.g. a duration in seconds)"""
+        with self._lock:
+            stats = self.observations[name]
+            stats['count'] += 1
+            stats['total'] += value
+            stats['min'] = value if stats['min'] is None else min(stats['min'], value)
+            stats['max'] = value if stats['max'] is None else max(stats['max'], value)
+        logger.debug(f"Metric {name}: {value:.4f}")
+
+    def snapshot(self):
+        """Return a plain-dict copy of all metrics"""
+        with self._lock:
+            observations = {}
+            for name, stats in self.observations.items():
+                observations[name] = dict(stats, avg=stats['total'] / stats['count'] if stats['count'] else 0.0)
+            return {
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'observations': observations
+            }
+
+def process_rss_bytes():
+    """Current resident set size of this process, or peak RSS where /proc isn't available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+# Shared registry used by the whole bot
+metrics = Metrics()
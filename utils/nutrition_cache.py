@@ -0,0 +1,148 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from utils.food_index import FoodIndex
+from utils.metrics import metrics
+from utils.storage import connect, data_path
+
+logger = logging.getLogger(__name__)
+
+# Returned by NutritionCache.get when nothing is cached; None is a valid cached value
+MISSING = object()
+
+def normalize_food_name(food_name: str) -> str:
+    """Normalize a food name into a cache key"""
+    name = re.sub(r'[^a-z0-9\s]', ' ', food_name.lower())
+    return ' '.join(name.split())
+
+class NutritionCache:
+    """
+    Two-tier cache for nutrition lookups: an in-process LRU in front of a
+    SQLite table that survives restarts. Negative results (None) are cached
+    with their own, shorter TTL so repeated misses stop hitting the API.
+    """
+
+    def __init__(self, namespace, path=None, ttl=None, negative_ttl=None,
+                 max_memory_entries=None, max_disk_entries=None):
+        self.namespace = namespace
+        self.ttl = float(ttl or os.getenv('NUTRITION_CACHE_TTL', str(30 * 24 * 3600)))
+        self.negative_ttl = float(negative_ttl or os.getenv('NUTRITION_CACHE_NEGATIVE_TTL', str(24 * 3600)))
+        self.max_memory_entries = int(max_memory_entries or os.getenv('NUTRITION_CACHE_MEMORY_ENTRIES', '2048'))
+        self.max_disk_entries = int(max_disk_entries or os.getenv('NUTRITION_CACHE_DISK_ENTRIES', '50000'))
+        self.hits = 0
+        self.misses = 0
+        self._writes_since_prune = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = connect(path or os.getenv('NUTRITION_CACHE_PATH') or data_path('nutrition_cache.sqlite3'))
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS nutrition_cache ('
+            'namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT, expires_at REAL NOT NULL, '
+            'PRIMARY KEY (namespace, key))'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS nutrition_cache_expiry ON nutrition_cache (expires_at)')
+
+        # Fuzzy index over names with positive cached results
+        self.index = FoodIndex()
+        for (key,) in self._db.execute(
+            'SELECT key FROM nutrition_cache WHERE namespace = ? AND value IS NOT NULL AND expires_at > ?',
+            (namespace, time.time())
+        ):
+            self.index.add(key, key)
+        logger.info(f"Nutrition cache '{namespace}' ready (ttl={self.ttl:.0f}s)")
+
+    def _record(self, hit, tier=None):
+        if hit:
+            self.hits += 1
+            metrics.increment(f"nutrition_cache.{self.namespace}.hits.{tier}")
+        else:
+            self.misses += 1
+            metrics.increment(f"nutrition_cache.{self.namespace}.misses")
+
+    def get(self, food_name):
+        """Return the cached value for a food (possibly None) or MISSING"""
+        key = normalize_food_name(food_name)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._record(True, 'memory')
+                    return value
+                del self._memory[key]
+
+            row = self._db.execute(
+                'SELECT value, expires_at FROM nutrition_cache WHERE namespace = ? AND key = ?',
+                (self.namespace, key)
+            ).fetchone()
+            if row is not None and row[1] > now:
+                value = json.loads(row[0]) if row[0] is not None else None
+                self._remember(key, value, row[1])
+                self._record(True, 'disk')
+                return value
+
+            self._record(False)
+            return MISSING
+
+    def get_similar(self, food_name, threshold=0.9):
+        """Return the cached value of the closest cached food name, or MISSING"""
+        key = self.index.best(food_name, threshold=threshold)
+        if key is None or key == normalize_food_name(food_name):
+            return MISSING
+        value = self.get(key)
+        if value is not MISSING:
+            logger.debug(f"Using cached {key!r} for {food_name!r}")
+        return value
+
+    def set(self, food_name, value):
+        """Cache a lookup result; None records a negative result"""
+        key = normalize_food_name(food_name)
+        expires_at = time.time() + (self.ttl if value is not None else self.negative_ttl)
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if value is not None:
+                self.index.add(key, key)
+            self._db.execute(
+                'INSERT OR REPLACE INTO nutrition_cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)',
+                (self.namespace, key, json.dumps(value) if value is not None else None, expires_at)
+            )
+            self._writes_since_prune += 1
+            if self._writes_since_prune >= 100:
+                self._prune_disk()
+                self._writes_since_prune = 0
+
+    def _remember(self, key, value, expires_at):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _prune_disk(self):
+        """Drop expired rows, then the soonest-expiring rows beyond the size limit"""
+        self._db.execute('DELETE FROM nutrition_cache WHERE expires_at <= ?', (time.time(),))
+        count = self._db.execute(
+            'SELECT COUNT(*) FROM nutrition_cache WHERE namespace = ?', (self.namespace,)
+        ).fetchone()[0]
+        if count > self.max_disk_entries:
+            self._db.execute(
+                'DELETE FROM nutrition_cache WHERE rowid IN ('
+                'SELECT rowid FROM nutrition_cache WHERE namespace = ? ORDER BY expires_at LIMIT ?)',
+                (self.namespace, count - self.max_disk_entries)
+            )
+
+    def stats(self):
+        """Return hit/miss counters for reporting"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'memory_entries': len(self._memory)
+        }
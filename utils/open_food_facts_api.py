@@ -1,9 +1,24 @@
 import logging
-import requests
 from typing import Dict, Optional
+from utils.food_index import FoodIndex
+from utils.meal_plan import format_micronutrients
+from utils.http_client import get_http_client, HTTPClientError
+from utils.nutrition_cache import NutritionCache, MISSING
 
 logger = logging.getLogger(__name__)
 
+# Known micronutrient values for common foods, used before querying the API
+DEFAULT_MICRONUTRIENTS = {
+    'egg': {'iron': 1.2, 'calcium': 50, 'vitamin_a': 160, 'vitamin_c': 0, 'vitamin_b12': 0.6, 'folates': 47, 'potassium': 126},
+    'chicken breast': {'iron': 0.7, 'calcium': 15, 'vitamin_a': 40, 'vitamin_c': 0, 'vitamin_b12': 0.3, 'folates': 4, 'potassium': 256},
+    'rice': {'iron': 0.2, 'calcium': 10, 'vitamin_a': 0, 'vitamin_c': 0, 'vitamin_b12': 0, 'folates': 3, 'potassium': 35},
+    'apple': {'iron': 0.1, 'calcium': 6, 'vitamin_a': 54, 'vitamin_c': 4.6, 'vitamin_b12': 0, 'folates': 3, 'potassium': 107},
+    'dates': {'iron': 2.5, 'calcium': 75, 'vitamin_a': 0, 'vitamin_c': 0, 'vitamin_b12': 0, 'folates': 6, 'potassium': 282},
+    'almonds': {'iron': 3.7, 'calcium': 269, 'vitamin_a': 0, 'vitamin_c': 0, 'vitamin_b12': 0, 'folates': 44, 'potassium': 733},
+    'protein powder': {'iron': 4.0, 'calcium': 200, 'vitamin_a': 0, 'vitamin_c': 0, 'vitamin_b12': 1.0, 'folates': 100, 'potassium': 150}
+}
+DEFAULT_MICRONUTRIENTS_INDEX = FoodIndex(DEFAULT_MICRONUTRIENTS)
+
 class OpenFoodFactsAPI:
     def __init__(self):
         self.base_url = 'https://world.openfoodfacts.org/cgi/search.pl'
@@ -18,89 +33,83 @@ class OpenFoodFactsAPI:
             'folates_100g',
             'potassium_100g'
         ]
+        self.http = get_http_client()
+        self.cache = NutritionCache('openfoodfacts')
 
-    def get_micronutrients(self, food_name: str) -> Optional[Dict]:
+    async def get_micronutrients(self, food_name: str) -> Optional[Dict]:
         """
         Fetch micronutrient data for a food item from Open Food Facts API.
         Returns micronutrient data (iron, calcium, vitamins, etc.) if found.
+        Results, including misses, are served from the nutrition cache when possible.
         """
-        try:
-            # First check if we have default values for this food
-            defaults = {
-                'egg': {'iron': 1.2, 'calcium': 50, 'vitamin_a': 160, 'vitamin_c': 0, 'vitamin_b12': 0.6, 'folates': 47, 'potassium': 126},
-                'chicken breast': {'iron': 0.7, 'calcium': 15, 'vitamin_a': 40, 'vitamin_c': 0, 'vitamin_b12': 0.3, 'folates': 4, 'potassium': 256},
-                'rice': {'iron': 0.2, 'calcium': 10, 'vitamin_a': 0, 'vitamin_c': 0, 'vitamin_b12': 0, 'folates': 3, 'potassium': 35},
-                'apple': {'iron': 0.1, 'calcium': 6, 'vitamin_a': 54, 'vitamin_c': 4.6, 'vitamin_b12': 0, 'folates': 3, 'potassium': 107},
-                'dates': {'iron': 2.5, 'calcium': 75, 'vitamin_a': 0, 'vitamin_c': 0, 'vitamin_b12': 0, 'folates': 6, 'potassium': 282},
-                'almonds': {'iron': 3.7, 'calcium': 269, 'vitamin_a': 0, 'vitamin_c': 0, 'vitamin_b12': 0, 'folates': 44, 'potassium': 733},
-                'protein powder': {'iron': 4.0, 'calcium': 200, 'vitamin_a': 0, 'vitamin_c': 0, 'vitamin_b12': 1.0, 'folates': 100, 'potassium': 150}
-            }
+        cached = self.cache.get(food_name)
+        if cached is MISSING:
+            cached = self.cache.get_similar(food_name)
+        if cached is not MISSING:
+            logger.debug(f"Nutrition cache hit for {food_name}")
+            return cached
 
-            # Check if we have default values for this food
-            for key in defaults:
-                if key in food_name.lower():
-                    logger.info(f"Using default values for {food_name}")
-                    return defaults[key]
+        try:
+            micronutrients = await self._fetch_micronutrients(food_name)
+        except HTTPClientError as e:
+            logger.error(f"API request failed for {food_name}: {str(e)}")
+            return None
+        except Exception as e:
+            logger.error(f"Error processing data for {food_name}: {str(e)}")
+            return None
 
-            # If no defaults, try the API
-            params = {
-                'search_terms': food_name,
-                'search_simple': 1,
-                'action': 'process',
-                'json': 1,
-                'fields': ','.join(self.fields),
-                'page_size': 1  # Get only best match
-            }
+        self.cache.set(food_name, micronutrients)
+        return micronutrients
 
-            logger.debug(f"Searching Open Food Facts for: {food_name}")
-            response = requests.get(self.base_url, params=params)
-            response.raise_for_status()
+    async def _fetch_micronutrients(self, food_name: str) -> Optional[Dict]:
+        """Look up a food's micronutrients, raising HTTPClientError on request failures"""
+        # First check if we have default values for this food
+        micronutrients = DEFAULT_MICRONUTRIENTS_INDEX.best(food_name)
+        if micronutrients:
+            logger.info(f"Using default values for {food_name}")
+            return micronutrients
 
-            data = response.json()
-            logger.info(f"Found {len(data.get('products', []))} results for {food_name}")
+        # If no defaults, try the API
+        params = {
+            'search_terms': food_name,
+            'search_simple': 1,
+            'action': 'process',
+            'json': 1,
+            'fields': ','.join(self.fields),
+            'page_size': 1  # Get only best match
+        }
 
-            if not data.get('products'):
-                logger.warning(f"No data found for {food_name}")
-                return None
+        logger.debug(f"Searching Open Food Facts for: {food_name}")
+        data = await self.http.get_json(self.base_url, params=params)
+        logger.info(f"Found {len(data.get('products', []))} results for {food_name}")
 
-            # Extract nutrient data from first match
-            product = data['products'][0]
-            nutrients = product.get('nutriments', {})
+        if not data.get('products'):
+            logger.warning(f"No data found for {food_name}")
+            return None
 
-            # Initialize micronutrients dictionary
-            micronutrients = {
-                'iron': round(float(nutrients.get('iron_100g', 0)), 2),
-                'calcium': round(float(nutrients.get('calcium_100g', 0)), 2),
-                'vitamin_a': round(float(nutrients.get('vitamin-a_100g', 0)), 2),
-                'vitamin_c': round(float(nutrients.get('vitamin-c_100g', 0)), 2),
-                'vitamin_b12': round(float(nutrients.get('vitamin-b12_100g', 0)), 2),
-                'folates': round(float(nutrients.get('folates_100g', 0)), 2),
-                'potassium': round(float(nutrients.get('potassium_100g', 0)), 2)
-            }
+        # Extract nutrient data from first match
+        product = data['products'][0]
+        nutrients = product.get('nutriments', {})
 
-            logger.info(f"Processed micronutrients for {food_name}: {micronutrients}")
-            return micronutrients
+        # Initialize micronutrients dictionary
+        micronutrients = {
+            'iron': round(float(nutrients.get('iron_100g', 0)), 2),
+            'calcium': round(float(nutrients.get('calcium_100g', 0)), 2),
+            'vitamin_a': round(float(nutrients.get('vitamin-a_100g', 0)), 2),
+            'vitamin_c': round(float(nutrients.get('vitamin-c_100g', 0)), 2),
+            'vitamin_b12': round(float(nutrients.get('vitamin-b12_100g', 0)), 2),
+            'folates': round(float(nutrients.get('folates_100g', 0)), 2),
+            'potassium': round(float(nutrients.get('potassium_100g', 0)), 2)
+        }
 
-        except requests.RequestException as e:
-            logger.error(f"API request failed for {food_name}: {str(e)}")
-            return None
-        except Exception as e:
-            logger.error(f"Error processing data for {food_name}: {str(e)}")
-            return None
+        logger.info(f"Processed micronutrients for {food_name}: {micronutrients}")
+        return micronutrients
 
     def format_micronutrients(self, micronutrients: Dict) -> str:
         """Format micronutrient data into a readable string"""
         if not micronutrients:
             return "(Micronutrient data unavailable)"
 
-        formatted = (
-            f"(Iron: {micronutrients['iron']}mg, "
-            f"Calcium: {micronutrients['calcium']}mg, "
-            f"Vit.A: {micronutrients['vitamin_a']}IU, "
-            f"Vit.C: {micronutrients['vitamin_c']}mg, "
-            f"B12: {micronutrients['vitamin_b12']}mcg, "
-            f"Folate: {micronutrients['folates']}mcg, "
-            f"K: {micronutrients['potassium']}mg)"
-        )
+        formatted = format_micronutrients(micronutrients)
         logger.debug(f"Formatted micronutrients: {formatted}")
         return formatted
\ No newline at end of file
@@ -1,29 +1,99 @@
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-import tempfile
 import os
+import io
+import sys
+import time
+import asyncio
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from utils.meal_plan import MealItem
+from utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
-def generate_meal_plan_pdf(meal_plan_text, username):
-    """Generate a professional PDF meal plan document"""
+# Worker processes for CPU-bound rendering, created on first use
+_executor = None
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        pool_size = int(os.getenv('PDF_POOL_SIZE', '2'))
+        _executor = ProcessPoolExecutor(max_workers=pool_size, mp_context=multiprocessing.get_context('spawn'))
+        logger.info(f"Started PDF render pool with {pool_size} worker(s)")
+    return _executor
+
+def _warm_worker():
+    """Worker-side warm-up: load ReportLab so the first real render doesn't pay for it"""
+    import reportlab.platypus  # noqa: F401
+    return os.getpid()
+
+async def prewarm_pdf_pool():
+    """Start the PDF worker processes and load ReportLab in each of them"""
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    pool_size = int(os.getenv('PDF_POOL_SIZE', '2'))
+    pids = await asyncio.gather(*(loop.run_in_executor(executor, _warm_worker) for _ in range(pool_size)))
+    logger.info(f"Pre-warmed {len(set(pids))} PDF worker(s)")
+
+def shutdown_pdf_pool():
+    """Stop the PDF worker processes"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def _render_in_worker(meal_plan, username):
+    """
+    Worker entry point: render and return the PDF with its timings. Metrics
+    recorded here would stay in the worker, so the parent records them
+    """
+    started_at = time.time()
+    start = time.perf_counter()
+    cold = 'reportlab.platypus' not in sys.modules
+    if cold:
+        import reportlab.platypus  # noqa: F401
+    loaded = time.perf_counter()
+    pdf_bytes = generate_meal_plan_pdf(meal_plan, username)
+    timings = {
+        'started_at': started_at,
+        'import_time': loaded - start if cold else None,
+        'render_time': time.perf_counter() - loaded
+    }
+    return pdf_bytes, timings
+
+async def render_meal_plan_pdf(meal_plan, username):
+    """Render a meal plan PDF in the worker pool and return its bytes"""
+    submitted_at = time.time()
+    loop = asyncio.get_running_loop()
+    pdf_bytes, timings = await loop.run_in_executor(
+        _get_executor(), _render_in_worker, meal_plan, username
+    )
+    # Wall clock, since the start time comes from another process
+    queue_wait = max(0.0, timings['started_at'] - submitted_at)
+    metrics.observe('pdf.queue_wait', queue_wait)
+    metrics.observe('pdf.render_time', timings['render_time'])
+    if timings['import_time'] is not None:
+        # Only in a worker that wasn't pre-warmed
+        metrics.observe('pdf.worker_import_time', timings['import_time'])
+    logger.info(f"Rendered PDF for {username} in {timings['render_time']:.2f}s (queued {queue_wait:.2f}s)")
+    return pdf_bytes
+
+def generate_meal_plan_pdf(meal_plan, username):
+    """Generate a professional PDF document from a parsed MealPlan and return it as bytes"""
+    # ReportLab is only needed here, which normally runs in a worker process
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
     logger.info(f"Starting meal plan PDF generation for {username}")
-    logger.debug("Parsing meal plan text sections...")
 
     try:
-        # Create temporary file
-        pdf_name = f"Meal Plan for {username}.pdf"
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=f'_{pdf_name}')
-        pdf_path = temp_file.name
-        temp_file.close()
-        logger.debug(f"Created temporary file: {pdf_path}")
+        buffer = io.BytesIO()
 
         # Create the PDF document
         doc = SimpleDocTemplate(
-            pdf_path,
+            buffer,
             pagesize=letter,
             rightMargin=72,
             leftMargin=72,
@@ -106,61 +176,16 @@ def generate_meal_plan_pdf(meal_plan_text, username):
         story.append(Paragraph("Based on your personal preferences and goals", subtitle_style))
         story.append(Spacer(1, 20))
 
-        # Process meal plan text
-        sections = meal_plan_text.split('\n\n')
-        total_daily_calories = 0
-        total_daily_protein = 0
-        total_daily_carbs = 0
-        total_daily_fats = 0
-        target_calories = 0
-        target_protein = 0
-        target_carbs = 0
-        target_fats = 0
-
-        # Track if meal header was added
-        current_meal_header = None
-
-        for section in sections:
-            if not section.strip():
-                continue
-
-            # Clean up section text
-            section = section.replace('**', '').strip()
-            lines = section.split('\n')
+        # Render the parsed meal plan sections
+        totals = meal_plan.totals
+        targets = meal_plan.targets
 
-            if not lines:
-                continue
+        for section in meal_plan.sections:
+            title = section.title.replace('**', '').strip() if section.title else None
 
-            # Parse target macros from Total Daily Macronutrients section
-            if "Total Daily Macronutrients" in lines[0]:
+            if section.kind == 'targets':
                 story.append(Paragraph("Daily Targets", header_style))
-                table_data = []
-                for line in lines[1:]:
-                    if ':' in line:
-                        nutrient, amount = line.split(':', 1)
-                        table_data.append([nutrient.strip(), amount.strip()])
-                        # Extract target values
-                        if 'calories' in nutrient.lower():
-                            try:
-                                target_calories = float(amount.split()[0])
-                            except:
-                                pass
-                        elif 'protein' in nutrient.lower():
-                            try:
-                                target_protein = float(amount.split()[0])
-                            except:
-                                pass
-                        elif 'carbs' in nutrient.lower():
-                            try:
-                                target_carbs = float(amount.split()[0])
-                            except:
-                                pass
-                        elif 'fats' in nutrient.lower():
-                            try:
-                                target_fats = float(amount.split()[0])
-                            except:
-                                pass
-
+                table_data = [[nutrient, amount] for nutrient, amount in section.key_values()]
                 if table_data:
                     table = Table(table_data, colWidths=[doc.width/2.5]*2)
                     table.setStyle(TableStyle([
@@ -176,81 +201,45 @@ def generate_meal_plan_pdf(meal_plan_text, username):
                 story.append(Spacer(1, 20))
                 continue
 
-            # Check if this is a meal section header
-            meal_keywords = ["Meal", "Breakfast", "Lunch", "Dinner", "Snack", "Pre-workout", "Post-workout", "Suhoor", "Iftar", "Post-Taraweeh"]
-            is_meal_header = any(keyword in lines[0] for keyword in meal_keywords)
-
-            if is_meal_header:
+            if section.kind == 'meal':
                 # Add meal header
-                current_meal_header = lines[0].strip()
-                story.append(Paragraph(current_meal_header, header_style))
-
-                # Process meal items
-                meal_protein = 0.0
-                meal_carbs = 0.0
-                meal_fats = 0.0
-                meal_calories = 0.0
-
-                for line in lines[1:]:
-                    if line.strip() and not line.startswith("Meal Totals:"):
-                        # Format food items with macros
-                        content = line.strip('- ').strip()
-                        if '(' in content:
-                            food_part = content.split('(')[0].strip()
-                            macros_part = content[content.find('('):]
-                            # Extract macro values for totals
-                            try:
-                                if 'Protein:' in macros_part:
-                                    protein = float(macros_part.split('Protein:')[1].split('g')[0].strip())
-                                    meal_protein += protein
-                                if 'Carbs:' in macros_part:
-                                    carbs = float(macros_part.split('Carbs:')[1].split('g')[0].strip())
-                                    meal_carbs += carbs
-                                if 'Fats:' in macros_part:
-                                    fats = float(macros_part.split('Fats:')[1].split('g')[0].strip())
-                                    meal_fats += fats
-                                if 'Calories:' in macros_part:
-                                    calories = float(macros_part.split('Calories:')[1].split(')')[0].strip())
-                                    meal_calories += calories
-                            except Exception as e:
-                                logger.warning(f"Could not parse macros from line: {content}")
-                            story.append(Paragraph(f"• {food_part} {macros_part}", text_style))
-                        else:
-                            story.append(Paragraph(f"• {content}", text_style))
+                if title:
+                    story.append(Paragraph(title, header_style))
+
+                # Food items with their macros, plus any other lines in the meal
+                for entry in section.entries:
+                    if isinstance(entry, MealItem):
+                        story.append(Paragraph(f"• {entry.render()[2:].replace('**', '')}", text_style))
+                    elif not entry.startswith("Meal Totals:"):
+                        story.append(Paragraph(f"• {entry.strip('- ').replace('**', '')}", text_style))
 
                 # Add meal totals if we have values
-                if meal_protein > 0 or meal_carbs > 0 or meal_fats > 0 or meal_calories > 0:
+                if not section.totals.is_empty():
                     story.append(Spacer(1, 8))
-                    meal_totals = (f"Meal Totals: Protein: {meal_protein:.1f}g, "
-                                   f"Carbs: {meal_carbs:.1f}g, "
-                                   f"Fats: {meal_fats:.1f}g, "
-                                   f"Calories: {meal_calories:.0f}")
+                    meal_totals = (f"Meal Totals: Protein: {section.totals.protein:.1f}g, "
+                                   f"Carbs: {section.totals.carbs:.1f}g, "
+                                   f"Fats: {section.totals.fats:.1f}g, "
+                                   f"Calories: {section.totals.calories:.0f}")
                     story.append(Paragraph(meal_totals, totals_style))
                     story.append(Spacer(1, 12))
 
-                    # Add to daily totals
-                    total_daily_protein += meal_protein
-                    total_daily_carbs += meal_carbs
-                    total_daily_fats += meal_fats
-                    total_daily_calories += meal_calories
-
-            elif "Total Micronutrients" in lines[0]:
+            elif section.kind == 'micronutrients':
                 # Add Energy Summary section first
                 story.append(Paragraph("Energy Summary", header_style))
 
                 # Calculate percentages of targets
-                calorie_percent = int((total_daily_calories / target_calories * 100) if target_calories > 0 else 0)
-                protein_percent = int((total_daily_protein / target_protein * 100) if target_protein > 0 else 0)
-                carbs_percent = int((total_daily_carbs / target_carbs * 100) if target_carbs > 0 else 0)
-                fats_percent = int((total_daily_fats / target_fats * 100) if target_fats > 0 else 0)
+                calorie_percent = int((totals.calories / targets.calories * 100) if targets.calories > 0 else 0)
+                protein_percent = int((totals.protein / targets.protein * 100) if targets.protein > 0 else 0)
+                carbs_percent = int((totals.carbs / targets.carbs * 100) if targets.carbs > 0 else 0)
+                fats_percent = int((totals.fats / targets.fats * 100) if targets.fats > 0 else 0)
 
                 # Format energy summary table
                 energy_data = [
                     ["Nutrient", "Consumed", "Target", "Percent"],
-                    ["Calories", f"{total_daily_calories:.0f} kcal", f"{target_calories:.0f} kcal", f"{calorie_percent}%"],
-                    ["Protein", f"{total_daily_protein:.1f}g", f"{target_protein:.1f}g", f"{protein_percent}%"],
-                    ["Net Carbs", f"{total_daily_carbs:.1f}g", f"{target_carbs:.1f}g", f"{carbs_percent}%"],
-                    ["Fat", f"{total_daily_fats:.1f}g", f"{target_fats:.1f}g", f"{fats_percent}%"]
+                    ["Calories", f"{totals.calories:.0f} kcal", f"{targets.calories:.0f} kcal", f"{calorie_percent}%"],
+                    ["Protein", f"{totals.protein:.1f}g", f"{targets.protein:.1f}g", f"{protein_percent}%"],
+                    ["Net Carbs", f"{totals.carbs:.1f}g", f"{targets.carbs:.1f}g", f"{carbs_percent}%"],
+                    ["Fat", f"{totals.fats:.1f}g", f"{targets.fats:.1f}g", f"{fats_percent}%"]
                 ]
 
                 # Create and style the energy summary table
@@ -273,11 +262,7 @@ def generate_meal_plan_pdf(meal_plan_text, username):
                 story.append(Paragraph("Highlighted Nutrients", header_style))
 
                 # Create dictionary of micronutrients from the text
-                micronutrients = {}
-                for line in lines[1:]:
-                    if ':' in line:
-                        nutrient, amount = line.split(':', 1)
-                        micronutrients[nutrient.strip()] = amount.strip()
+                micronutrients = dict(section.key_values())
 
                 # Define key nutrients and their units
                 key_nutrients = {
@@ -318,11 +303,11 @@ def generate_meal_plan_pdf(meal_plan_text, username):
                 story.append(micro_table)
             else:
                 # Add other sections with regular formatting
-                if not any(keyword in lines[0] for keyword in meal_keywords):
-                    story.append(Paragraph(lines[0], header_style))
-                    for line in lines[1:]:
-                        if line.strip():
-                            story.append(Paragraph(line.strip(), text_style))
+                if title:
+                    story.append(Paragraph(title, header_style))
+                for entry in section.entries:
+                    line = entry.render() if isinstance(entry, MealItem) else entry
+                    story.append(Paragraph(line.replace('**', ''), text_style))
 
             story.append(Spacer(1, 12))
 
@@ -338,14 +323,8 @@ def generate_meal_plan_pdf(meal_plan_text, username):
         logger.debug("- Food items with formatted macros")
         logger.debug("- Energy Summary table")
         logger.debug("- Highlighted Nutrients section")
-        return pdf_path
+        return buffer.getvalue()
 
     except Exception as e:
         logger.error(f"Error generating PDF: {str(e)}")
-        if 'pdf_path' in locals() and os.path.exists(pdf_path):
-            try:
-                os.remove(pdf_path)
-                logger.debug("Cleaned up temporary PDF file")
-            except Exception as cleanup_error:
-                logger.warning(f"Failed to clean up temporary file: {str(cleanup_error)}")
         raise
\ No newline at end of file
@@ -0,0 +1,216 @@
+import os
+import re
+import math
+import time
+import zlib
+import logging
+import threading
+from collections import defaultdict
+from utils.food_index import singularize
+from utils.metrics import metrics
+from utils.storage import connect, data_path
+
+logger = logging.getLogger(__name__)
+
+# Words that don't tell two questions apart in this server
+QUESTION_STOPWORDS = {
+    'a', 'an', 'and', 'are', 'at', 'be', 'can', 'do', 'does', 'during', 'for', 'i', 'in', 'is', 'it',
+    'me', 'my', 'of', 'on', 'or', 'per', 'should', 'the', 'to', 'while', 'with',
+    'ramadan', 'bodybuilding'
+}
+
+# Words that change what is being asked ("when" vs "how", "eat" vs "not eat").
+# They are weighted features, and two questions only match if theirs agree.
+QUESTION_CUES = {'what', 'when', 'how', 'why', 'where', 'which', 'who', 'not', 'no', 'never'}
+CUE_WEIGHT = 1.5
+
+FEATURE_BUCKETS = 1 << 20
+
+_WORD = re.compile(r'[a-z0-9]+')
+_NEGATED = re.compile(r"n[’']t\b")
+
+def _feature(text):
+    return zlib.crc32(text.encode('utf-8')) % FEATURE_BUCKETS
+
+def _words(question):
+    return _WORD.findall(_NEGATED.sub(' not', question.lower()))
+
+def question_tokens(question):
+    """Lowercase, drop stopwords and cue words and singularize the words of a question"""
+    return [singularize(word) for word in _words(question)
+            if word not in QUESTION_STOPWORDS and word not in QUESTION_CUES]
+
+def question_cues(question):
+    """The interrogatives and negations in a question"""
+    return frozenset(word for word in _words(question) if word in QUESTION_CUES)
+
+def vectorize(question):
+    """
+    Hashed n-gram vector of a question: words, word bigrams, character
+    4-grams (for typos) and cue words, L2-normalized. Returns (vector, word
+    features).
+    """
+    tokens = question_tokens(question)
+    vector = defaultdict(float)
+    for cue in question_cues(question):
+        vector[_feature(f"q:{cue}")] += CUE_WEIGHT
+    words = set()
+    for token in tokens:
+        feature = _feature(f"w:{token}")
+        vector[feature] += 1.0
+        words.add(feature)
+        padded = f" {token} "
+        for i in range(len(padded) - 3):
+            vector[_feature(f"c:{padded[i:i + 4]}")] += 0.3
+    for first, second in zip(tokens, tokens[1:]):
+        vector[_feature(f"b:{first} {second}")] += 0.5
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    if norm:
+        vector = {feature: weight / norm for feature, weight in vector.items()}
+    return dict(vector), words
+
+def cosine(a, b):
+    """Cosine similarity of two normalized sparse vectors"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(feature, 0.0) for feature, weight in a.items())
+
+class _Entry:
+    __slots__ = ('id', 'question', 'answer', 'vector', 'words', 'cues', 'created_at', 'last_used', 'hits')
+
+    def __init__(self, entry_id, question, answer, created_at, last_used, hits=0):
+        self.id = entry_id
+        self.question = question
+        self.answer = answer
+        self.vector, self.words = vectorize(question)
+        self.cues = question_cues(question)
+        self.created_at = created_at
+        self.last_used = last_used
+        self.hits = hits
+
+class QuestionCache:
+    """
+    Near-duplicate answer cache for free-form questions. Questions are turned
+    into hashed n-gram vectors locally and kept in memory with an inverted
+    index by word, so a lookup only scores entries sharing a word with the
+    query and asking the same way (same interrogatives and negations). Entries expire after ttl and the least recently used are evicted
+    past max_entries; everything is persisted in SQLite.
+    """
+
+    def __init__(self, path=None, threshold=None, ttl=None, max_entries=None):
+        self.threshold = float(threshold or os.getenv('QUESTION_CACHE_THRESHOLD', '0.9'))
+        self.ttl = float(ttl or os.getenv('QUESTION_CACHE_TTL', str(14 * 24 * 3600)))
+        self.max_entries = int(max_entries or os.getenv('QUESTION_CACHE_SIZE', '1000'))
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._by_word = defaultdict(set)
+        self._lock = threading.Lock()
+        self._db = connect(path or os.getenv('QUESTION_CACHE_PATH') or data_path('bot_state.sqlite3'))
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS question_cache ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, question TEXT NOT NULL, answer TEXT NOT NULL, '
+            'created_at REAL NOT NULL, last_used REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)'
+        )
+        self._db.execute('DELETE FROM question_cache WHERE created_at <= ?', (time.time() - self.ttl,))
+        for row in self._db.execute(
+            'SELECT id, question, answer, created_at, last_used, hits FROM question_cache '
+            'ORDER BY last_used DESC LIMIT ?', (self.max_entries,)
+        ):
+            self._index(_Entry(*row))
+        logger.info(f"Question cache ready with {len(self._entries)} entries (threshold={self.threshold})")
+
+    def _index(self, entry):
+        self._entries[entry.id] = entry
+        for word in entry.words:
+            self._by_word[word].add(entry.id)
+
+    def _remove(self, entry):
+        del self._entries[entry.id]
+        for word in entry.words:
+            ids = self._by_word.get(word)
+            if ids is not None:
+                ids.discard(entry.id)
+                if not ids:
+                    del self._by_word[word]
+        self._db.execute('DELETE FROM question_cache WHERE id = ?', (entry.id,))
+
+    def _nearest(self, question):
+        vector, words = vectorize(question)
+        cues = question_cues(question)
+        candidates = set()
+        for word in words:
+            candidates |= self._by_word.get(word, set())
+        best, best_score = None, 0.0
+        for entry_id in candidates:
+            entry = self._entries[entry_id]
+            if entry.cues != cues:
+                continue
+            score = cosine(vector, entry.vector)
+            if score > best_score:
+                best, best_score = entry, score
+        return best, best_score
+
+    def lookup(self, question):
+        """Return (entry id, cached answer) for a near-duplicate question, or None"""
+        now = time.time()
+        with self._lock:
+            entry, score = self._nearest(question)
+            if entry is not None and entry.created_at <= now - self.ttl:
+                self._remove(entry)
+                entry = None
+            if entry is None or score < self.threshold:
+                self.misses += 1
+                metrics.increment('question_cache.misses')
+                result = None
+            else:
+                self.hits += 1
+                entry.hits += 1
+                entry.last_used = now
+                self._db.execute(
+                    'UPDATE question_cache SET last_used = ?, hits = ? WHERE id = ?', (now, entry.hits, entry.id)
+                )
+                metrics.increment('question_cache.hits')
+                logger.info(f"Question cache hit ({score:.2f}) for '{question}' -> '{entry.question}'")
+                result = entry.id, entry.answer
+            if (self.hits + self.misses) % 100 == 0:
+                logger.info(self.report())
+        return result
+
+    def get(self, entry_id):
+        """Return (question, answer) for an entry id, or None"""
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            return (entry.question, entry.answer) if entry is not None else None
+
+    def add(self, question, answer):
+        """Cache an answer, evicting the least recently used entries past max_entries"""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                'INSERT INTO question_cache (question, answer, created_at, last_used) VALUES (?, ?, ?, ?)',
+                (question, answer, now, now)
+            )
+            self._index(_Entry(cursor.lastrowid, question, answer, now, now))
+            if len(self._entries) > self.max_entries:
+                for entry in sorted(self._entries.values(), key=lambda e: e.last_used)[:len(self._entries) - self.max_entries]:
+                    self._remove(entry)
+                    metrics.increment('question_cache.evictions')
+            metrics.set_gauge('question_cache.entries', len(self._entries))
+            return cursor.lastrowid
+
+    def stats(self):
+        """Return hit/miss counters for reporting"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self._entries)
+        }
+
+    def report(self):
+        """One-line hit-rate summary for the logs"""
+        stats = self.stats()
+        return (f"Question cache: {stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} entries")
@@ -0,0 +1,68 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from utils.metrics import metrics
+from utils.singleflight import SingleFlight
+from utils.storage import connect, data_path
+
+logger = logging.getLogger(__name__)
+
+# Bump to invalidate every cached answer (e.g. after changing how answers are post-processed)
+RESPONSE_CACHE_VERSION = 1
+
+class ResponseCache:
+    """
+    Cache of assistant answers to deterministic prompts. Keys hash the cache
+    version, assistant id and prompt text, so changing any of them misses and
+    old entries simply expire. Concurrent misses for one key share one run.
+    """
+
+    def __init__(self, path=None, ttl=None):
+        self.ttl = float(ttl or os.getenv('RESPONSE_CACHE_TTL', str(7 * 24 * 3600)))
+        self.flight = SingleFlight()
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._db = connect(path or os.getenv('RESPONSE_CACHE_PATH') or data_path('bot_state.sqlite3'))
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS response_cache ('
+            'key TEXT PRIMARY KEY, prompt TEXT NOT NULL, response TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        self._db.execute('DELETE FROM response_cache WHERE expires_at <= ?', (time.time(),))
+
+    @staticmethod
+    def make_key(assistant_id, prompt):
+        """Versioned cache key for a prompt sent to an assistant"""
+        raw = f"{RESPONSE_CACHE_VERSION}\0{assistant_id}\0{prompt}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key, allow_expired=False):
+        """Return (prompt, response) for a key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                row = self._db.execute(
+                    'SELECT prompt, response, expires_at FROM response_cache WHERE key = ?', (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = row
+                    self._memory[key] = entry
+        if entry is None or (entry[2] <= now and not allow_expired):
+            if not allow_expired:
+                metrics.increment('response_cache.misses')
+            return None
+        if not allow_expired:
+            metrics.increment('response_cache.hits')
+        return entry[0], entry[1]
+
+    def set(self, key, prompt, response):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._memory[key] = (prompt, response, expires_at)
+            self._db.execute(
+                'INSERT OR REPLACE INTO response_cache (key, prompt, response, expires_at) VALUES (?, ?, ?, ?)',
+                (key, prompt, response, expires_at)
+            )
+        logger.info(f"Cached assistant response {key[:12]} for {self.ttl:.0f}s")
@@ -0,0 +1,172 @@
+import os
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from utils.metrics import metrics
+from utils.cluster import process_share
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_FAILURES = ('failed', 'cancelled', 'expired', 'incomplete')
+
+class RunFailedError(Exception):
+    """Raised when an assistant run ends in a non-completed state"""
+
+    def __init__(self, run, message=None):
+        self.run = run
+        super().__init__(message or f"Assistant run {run.id} ended with status {run.status}")
+
+class _PendingRun:
+    __slots__ = ('thread_id', 'run_id', 'future', 'deadline', 'interval', 'polls')
+
+    def __init__(self, thread_id, run_id, future, deadline, interval):
+        self.thread_id = thread_id
+        self.run_id = run_id
+        self.future = future
+        self.deadline = deadline
+        self.interval = interval
+        self.polls = 0
+
+class RunScheduler:
+    """
+    Single background poller for every in-flight assistant run.
+    Runs are polled with adaptive backoff (fast at first, slower later) under a
+    global status-call budget, timed out after run_timeout seconds and resolved
+    through per-caller futures.
+    """
+
+    def __init__(self, client, request_timeout=None, poll_budget=None, run_timeout=None,
+                 min_interval=0.5, max_interval=8.0, backoff=1.5):
+        self.client = client
+        self.request_timeout = request_timeout
+        # Status calls per second for the whole bot; in cluster mode each process gets its share
+        self.poll_budget = TokenBucket(float(poll_budget or process_share(float(os.getenv('RUN_POLL_BUDGET', '10')))))
+        self.run_timeout = float(run_timeout or os.getenv('RUN_TIMEOUT', '180'))
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self._heap = []
+        self._counter = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self.status_calls = 0
+
+    async def wait_for(self, thread_id, run_id):
+        """Wait until a run completes and return it, raising RunFailedError otherwise"""
+        loop = asyncio.get_running_loop()
+        pending = _PendingRun(
+            thread_id,
+            run_id,
+            loop.create_future(),
+            time.monotonic() + self.run_timeout,
+            self.min_interval
+        )
+        self._schedule(pending, time.monotonic() + self.min_interval)
+        self._ensure_running()
+        metrics.set_gauge('run_scheduler.pending', len(self._heap))
+        return await pending.future
+
+    def _schedule(self, pending, when):
+        heapq.heappush(self._heap, (when, next(self._counter), pending))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run_loop())
+
+    async def _run_loop(self):
+        """Poll due runs until nothing is pending"""
+        while self._heap:
+            self._wakeup.clear()
+            now = time.monotonic()
+            delay = self._heap[0][0] - now
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Take every due run that fits in the polling budget
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                pending = self._heap[0][2]
+                if pending.future.done():
+                    heapq.heappop(self._heap)
+                    continue
+                if not self.poll_budget.try_acquire():
+                    break
+                heapq.heappop(self._heap)
+                due.append(pending)
+
+            if not due:
+                # Budget exhausted: push the due runs back until tokens refill
+                wait = self.poll_budget.time_until_available()
+                metrics.increment('run_scheduler.budget_waits')
+                await asyncio.sleep(wait)
+                continue
+
+            await asyncio.gather(*(self._poll(pending) for pending in due))
+            metrics.set_gauge('run_scheduler.pending', len(self._heap))
+
+    async def _poll(self, pending):
+        """Retrieve one run's status and resolve or reschedule it"""
+        try:
+            run = await self.client.beta.threads.runs.retrieve(
+                thread_id=pending.thread_id,
+                run_id=pending.run_id,
+                timeout=self.request_timeout
+            )
+        except Exception as e:
+            logger.warning(f"Status check failed for run {pending.run_id}: {str(e)}")
+            run = None
+        finally:
+            self.status_calls += 1
+            pending.polls += 1
+            metrics.increment('run_scheduler.status_calls')
+
+        if pending.future.done():
+            return
+
+        if run is not None and run.status == 'completed':
+            pending.future.set_result(run)
+            return
+
+        if run is not None and run.status in TERMINAL_FAILURES:
+            logger.error(f"Assistant run {run.id} {run.status}: {run.last_error}")
+            pending.future.set_exception(RunFailedError(run))
+            return
+
+        if run is not None and run.status == 'requires_action':
+            # The assistant has no tools wired up here, so nothing can satisfy the action
+            logger.error(f"Assistant run {run.id} requires action, cancelling")
+            await self._cancel_upstream(pending)
+            pending.future.set_exception(RunFailedError(run, f"Assistant run {run.id} requires unsupported action"))
+            return
+
+        now = time.monotonic()
+        if now >= pending.deadline:
+            logger.error(f"Assistant run {pending.run_id} timed out after {self.run_timeout:.0f}s")
+            metrics.increment('run_scheduler.timeouts')
+            await self._cancel_upstream(pending)
+            pending.future.set_exception(asyncio.TimeoutError(f"Assistant run {pending.run_id} timed out"))
+            return
+
+        pending.interval = min(pending.interval * self.backoff, self.max_interval)
+        self._schedule(pending, min(now + pending.interval, pending.deadline))
+
+    async def _cancel_upstream(self, pending):
+        """Best-effort cancel of a run on OpenAI's side"""
+        try:
+            await self.client.beta.threads.runs.cancel(
+                thread_id=pending.thread_id,
+                run_id=pending.run_id,
+                timeout=self.request_timeout
+            )
+        except Exception as e:
+            logger.warning(f"Failed to cancel run {pending.run_id}: {str(e)}")
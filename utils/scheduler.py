@@ -0,0 +1,169 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+from datetime import datetime
+import pytz
+from utils.metrics import metrics
+from utils.storage import connect, data_path
+from utils.time_utils import next_daily_occurrence, previous_daily_occurrence
+
+logger = logging.getLogger(__name__)
+
+# Never sleep longer than this in one go, so host suspend or clock changes are noticed
+MAX_SLEEP_SECONDS = 300
+
+class DailyJob:
+    __slots__ = ('name', 'hour', 'minute', 'timezone', 'callback', 'catch_up_seconds')
+
+    def __init__(self, name, hour, minute, timezone, callback, catch_up_seconds):
+        self.name = name
+        self.hour = hour
+        self.minute = minute
+        self.timezone = timezone
+        self.callback = callback
+        self.catch_up_seconds = catch_up_seconds
+
+class DailyScheduler:
+    """
+    Runs jobs at a wall-clock time of day in their own time zone from one
+    heap-based timer. Each (job, local date) is claimed in SQLite before it
+    runs and marked complete afterwards, so a run happens once even across
+    restarts and processes. A claim that is still incomplete after
+    lease_seconds (the claimer crashed mid-run) is stale and the run is
+    retried; a run missed while the bot was down is caught up if it is less
+    than catch_up_seconds late. lease_seconds must exceed the longest a job
+    can take, or a slow run may be repeated.
+    """
+
+    def __init__(self, path=None, retry_seconds=60, lease_seconds=None):
+        self.retry_seconds = retry_seconds
+        self.lease_seconds = float(lease_seconds or os.getenv('SCHEDULER_LEASE_SECONDS', '300'))
+        self.jobs = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self._db = connect(path or os.getenv('SCHEDULER_PATH') or data_path('bot_state.sqlite3'))
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS scheduled_runs ('
+            'job TEXT NOT NULL, run_date TEXT NOT NULL, claimed_at REAL NOT NULL, completed_at REAL, '
+            'PRIMARY KEY (job, run_date))'
+        )
+
+    def add_daily(self, name, hour, minute, timezone, callback, catch_up_seconds=3600):
+        """Run callback() every day at hour:minute in timezone"""
+        job = DailyJob(name, hour, minute, timezone, callback, catch_up_seconds)
+        self.jobs[name] = job
+        now = datetime.now(pytz.utc)
+        missed = previous_daily_occurrence(hour, minute, timezone, now)
+        retry_at = self._retry_time(name, missed) if (now - missed).total_seconds() <= catch_up_seconds else None
+        if retry_at is not None and retry_at - missed.timestamp() <= catch_up_seconds:
+            logger.info(f"Catching up job {name} for {missed.date()}")
+            self._schedule(job, missed, max(retry_at, missed.timestamp()))
+        else:
+            self._schedule(job, next_daily_occurrence(hour, minute, timezone, now))
+        logger.info(f"Scheduled daily job {name} at {hour:02d}:{minute:02d} {timezone}")
+
+    def remove(self, name):
+        """Stop scheduling a job; queued fire times for it are dropped lazily"""
+        self.jobs.pop(name, None)
+
+    def _schedule(self, job, occurrence, when=None):
+        """Queue an occurrence to fire at `when` (a timestamp, default the occurrence itself)"""
+        when = when if when is not None else occurrence.timestamp()
+        heapq.heappush(self._heap, (when, next(self._counter), job, occurrence))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _retry_time(self, name, occurrence):
+        """
+        When a run could next be claimed: now if unclaimed, when the lease
+        runs out if claimed but not completed, None if it completed.
+        """
+        row = self._db.execute(
+            'SELECT claimed_at, completed_at FROM scheduled_runs WHERE job = ? AND run_date = ?',
+            (name, occurrence.date().isoformat())
+        ).fetchone()
+        if row is None:
+            return time.time()
+        claimed_at, completed_at = row
+        if completed_at is not None:
+            return None
+        return max(time.time(), claimed_at + self.lease_seconds)
+
+    def _claim(self, name, occurrence):
+        """Atomically claim a run; False if it completed or another claim is still within its lease"""
+        now = time.time()
+        cursor = self._db.execute(
+            'INSERT INTO scheduled_runs (job, run_date, claimed_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (job, run_date) DO UPDATE SET claimed_at = excluded.claimed_at '
+            'WHERE completed_at IS NULL AND claimed_at <= ?',
+            (name, occurrence.date().isoformat(), now, now - self.lease_seconds)
+        )
+        return cursor.rowcount == 1
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run_loop())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run_loop(self):
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, MAX_SLEEP_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, job, occurrence = heapq.heappop(self._heap)
+            if self.jobs.get(job.name) is not job:
+                continue
+            # Jobs run as their own tasks so a slow one doesn't hold up the others
+            asyncio.create_task(self._fire(job, occurrence))
+
+    async def _fire(self, job, occurrence):
+        """Run one occurrence of a job and schedule the next"""
+        lateness = time.time() - occurrence.timestamp()
+        if self._claim(job.name, occurrence):
+            try:
+                await job.callback()
+                self._db.execute(
+                    'UPDATE scheduled_runs SET completed_at = ? WHERE job = ? AND run_date = ?',
+                    (time.time(), job.name, occurrence.date().isoformat())
+                )
+                metrics.observe('scheduler.lateness', lateness)
+                logger.info(f"Job {job.name} ran for {occurrence.date()} ({lateness:.1f}s late)")
+            except Exception as e:
+                logger.error(f"Job {job.name} failed: {str(e)}")
+                metrics.increment('scheduler.failures')
+                # Release the claim and retry while the run is still within its catch-up window
+                self._db.execute(
+                    'DELETE FROM scheduled_runs WHERE job = ? AND run_date = ?',
+                    (job.name, occurrence.date().isoformat())
+                )
+                if lateness + self.retry_seconds <= job.catch_up_seconds:
+                    self._schedule(job, occurrence, time.time() + self.retry_seconds)
+                    return
+        else:
+            retry_at = self._retry_time(job.name, occurrence)
+            if retry_at is not None and retry_at - occurrence.timestamp() <= job.catch_up_seconds:
+                # Claimed but not completed: check again when the lease runs out in case the claimer died
+                logger.info(f"Job {job.name} for {occurrence.date()} is running elsewhere, rechecking after its lease")
+                self._schedule(job, occurrence, retry_at)
+                return
+            logger.info(f"Job {job.name} for {occurrence.date()} already ran, skipping")
+        self._schedule(job, next_daily_occurrence(job.hour, job.minute, job.timezone, occurrence))
@@ -0,0 +1,21 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one in-flight task"""
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def do(self, key, factory):
+        """Await factory() once per key; concurrent callers share its result"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            logger.debug(f"Joining in-flight request for {key}")
+        return await asyncio.shield(task)
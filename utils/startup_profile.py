@@ -0,0 +1,81 @@
+import sys
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class _TimingLoader:
+    """Wraps a module loader to time how long executing the module takes"""
+
+    def __init__(self, loader, profiler, name):
+        self._loader = loader
+        self._profiler = profiler
+        self._name = name
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._profiler._enter()
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._exit(self._name, time.perf_counter() - start)
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+class ImportProfiler:
+    """
+    Meta path hook for --profile-startup: records inclusive and self import
+    time per module (like python -X importtime) for modules imported after
+    install().
+    """
+
+    def __init__(self):
+        self.imports = {}
+        self._stack = []
+        self._installed = False
+
+    def install(self):
+        if not self._installed:
+            sys.meta_path.insert(0, self)
+            self._installed = True
+
+    def uninstall(self):
+        if self._installed:
+            sys.meta_path.remove(self)
+            self._installed = False
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimingLoader(spec.loader, self, name)
+                return spec
+        return None
+
+    def _enter(self):
+        self._stack.append(0.0)
+
+    def _exit(self, name, elapsed):
+        children = self._stack.pop()
+        if self._stack:
+            self._stack[-1] += elapsed
+        self.imports[name] = (elapsed, elapsed - children)
+
+    def report(self, cog_load_times=None, limit=25):
+        """Slowest imports and cog load times as log-friendly text"""
+        lines = ["Startup profile (inclusive / self seconds):"]
+        slowest = sorted(self.imports.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        for name, (inclusive, own) in slowest:
+            lines.append(f"  {inclusive:8.3f} {own:8.3f}  {name}")
+        for name, elapsed in (cog_load_times or {}).items():
+            lines.append(f"  cog {name}: {elapsed:.3f}s")
+        return '\n'.join(lines)
+
+import_profiler = ImportProfiler()
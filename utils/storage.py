@@ -0,0 +1,21 @@
+import os
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+def data_path(filename):
+    """Return the path of a file in the bot's data directory, creating the directory if needed"""
+    data_dir = os.getenv('BOT_DATA_DIR', 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    return os.path.join(data_dir, filename)
+
+def connect(path):
+    """Open a SQLite database tuned for many small reads and writes"""
+    connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    # Cluster processes share these files; wait for another writer instead of failing
+    connection.execute('PRAGMA busy_timeout=5000')
+    logger.debug(f"Opened SQLite database: {path}")
+    return connection
@@ -0,0 +1,111 @@
+import os
+import asyncio
+import logging
+import time
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class ThreadWorkQueue:
+    """
+    Per-thread work queue. Items for one thread are handled one batch at a
+    time; items that arrive while a batch is running, or within the debounce
+    window, are merged into the next batch.
+    """
+
+    def __init__(self, handler, debounce=None, max_wait=None):
+        self.handler = handler
+        self.debounce = float(debounce if debounce is not None else os.getenv('FOLLOWUP_DEBOUNCE_SECONDS', '1.5'))
+        self.max_wait = float(max_wait if max_wait is not None else os.getenv('FOLLOWUP_MAX_WAIT_SECONDS', '5'))
+        self._pending = {}
+        self._last_arrival = {}
+        self._workers = {}
+        # key -> (handler task, batch) for the batch currently being handled
+        self._running = {}
+
+    def submit(self, key, item):
+        """Queue an item for a thread, starting its worker if idle"""
+        self._pending.setdefault(key, []).append(item)
+        self._last_arrival[key] = time.monotonic()
+        worker = self._workers.get(key)
+        if worker is None or worker.done():
+            self._workers[key] = asyncio.create_task(self._worker(key))
+
+    def is_busy(self, key):
+        worker = self._workers.get(key)
+        return worker is not None and not worker.done()
+
+    def running(self, key):
+        """The batch currently being handled for a thread, or None"""
+        running = self._running.get(key)
+        return running[1] if running is not None else None
+
+    def cancel(self, key):
+        """Cancel the batch being handled for a thread and return it (or None)"""
+        running = self._running.pop(key, None)
+        if running is None:
+            return None
+        task, batch = running
+        task.cancel()
+        logger.info(f"Cancelled in-flight work for thread {key}")
+        return batch
+
+    def requeue(self, key, items):
+        """Put items back at the front of a thread's queue"""
+        if not items:
+            return
+        self._pending[key] = list(items) + self._pending.get(key, [])
+        self._last_arrival[key] = time.monotonic()
+        worker = self._workers.get(key)
+        if worker is None or worker.done():
+            self._workers[key] = asyncio.create_task(self._worker(key))
+
+    def update_pending(self, key, update):
+        """Replace a thread's queued items with update(items)"""
+        pending = self._pending.get(key)
+        if pending:
+            self._pending[key] = update(pending)
+
+    def clear(self, key):
+        """Forget everything queued for a thread and cancel its running batch"""
+        self._pending.pop(key, None)
+        self.cancel(key)
+
+    async def _wait_for_quiet(self, key):
+        """Sleep until no new item has arrived for debounce seconds (capped at max_wait)"""
+        started = time.monotonic()
+        while True:
+            quiet_for = time.monotonic() - self._last_arrival.get(key, 0)
+            remaining = min(self.debounce - quiet_for, self.max_wait - (time.monotonic() - started))
+            if remaining <= 0:
+                return
+            await asyncio.sleep(remaining)
+
+    async def _worker(self, key):
+        try:
+            while self._pending.get(key):
+                await self._wait_for_quiet(key)
+                batch = self._pending.pop(key, [])
+                if len(batch) > 1:
+                    metrics.increment('followups.coalesced', len(batch) - 1)
+                    logger.info(f"Coalesced {len(batch)} messages for thread {key}")
+                if not batch:
+                    continue
+                # Run the handler as its own task so cancel() can stop just this batch
+                task = asyncio.create_task(self.handler(key, batch))
+                self._running[key] = (task, batch)
+                try:
+                    await asyncio.wait({task})
+                finally:
+                    if not task.done():
+                        task.cancel()
+                    if self._running.get(key, (None,))[0] is task:
+                        del self._running[key]
+                if not task.cancelled() and task.exception() is not None:
+                    logger.error(f"Error handling queued work for thread {key}: {str(task.exception())}")
+        finally:
+            if self._workers.get(key) is asyncio.current_task():
+                del self._workers[key]
+            if not self._pending.get(key):
+                self._pending.pop(key, None)
+                self._last_arrival.pop(key, None)
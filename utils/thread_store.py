@@ -0,0 +1,211 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from utils.metrics import metrics
+from utils.storage import connect, data_path
+
+logger = logging.getLogger(__name__)
+
+class ThreadMappingStore:
+    """
+    Discord thread id -> OpenAI thread id mapping that survives restarts.
+    A bounded in-memory LRU sits in front of a SQLite table; writes and
+    last-used updates are buffered and flushed in batches, and entries idle
+    for longer than idle_seconds are pruned.
+    """
+
+    def __init__(self, path=None, max_memory_entries=None, idle_seconds=None, batch_size=100):
+        self.max_memory_entries = int(max_memory_entries or os.getenv('THREAD_MAPPING_CACHE_SIZE', '5000'))
+        self.idle_seconds = float(idle_seconds or float(os.getenv('THREAD_MAPPING_IDLE_DAYS', '7')) * 24 * 3600)
+        self.batch_size = batch_size
+        self._memory = OrderedDict()
+        self._pending_writes = {}
+        self._pending_deletes = set()
+        self._lock = threading.Lock()
+        self._db = connect(path or os.getenv('THREAD_MAPPING_PATH') or data_path('bot_state.sqlite3'))
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS thread_mappings ('
+            'discord_thread_id INTEGER PRIMARY KEY, openai_thread_id TEXT NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS thread_mappings_last_used ON thread_mappings (last_used)')
+
+    def _remember(self, thread_id, openai_thread_id):
+        self._memory[thread_id] = openai_thread_id
+        self._memory.move_to_end(thread_id)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+        metrics.set_gauge('thread_mappings.memory_entries', len(self._memory))
+
+    def _touch(self, thread_id, openai_thread_id):
+        """Record a use; the new last_used time is written with the next batch"""
+        self._pending_writes[thread_id] = (openai_thread_id, time.time())
+        if len(self._pending_writes) >= self.batch_size:
+            self._flush_locked()
+
+    def get(self, thread_id, default=None):
+        """Return the OpenAI thread id for a Discord thread, or default"""
+        with self._lock:
+            openai_thread_id = self._memory.get(thread_id)
+            if openai_thread_id is not None:
+                self._memory.move_to_end(thread_id)
+                self._touch(thread_id, openai_thread_id)
+                return openai_thread_id
+            if thread_id in self._pending_deletes:
+                return default
+            pending = self._pending_writes.get(thread_id)
+            if pending is not None:
+                self._remember(thread_id, pending[0])
+                return pending[0]
+            row = self._db.execute(
+                'SELECT openai_thread_id FROM thread_mappings WHERE discord_thread_id = ?', (thread_id,)
+            ).fetchone()
+            if row is None:
+                return default
+            self._remember(thread_id, row[0])
+            self._touch(thread_id, row[0])
+            return row[0]
+
+    def has(self, thread_id):
+        """
+        Cheap membership test for hot paths: the LRU and buffered changes first,
+        then a primary key lookup. Doesn't update last-used times
+        """
+        with self._lock:
+            if thread_id in self._memory or thread_id in self._pending_writes:
+                return True
+            if thread_id in self._pending_deletes:
+                return False
+            return self._db.execute(
+                'SELECT 1 FROM thread_mappings WHERE discord_thread_id = ?', (thread_id,)
+            ).fetchone() is not None
+
+    def __contains__(self, thread_id):
+        return self.get(thread_id) is not None
+
+    def __getitem__(self, thread_id):
+        openai_thread_id = self.get(thread_id)
+        if openai_thread_id is None:
+            raise KeyError(thread_id)
+        return openai_thread_id
+
+    def __setitem__(self, thread_id, openai_thread_id):
+        with self._lock:
+            self._pending_deletes.discard(thread_id)
+            self._remember(thread_id, openai_thread_id)
+            self._touch(thread_id, openai_thread_id)
+
+    def pop(self, thread_id, default=None):
+        """Forget a thread (e.g. when it is archived or deleted)"""
+        with self._lock:
+            openai_thread_id = self._memory.pop(thread_id, None)
+            self._pending_writes.pop(thread_id, None)
+            self._pending_deletes.add(thread_id)
+            if len(self._pending_deletes) >= self.batch_size:
+                self._flush_locked()
+        return openai_thread_id if openai_thread_id is not None else default
+
+    def __delitem__(self, thread_id):
+        self.pop(thread_id)
+
+    def __len__(self):
+        self.flush()
+        return self._db.execute('SELECT COUNT(*) FROM thread_mappings').fetchone()[0]
+
+    def _flush_locked(self):
+        if not self._pending_writes and not self._pending_deletes:
+            return
+        self._db.execute('BEGIN')
+        if self._pending_deletes:
+            self._db.executemany(
+                'DELETE FROM thread_mappings WHERE discord_thread_id = ?',
+                [(thread_id,) for thread_id in self._pending_deletes]
+            )
+        if self._pending_writes:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO thread_mappings (discord_thread_id, openai_thread_id, last_used) VALUES (?, ?, ?)',
+                [(thread_id, openai_id, last_used) for thread_id, (openai_id, last_used) in self._pending_writes.items()]
+            )
+        self._db.execute('COMMIT')
+        logger.debug(f"Flushed {len(self._pending_writes)} thread mapping writes and {len(self._pending_deletes)} deletes")
+        self._pending_writes.clear()
+        self._pending_deletes.clear()
+
+    def flush(self):
+        """Write buffered changes to disk"""
+        with self._lock:
+            self._flush_locked()
+
+    def prune_idle(self):
+        """Drop mappings that have not been used for idle_seconds"""
+        cutoff = time.time() - self.idle_seconds
+        with self._lock:
+            self._flush_locked()
+            stale = [row[0] for row in self._db.execute(
+                'SELECT discord_thread_id FROM thread_mappings WHERE last_used < ?', (cutoff,)
+            )]
+            self._db.execute('DELETE FROM thread_mappings WHERE last_used < ?', (cutoff,))
+            for thread_id in stale:
+                self._memory.pop(thread_id, None)
+        if stale:
+            logger.info(f"Pruned {len(stale)} idle thread mappings")
+            metrics.increment('thread_mappings.pruned', len(stale))
+        return len(stale)
+
+class UserThreadIndex:
+    """
+    (parent channel id, user id, command kind) -> Discord thread id for the
+    threads the bot opens per user, so commands find a user's thread without
+    scanning the channel. Held fully in memory and written through to SQLite.
+    """
+
+    def __init__(self, path=None):
+        self._lock = threading.Lock()
+        self._db = connect(path or os.getenv('THREAD_MAPPING_PATH') or data_path('bot_state.sqlite3'))
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS user_threads ('
+            'channel_id INTEGER NOT NULL, user_id INTEGER NOT NULL, kind TEXT NOT NULL, '
+            'thread_id INTEGER NOT NULL, PRIMARY KEY (channel_id, user_id, kind))'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS user_threads_thread_id ON user_threads (thread_id)')
+        self._threads = {}
+        self._keys = {}
+        for channel_id, user_id, kind, thread_id in self._db.execute(
+                'SELECT channel_id, user_id, kind, thread_id FROM user_threads'):
+            self._threads[(channel_id, user_id, kind)] = thread_id
+            self._keys.setdefault(thread_id, set()).add((channel_id, user_id, kind))
+        metrics.set_gauge('user_threads.entries', len(self._threads))
+
+    def get(self, channel_id, user_id, kind):
+        """Return the indexed thread id, or None"""
+        return self._threads.get((channel_id, user_id, kind))
+
+    def set(self, channel_id, user_id, kind, thread_id):
+        key = (channel_id, user_id, kind)
+        with self._lock:
+            previous = self._threads.get(key)
+            if previous is not None:
+                self._keys.get(previous, set()).discard(key)
+            self._threads[key] = thread_id
+            self._keys.setdefault(thread_id, set()).add(key)
+            self._db.execute(
+                'INSERT OR REPLACE INTO user_threads (channel_id, user_id, kind, thread_id) VALUES (?, ?, ?, ?)',
+                (channel_id, user_id, kind, thread_id)
+            )
+            metrics.set_gauge('user_threads.entries', len(self._threads))
+
+    def discard_thread(self, thread_id):
+        """Forget a thread that was deleted or can no longer be reopened; returns whether it was indexed"""
+        with self._lock:
+            keys = self._keys.pop(thread_id, None)
+            if not keys:
+                return False
+            for key in keys:
+                self._threads.pop(key, None)
+            self._db.execute('DELETE FROM user_threads WHERE thread_id = ?', (thread_id,))
+            metrics.set_gauge('user_threads.entries', len(self._threads))
+        return True
+
+    def __len__(self):
+        return len(self._threads)
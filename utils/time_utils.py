@@ -1,5 +1,5 @@
 import pytz
-from datetime import datetime
+from datetime import datetime, timedelta
 
 def get_est_time():
     """Get current time in EST"""
@@ -10,3 +10,47 @@ def is_check_in_time():
     """Check if it's time for daily check-in (8 PM EST)"""
     current_time = get_est_time()
     return current_time.hour == 20 and current_time.minute == 0
+
+def parse_time_of_day(value):
+    """Parse 'HH:MM' into (hour, minute)"""
+    hour, minute = value.strip().split(':')
+    hour, minute = int(hour), int(minute)
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"Invalid time of day: {value}")
+    return hour, minute
+
+def localize(timezone, naive):
+    """
+    Attach a pytz timezone to a naive local time, resolving DST transitions:
+    a time skipped by spring-forward moves an hour later and a repeated
+    fall-back time resolves to its first occurrence.
+    """
+    try:
+        return timezone.localize(naive, is_dst=None)
+    except pytz.NonExistentTimeError:
+        return timezone.localize(naive + timedelta(hours=1), is_dst=True)
+    except pytz.AmbiguousTimeError:
+        return timezone.localize(naive, is_dst=True)
+
+def daily_occurrence(hour, minute, timezone, day):
+    """The aware datetime of hour:minute local time on a given date"""
+    tz = pytz.timezone(timezone) if isinstance(timezone, str) else timezone
+    return localize(tz, datetime(day.year, day.month, day.day, hour, minute))
+
+def next_daily_occurrence(hour, minute, timezone='America/New_York', after=None):
+    """Next hour:minute local time strictly after `after` (default now) as an aware datetime"""
+    tz = pytz.timezone(timezone) if isinstance(timezone, str) else timezone
+    local_now = (after or datetime.now(pytz.utc)).astimezone(tz)
+    occurrence = daily_occurrence(hour, minute, tz, local_now.date())
+    if occurrence <= local_now:
+        occurrence = daily_occurrence(hour, minute, tz, local_now.date() + timedelta(days=1))
+    return occurrence
+
+def previous_daily_occurrence(hour, minute, timezone='America/New_York', before=None):
+    """Most recent hour:minute local time at or before `before` (default now)"""
+    tz = pytz.timezone(timezone) if isinstance(timezone, str) else timezone
+    local_now = (before or datetime.now(pytz.utc)).astimezone(tz)
+    occurrence = daily_occurrence(hour, minute, tz, local_now.date())
+    if occurrence > local_now:
+        occurrence = daily_occurrence(hour, minute, tz, local_now.date() - timedelta(days=1))
+    return occurrence